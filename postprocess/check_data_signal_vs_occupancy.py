@@ -1,7 +1,21 @@
+"""
+Signal extraction of D mesons in centrality and occupancy intervals, for all the
+combinations of centrality sets and occupancy estimators defined in a YAML
+configuration (occupancy_study.yml by default)
+"""
+
 import os
 import ROOT
+import yaml
 import argparse
 import numpy as np
+from mass_fit import get_fit_task, run_fits, FIT_BACKENDS
+from sparse_cube import get_sparse_cubes, read_filled_bins
+from event_norm import EventCounter
+
+DEFAULT_CONFIG = os.path.join(os.path.dirname(os.path.abspath(__file__)), "occupancy_study.yml")
+CONFIG_KEYS = ["input", "thn_name", "centralities", "occupancies", "pt_bins", "mass_range",
+               "events", "estimators", "outfile"]
 
 # Define color palettes for prompt (red) and non-prompt (blue)
 marker_styles = [
@@ -77,195 +91,7 @@ def load_thnsparse(infile_name, directory, thn_name):
     return thn
 
 
-def fit_invariant_mass(hist, mass_range=(1.72, 2.04), label=""):
-    """
-    Fit the invariant mass of D+ mesons, extract key parameters, and calculate uncertainties.
-
-    Parameters:
-    - hist (TH1): The invariant mass histogram to fit.
-    - mass_range (tuple): The mass range for fitting, e.g., (1.8, 2.0).
-    - label: label
-
-    Returns:
-    - dict: A dictionary containing mean, sigma, signal, background, significance, S/B, and their uncertainties.
-    """
-    # Define the mass observable
-    mass = ROOT.RooRealVar(
-        "mass", "#it{M} (KK#pi)", mass_range[0], mass_range[1], "GeV/c^{2}"
-    )
-
-    # Import the histogram into a RooDataHist
-    data_hist = ROOT.RooDataHist(
-        "data_hist", "Data Histogram", ROOT.RooArgList(mass), hist
-    )
-
-    # Signal: Gaussian
-    mean = ROOT.RooRealVar("mean", "Mean", 1.87, 1.85, 1.89)
-    sigma = ROOT.RooRealVar("sigma", "Sigma", 0.01, 0.005, 0.05)
-    signal = ROOT.RooGaussian("signal", "Signal Gaussian", mass, mean, sigma)
-
-    # Background: Exponential
-    slope = ROOT.RooRealVar("slope", "Slope", -1.0, -10.0, 0.0)
-    background = ROOT.RooExponential(
-        "background", "Background Exponential", mass, slope
-    )
-
-    # Combined model: Signal + Background
-    sig_frac = ROOT.RooRealVar("sig_frac", "Signal Fraction", 0.5, 0.0, 1.0)
-    model = ROOT.RooAddPdf(
-        "model",
-        "Signal + Background",
-        ROOT.RooArgList(signal, background),
-        ROOT.RooArgList(sig_frac),
-    )
-
-    # Perform the fit
-    fit_result = model.fitTo(data_hist, ROOT.RooFit.Save())
-
-    # Extract uncertainties from the fit result
-    fit_params = {
-        "mean": (mean.getVal(), mean.getError()),
-        "sigma": (sigma.getVal(), sigma.getError()),
-        "sig_frac": (sig_frac.getVal(), sig_frac.getError()),
-        "slope": (slope.getVal(), slope.getError()),
-    }
-
-    # Define the 3σ range around the mean
-    mean_val, mean_err = fit_params["mean"]
-    sigma_val, sigma_err = fit_params["sigma"]
-    range_min = mean_val - 3 * sigma_val
-    range_max = mean_val + 3 * sigma_val
-    mass.setRange("signal_region", range_min, range_max)
-
-    # Integrals for signal and background in the 3σ region
-    signal_integral = signal.createIntegral(
-        ROOT.RooArgSet(mass),
-        ROOT.RooFit.NormSet(ROOT.RooArgSet(mass)),
-        ROOT.RooFit.Range("signal_region"),
-    ).getVal()
-    background_integral = background.createIntegral(
-        ROOT.RooArgSet(mass),
-        ROOT.RooFit.NormSet(ROOT.RooArgSet(mass)),
-        ROOT.RooFit.Range("signal_region"),
-    ).getVal()
-
-    # Total number of events in the histogram
-    total_events = data_hist.sumEntries()
-
-    # Signal and background yields
-    sig_frac_val, sig_frac_err = fit_params["sig_frac"]
-    signal_yield = sig_frac_val * total_events * signal_integral
-    background_yield = (1 - sig_frac_val) * total_events * background_integral
-
-    # Uncertainty propagation for signal and background yields
-    signal_yield_err = (
-        signal_yield * sig_frac_err / sig_frac_val if sig_frac_val != 0 else 0
-    )
-    background_yield_err = (
-        background_yield * sig_frac_err / (1 - sig_frac_val) if sig_frac_val != 1 else 0
-    )
-
-    # Calculate significance and S/B
-    if background_yield > 0:
-        sb_ratio = signal_yield / background_yield
-        significance = signal_yield / (signal_yield + background_yield) ** 0.5
-        sb_ratio_err = (
-            sb_ratio
-            * (
-                (signal_yield_err / signal_yield) ** 2
-                + (background_yield_err / background_yield) ** 2
-            )
-            ** 0.5
-        )
-        significance_err = (
-            significance
-            * (
-                (signal_yield_err / signal_yield) ** 2
-                + (
-                    (signal_yield_err + background_yield_err)
-                    / (signal_yield + background_yield)
-                )
-                ** 2
-            )
-            ** 0.5
-        )
-    else:
-        sb_ratio, sb_ratio_err = float("inf"), 0
-        significance, significance_err = float("inf"), 0
-
-    # Print results
-    print(f"Mean: {mean_val:.4f} ± {mean_err:.4f} GeV/c^2")
-    print(f"Sigma: {sigma_val:.4f} ± {sigma_err:.4f} GeV/c^2")
-    print(f"Signal Events: {signal_yield:.2f} ± {signal_yield_err:.2f}")
-    print(f"Background Events: {background_yield:.2f} ± {background_yield_err:.2f}")
-    print(f"S/B Ratio: {sb_ratio:.2f} ± {sb_ratio_err:.2f}")
-    print(f"Significance: {significance:.2f} ± {significance_err:.2f}")
-
-    # Plot the fit
-    frame = mass.frame(ROOT.RooFit.Title(label))
-    data_hist.plotOn(
-        frame,
-        ROOT.RooFit.MarkerStyle(ROOT.kFullCircle),
-        ROOT.RooFit.MarkerColor(ROOT.kBlack),
-        ROOT.RooFit.MarkerSize(1.0),
-        ROOT.RooFit.DrawOption("PEZ1"),
-    )
-    model.plotOn(
-        frame,
-        ROOT.RooFit.Components("background"),
-        ROOT.RooFit.LineStyle(ROOT.kDashed),
-        ROOT.RooFit.LineColor(ROOT.kOrange + 1),
-    )
-    model.plotOn(frame, ROOT.RooFit.LineColor(ROOT.kAzure + 2))
-    model.plotOn(
-        frame,
-        ROOT.RooFit.Components("signal"),
-        ROOT.RooFit.LineColor(ROOT.kAzure + 2),
-        ROOT.RooFit.FillColor(ROOT.kAzure + 2),
-        ROOT.RooFit.FillStyle(3004),
-        ROOT.RooFit.LineWidth(1),
-        ROOT.RooFit.DrawOption("FL"),
-    )
-
-    # Draw the frame
-    canvas = ROOT.TCanvas("canvas", "Fit Results", 800, 600)
-    frame.Draw()
-
-    # Add LaTeX labels
-    latex = ROOT.TLatex()
-    latex.SetTextSize(0.04)  # Set text size
-    latex.SetTextFont(42)  # Set font (42 = Helvetica)
-    latex.SetNDC(True)  # Use normalized device coordinates (NDC)
-
-    # Add labels to the plot
-    latex.DrawLatex(
-        0.15, 0.84, f"#mu=({mean_val:.3f}#pm{mean_err:.3f}) GeV/#it{{c}}^{{2}}"
-    )
-    latex.DrawLatex(
-        0.15, 0.80, f"#sigma=({sigma_val:.3f}#pm{sigma_err:.3f}) GeV/#it{{c}}^{{2}}"
-    )
-    latex.DrawLatex(0.60, 0.84, f"#it{{S}}={signal_yield:.2f}#pm{signal_yield_err:.2f}")
-    latex.DrawLatex(
-        0.60, 0.80, f"#it{{B}}={background_yield:.2f}#pm{background_yield_err:.2f}"
-    )
-    latex.DrawLatex(0.60, 0.76, f"#it{{S/B}}={sb_ratio:.2f}#pm{sb_ratio_err:.2f}")
-    latex.DrawLatex(0.60, 0.72, f"Signif.={significance:.2f}#pm{significance_err:.2f}")
-
-    canvas.SaveAs(f"{outdir}/fit_result_{hist.GetName()}.png")
-
-    # Return results as a dictionary
-    results = {
-        "mean": (mean_val, mean_err),
-        "sigma": (sigma_val, sigma_err),
-        "signal": (signal_yield, signal_yield_err),
-        "background": (background_yield, background_yield_err),
-        "s/b": (sb_ratio, sb_ratio_err),
-        "significance": (significance, significance_err),
-    }
-    return results
-
-
-def set_style(histo, ytitle):
+def set_style(histo, ytitle, iocc):
     histo.GetXaxis().SetTitle("#it{p}_{T} (GeV/#it{c})")
     histo.GetXaxis().SetTitleOffset(1.2)
     histo.GetXaxis().SetLabelSize(0.045)
@@ -282,498 +108,521 @@ def set_style(histo, ytitle):
     histo.SetLineWidth(2)
 
 
-def count_entries_in_interval(x_range, y_range,
-                              file_name='/home/spolitan/alice/analyses/hf-mc/postprocess/inputs/AnalysisResults_nev_small.root', hist_name='hf-task-flow-charm-hadrons/hCollisionsCentOcc'):
+def load_occupancy_config(config_file=None):
     """
-    Counts the entries of a TH2 histogram within a given interval.
+    Reads the configuration of the occupancy study (occupancy_study.yml by default),
+    with the fit cache relative to the directory of the configuration file
+    """
+    if config_file is None:
+        config_file = DEFAULT_CONFIG
+    with open(config_file, "r") as f:
+        config = yaml.safe_load(f)
+
+    missing = [key for key in CONFIG_KEYS if key not in config]
+    if missing:
+        raise ValueError(f"Missing keys {missing} in the configuration {config_file}")
+    config.setdefault("fit_cache", None)
+    if config["fit_cache"] is not None:
+        # independent of the working directory, so that the cache is found in the following runs
+        config["fit_cache"] = os.path.join(os.path.dirname(os.path.abspath(config_file)), config["fit_cache"])
+
+    return config
 
-    Parameters:
-        file_name (str): The name of the ROOT file containing the histogram.
-        hist_name (str): The name of the TH2 histogram.
-        x_range (tuple): A tuple (x_min, x_max) defining the x-axis range.
-        y_range (tuple): A tuple (y_min, y_max) defining the y-axis range.
+
+def get_runs(config, estimators=None):
+    """
+    List of the analyses to be performed, one for each centrality set and occupancy
+    estimator (only the ones in estimators, if given)
+    """
+    runs = []
+    for centralities in config["centralities"]:
+        for est_name, estimator in config["estimators"].items():
+            if estimators and est_name not in estimators:
+                continue
+            tags = {"cent_min": centralities[0], "cent_max": centralities[-1], "estimator": est_name}
+            outdir = estimator["outdir"].format(**tags)
+            runs.append({
+                "name": f"{est_name}_cent{centralities[0]}_{centralities[-1]}",
+                "centralities": list(centralities),
+                "occupancies": [occ * estimator.get("occupancy_scale", 1) for occ in config["occupancies"]],
+                "infile": config["input"].format(**tags),
+                "indir": estimator["dir"],
+                "events": dict(config["events"], **estimator.get("events", {})),
+                "outdir": outdir,
+                "outfile": os.path.join(outdir, config["outfile"].format(**tags)),
+            })
+
+    return runs
+
+
+def prepare_run(run, thn, filled_bins, event_counter, pt_bins, mass_range):
+    """
+    Projects the mass and sp histograms of a run in all the centrality, occupancy and
+    pt intervals, writes them in the output file of the run and prepares the fit tasks
 
     Returns:
-        int: The count of entries in the specified interval.
+        - dictionary with the output file, the histograms to be filled with the fit
+          results, the numbers of events, the fit tasks and the corresponding intervals
     """
-    # Open the ROOT file
-    file = ROOT.TFile(file_name, "READ")
-    if not file.IsOpen():
-        raise IOError(f"Could not open file {file_name}.")
-
-    # Retrieve the histogram
-    hist = file.Get(hist_name)
-    if not hist or not isinstance(hist, ROOT.TH2):
-        raise ValueError(f"Histogram {hist_name} not found or not a TH2 in file {file_name}.")
-
-    # Find the bin range corresponding to the specified intervals
-    x_bin_min = hist.GetXaxis().FindBin(x_range[0]+0.0001)
-    x_bin_max = hist.GetXaxis().FindBin(x_range[1]-0.0001)
-    y_bin_min = hist.GetYaxis().FindBin(y_range[0]+0.0001)
-    y_bin_max = hist.GetYaxis().FindBin(y_range[1]-0.0001)
-
-    # Count the entries in the specified range
-    entry_count = 0
-    for x_bin in range(x_bin_min, x_bin_max + 1):
-        for y_bin in range(y_bin_min, y_bin_max + 1):
-            entry_count += hist.GetBinContent(x_bin, y_bin)
-
-    # Close the file
-    file.Close()
-
-    return entry_count
-
-# Main script
-centralities = [20, 50]
-useFT0c = False
-infile = f"/home/spolitan/alice/analyses/hf-mc/postprocess/inputs/AnalysisResults_data_d0_occupancy_{centralities[0]}{centralities[1]}.root"
-
-if useFT0c:
-    indir = "hf-task-flow-charm-hadrons_occ_ft0c"
-else:
-    indir = "hf-task-flow-charm-hadrons"
-
-thn_name = "hSparseFlowCharm"
-if useFT0c:
-    outdir = f"data_occupancy_ft0c_norm_{centralities[0]}{centralities[1]}"
-else:
-    outdir = f"data_occupancy_d0_norm_{centralities[0]}{centralities[1]}"
-
-occupancies = [0, 2000, 4000, 999999]
-pt_bins = [2, 3, 4, 5, 6, 8, 10, 12, 24]
-
-thn = load_thnsparse(infile, indir, thn_name)
-
-os.makedirs(outdir, exist_ok=True)
-if useFT0c:
-    outfile = ROOT.TFile(
-        f"{outdir}/projected_thn_dataocc_ft0c_{centralities[0]}{centralities[1]}.root",
-        "RECREATE",
-    )
-else:
-    outfile = ROOT.TFile(
-    f"{outdir}/projected_thn_dataocc_ft0c_{centralities[0]}{centralities[1]}.root",
-    "RECREATE",
-    )
+    centralities, occupancies, outdir = run["centralities"], run["occupancies"], run["outdir"]
+    os.makedirs(outdir, exist_ok=True)
+    outfile = ROOT.TFile(run["outfile"], "RECREATE")
+
+    hcorr_cent_occ = thn.Projection(2, 4)
+    # the occupancies of the FT0c estimator are scaled from the ITS ones with the occupancy_scale
+    # of the configuration, to be replaced by a fit of the trackOccVsFT0COcc correlation
 
-hcorr_cent_occ = thn.Projection(2, 4)
-if useFT0c: # get scaling factor from ITS to FT0c
-    for i, _ in enumerate(occupancies):
-        occupancies[i] *= 10
-    
-    
-    '''
-    calculate scaling factor with fit to be done
-    
-    root_file = ROOT.TFile.Open(infile, "READ")
-    hcorr_occits_occft0c = root_file.Get(f"{indir}/trackOccVsFT0COcc")
-    its_occ = ROOT.RooRealVar("its_occ", "X", 0, 14000)
-    ft0c_occ = ROOT.RooRealVar("ft0c_occ", "Y", 0, 140.e+03)
-
-    data = ROOT.RooDataHist(
-        "data_hist", "Data Histogram", ROOT.RooArgList(its_occ, ft0c_occ), hcorr_occits_occft0c
+    # pt, centrality and occupancy merged into the analysis bins
+    mass_cube, sp_cube = get_sparse_cubes(
+        thn, [(0, 1, 2, 4), (3, 1, 2, 4)], {1: pt_bins, 2: centralities, 4: occupancies}, filled_bins
     )
-    
-    p0 = ROOT.RooRealVar("p0", "Intercept", 0, -10, 10)
-    p1 = ROOT.RooRealVar("p1", "Slope", 1, -5, 5)
-
-    # RooPolyVar models y as a function of x (y = p0 + p1*x)
-    linear_model = ROOT.RooPolynomial("linear_model", "Linear Model", its_occ, ROOT.RooArgList(p1, p0))
-
-    # Step 5: Fit the data
-    fit_result = linear_model.fitTo(data, ROOT.RooFit.Save())
-
-    # Step 6: Visualize the fit
-    canvas = ROOT.TCanvas("canvas", "Fit Results", 800, 600)
-
-    # Step 6: Plot the TH2 histogram with the fitted linear model
-    canvas = ROOT.TCanvas("canvas", "Fit Results", 800, 600)
-    hcorr_occits_occft0c.Draw("COLZ")  # Draw the TH2 histogram as a color plot
-
-    # Overlay the linear fit as a line
-    fit_line = ROOT.TF1("fit_line", "[0] + [1]*x", 0, 14000)
-    fit_line.SetParameter(0, p0.getVal())
-    fit_line.SetParameter(1, p1.getVal())
-    fit_line.SetLineColor(ROOT.kRed)
-    fit_line.SetLineWidth(2)
-    fit_line.Draw("SAME")  # Overlay the fit on the histogram
-    canvas.SaveAs('cicio.png')
-    input()
-    '''
-
-hist_mean, hist_sigma, hist_s, hist_b, hist_soverb, hist_signif = ([] for _ in range(6))
-for icent, (cent_min, cent_max) in enumerate(
-    zip(centralities[:-1], centralities[1:])
-):  # loop over centrality
-    hist_mean.append({})
-    hist_sigma.append({})
-    hist_s.append({})
-    hist_b.append({})
-    hist_soverb.append({})
-    hist_signif.append({})
-
-    hist_mean[icent] = {}
-    hist_sigma[icent] = {}
-    hist_s[icent] = {}
-    hist_b[icent] = {}
-    hist_soverb[icent] = {}
-    hist_signif[icent] = {}
-
-    for iocc, (occ_min, occ_max) in enumerate(
-        zip(occupancies[:-1], occupancies[1:])
-    ):  # loop over occupancy
-        nbins = len(pt_bins) - 1
-        hist_mean[icent][iocc] = ROOT.TH1F(
-            f"hist_mean_cent{cent_min}_{cent_max}_occ{occ_min}_{occ_max}",
-            "; #it{p}_{T} (GeV/#it{c})",
-            nbins,
-            np.asarray(pt_bins, "d"),
-        )
-        hist_sigma[icent][iocc] = ROOT.TH1F(
-            f"hist_sigma_cent{cent_min}_{cent_max}_occ{occ_min}_{occ_max}",
-            "; #it{p}_{T} (GeV/#it{c})",
-            nbins,
-            np.asarray(pt_bins, "d"),
-        )
-        hist_s[icent][iocc] = ROOT.TH1F(
-            f"hist_s_cent{cent_min}_{cent_max}_occ{occ_min}_{occ_max}",
-            "; #it{p}_{T} (GeV/#it{c})",
-            nbins,
-            np.asarray(pt_bins, "d"),
-        )
-        hist_b[icent][iocc] = ROOT.TH1F(
-            f"hist_b_cent{cent_min}_{cent_max}_occ{occ_min}_{occ_max}",
-            "; #it{p}_{T} (GeV/#it{c})",
-            nbins,
-            np.asarray(pt_bins, "d"),
-        )
-        hist_soverb[icent][iocc] = ROOT.TH1F(
-            f"hist_soverb_cent{cent_min}_{cent_max}_occ{occ_min}_{occ_max}",
-            "; #it{p}_{T} (GeV/#it{c})",
-            nbins,
-            np.asarray(pt_bins, "d"),
-        )
-        hist_signif[icent][iocc] = ROOT.TH1F(
-            f"hist_signif_cent{cent_min}_{cent_max}_occ{occ_min}_{occ_max}",
-            "; #it{p}_{T} (GeV/#it{c})",
-            nbins,
-            np.asarray(pt_bins, "d"),
-        )
-        
-        nev = count_entries_in_interval([cent_min, cent_max], [occ_min, occ_max])
-        input(f" Nev in cent({cent_min}-{cent_max}) occ({occ_min}-{occ_max}): {nev}")
-        
-        for ipt, (pt_min, pt_max) in enumerate(
-            zip(pt_bins[:-1], pt_bins[1:])
-        ):  # loop over pt bins
-            thn.GetAxis(2).SetRangeUser(cent_min, cent_max)
-            thn.GetAxis(4).SetRangeUser(occ_min, occ_max)
-            thn.GetAxis(1).SetRangeUser(pt_min, pt_max)
-
-            hmass = thn.Projection(0)
-            hsp = thn.Projection(3)
-            hmass.SetName(
-                f"hmass_cent{cent_min}_{cent_max}_occ{occ_min}_{occ_max}_pt{pt_min}_{pt_max}"
+
+    fit_tasks, fit_cells, nevs = [], [], {}
+    hist_mean, hist_sigma, hist_s, hist_b, hist_soverb, hist_signif = ([] for _ in range(6))
+    for icent, (cent_min, cent_max) in enumerate(
+        zip(centralities[:-1], centralities[1:])
+    ):  # loop over centrality
+        hist_mean.append({})
+        hist_sigma.append({})
+        hist_s.append({})
+        hist_b.append({})
+        hist_soverb.append({})
+        hist_signif.append({})
+
+        for iocc, (occ_min, occ_max) in enumerate(
+            zip(occupancies[:-1], occupancies[1:])
+        ):  # loop over occupancy
+            nbins = len(pt_bins) - 1
+            hist_mean[icent][iocc] = ROOT.TH1F(
+                f"hist_mean_cent{cent_min}_{cent_max}_occ{occ_min}_{occ_max}",
+                "; #it{p}_{T} (GeV/#it{c})",
+                nbins,
+                np.asarray(pt_bins, "d"),
             )
-            hsp.SetName(
-                f"hsp_cent{cent_min}_{cent_max}_occ{occ_min}_{occ_max}_pt{pt_min}_{pt_max}"
+            hist_sigma[icent][iocc] = ROOT.TH1F(
+                f"hist_sigma_cent{cent_min}_{cent_max}_occ{occ_min}_{occ_max}",
+                "; #it{p}_{T} (GeV/#it{c})",
+                nbins,
+                np.asarray(pt_bins, "d"),
             )
-
-            # Perform invariant mass fit
-            dict = fit_invariant_mass(
-                hmass,
-                mass_range=(1.72, 2.04),
-                label=f"Cent. {cent_min}-{cent_max}, Occ. {occ_min}-{occ_max}, #it{{p}}_{{T}} {pt_min}-{pt_max}",
+            hist_s[icent][iocc] = ROOT.TH1F(
+                f"hist_s_cent{cent_min}_{cent_max}_occ{occ_min}_{occ_max}",
+                "; #it{p}_{T} (GeV/#it{c})",
+                nbins,
+                np.asarray(pt_bins, "d"),
+            )
+            hist_b[icent][iocc] = ROOT.TH1F(
+                f"hist_b_cent{cent_min}_{cent_max}_occ{occ_min}_{occ_max}",
+                "; #it{p}_{T} (GeV/#it{c})",
+                nbins,
+                np.asarray(pt_bins, "d"),
+            )
+            hist_soverb[icent][iocc] = ROOT.TH1F(
+                f"hist_soverb_cent{cent_min}_{cent_max}_occ{occ_min}_{occ_max}",
+                "; #it{p}_{T} (GeV/#it{c})",
+                nbins,
+                np.asarray(pt_bins, "d"),
+            )
+            hist_signif[icent][iocc] = ROOT.TH1F(
+                f"hist_signif_cent{cent_min}_{cent_max}_occ{occ_min}_{occ_max}",
+                "; #it{p}_{T} (GeV/#it{c})",
+                nbins,
+                np.asarray(pt_bins, "d"),
             )
 
-            hist_mean[icent][iocc].SetBinContent(ipt + 1, dict["mean"][0])
-            hist_mean[icent][iocc].SetBinError(ipt + 1, dict["mean"][1])
-            hist_sigma[icent][iocc].SetBinContent(ipt + 1, dict["sigma"][0])
-            hist_sigma[icent][iocc].SetBinError(ipt + 1, dict["sigma"][1])
-            hist_s[icent][iocc].SetBinContent(ipt + 1, dict["signal"][0] / nev)
-            hist_s[icent][iocc].SetBinError(ipt + 1, dict["signal"][1] / nev)
-            hist_b[icent][iocc].SetBinContent(ipt + 1, dict["background"][0] / nev)
-            hist_b[icent][iocc].SetBinError(ipt + 1, dict["background"][1] / nev)
-            hist_soverb[icent][iocc].SetBinContent(ipt + 1, dict["s/b"][0])
-            hist_soverb[icent][iocc].SetBinError(ipt + 1, dict["s/b"][1])
-            hist_signif[icent][iocc].SetBinContent(ipt + 1, dict["significance"][0] / np.sqrt(nev))
-            hist_signif[icent][iocc].SetBinError(ipt + 1, dict["significance"][1] / np.sqrt(nev))
-
-            hmass.Write()
-            hsp.Write()
-
-        hist_mean[icent][iocc].Write()
-        hist_sigma[icent][iocc].Write()
-        hist_s[icent][iocc].Write()
-        hist_b[icent][iocc].Write()
-        hist_soverb[icent][iocc].Write()
-        hist_signif[icent][iocc].Write()
-
-    hist_ratio_mean, hist_ratio_mean_empty = [], []
-    hist_ratio_sigma, hist_ratio_sigma_empty = [], []
-    hist_ratio_s, hist_ratio_s_empty = [], []
-    hist_ratio_b, hist_ratio_b_empty = [], []
-    hist_ratio_signif, hist_ratio_signif_empty = [], []
-    hist_ratio_soverb, hist_ratio_soverb_empty = [], []
-
-    canvas_cent_ratio_s = ROOT.TCanvas(
-        f"cratio_s_cent{cent_min}_{cent_max}",
-        ";#it{p}_{T} (GeV/#it{c}); #it{S}(Occ) / #it{S}(0-2000)",
-        600,
-        600,
-    )
-    canvas_cent_ratio_s.cd().SetGridy()
-    canvas_cent_ratio_s.cd().SetGridx()
-    #canvas_cent_ratio_s.cd().SetLogy()
-    canvas_cent_ratio_s.cd().SetLeftMargin(0.2)
-
-    legend = ROOT.TLegend(0.35, 0.2, 0.8, 0.5)
-    legend.SetBorderSize(0)
-    legend.SetFillStyle(0)
-    legend.SetTextSize(0.035)
-    leg_empty = legend.Clone()
-    legend.SetHeader(f"D^{{#plus}} {cent_min}-{cent_max}% centrality")
-    leg_empty.SetHeader(" ")
-    for iocc, (occ_min, occ_max) in enumerate(
-        zip(occupancies[:-1], occupancies[1:])
-    ):  # loop over occupancy
-        hist_ratio_s.append(hist_s[icent][iocc].Clone())
-        hist_ratio_s[-1].SetName(
-            f"hist_ratio_s_cent{cent_min}_{cent_max}_occ{occ_min}_{occ_max}"
-        )
-        hist_ratio_s[-1].Divide(hist_s[icent][iocc], hist_s[icent][0], 1.0, 1.0, "B")
-
-        set_style(hist_ratio_s[-1], "#it{S}(Occ)/#it{S}(0-2000)")
-        hist_ratio_s_empty.append(get_empty_clone(hist_ratio_s[-1]))
-        hist_ratio_s_empty[-1].SetDirectory(0)
-
-        canvas_cent_ratio_s.cd()
-        hist_ratio_s[-1].Draw("P SAME")
-        hist_ratio_s_empty[-1].Draw("P SAME")
-        legend.AddEntry(hist_ratio_s[-1], f"Occupancy {occ_min}-{occ_max}", "p")
-    legend.Draw()
-    canvas_cent_ratio_s.Write()
-
-    canvas_cent_ratio_b = ROOT.TCanvas(
-        f"cratio_b_cent{cent_min}_{cent_max}",
-        ";#it{p}_{T} (GeV/#it{c}); #it{B}(Occ)/#it{B}(0-2000)",
-        600,
-        600,
-    )
-    canvas_cent_ratio_b.cd().SetGridy()
-    canvas_cent_ratio_b.cd().SetGridx()
-    #canvas_cent_ratio_b.cd().SetLogy()
-    canvas_cent_ratio_b.cd().SetLeftMargin(0.2)
-
-    legend = ROOT.TLegend(0.35, 0.2, 0.8, 0.5)
-    legend.SetBorderSize(0)
-    legend.SetFillStyle(0)
-    legend.SetTextSize(0.035)
-    leg_empty = legend.Clone()
-    legend.SetHeader(f"D^{{#plus}} {cent_min}-{cent_max}% centrality")
-    leg_empty.SetHeader(" ")
-    for iocc, (occ_min, occ_max) in enumerate(
-        zip(occupancies[:-1], occupancies[1:])
-    ):  # loop over occupancy
-        hist_ratio_b.append(hist_b[icent][iocc].Clone())
-        hist_ratio_b[-1].SetName(
-            f"hist_ratio_b_cent{cent_min}_{cent_max}_occ{occ_min}_{occ_max}"
+            nevs[icent, iocc] = event_counter.count((cent_min, cent_max), (occ_min, occ_max))
+            print(f"{run['name']}: Nev in cent({cent_min}-{cent_max}) occ({occ_min}-{occ_max}): {nevs[icent, iocc]}")
+
+            for ipt, (pt_min, pt_max) in enumerate(
+                zip(pt_bins[:-1], pt_bins[1:])
+            ):  # loop over pt bins
+                ranges = {2: (cent_min, cent_max), 4: (occ_min, occ_max), 1: (pt_min, pt_max)}
+                hmass = mass_cube.get_th1(
+                    f"hmass_cent{cent_min}_{cent_max}_occ{occ_min}_{occ_max}_pt{pt_min}_{pt_max}", 0, ranges
+                )
+                hsp = sp_cube.get_th1(
+                    f"hsp_cent{cent_min}_{cent_max}_occ{occ_min}_{occ_max}_pt{pt_min}_{pt_max}", 3, ranges
+                )
+                fit_tasks.append(get_fit_task(
+                    hmass,
+                    mass_range=tuple(mass_range),
+                    label=f"Cent. {cent_min}-{cent_max}, Occ. {occ_min}-{occ_max}, #it{{p}}_{{T}} {pt_min}-{pt_max}",
+                    outdir=outdir,
+                    chain=(run["name"], icent, iocc),
+                ))
+                fit_cells.append((icent, iocc, ipt))
+
+                hmass.Write()
+                hsp.Write()
+
+    return {
+        "outfile": outfile,
+        "hcorr_cent_occ": hcorr_cent_occ,
+        "hists": (hist_mean, hist_sigma, hist_s, hist_b, hist_soverb, hist_signif),
+        "nevs": nevs,
+        "fit_tasks": fit_tasks,
+        "fit_cells": fit_cells,
+    }
+
+
+def write_run(run, prepared, fit_results):
+    """
+    Fills the histograms of a run with the fit results (normalised to the number of events),
+    and writes them with the ratios to the lowest occupancy interval
+    """
+    centralities, occupancies, outdir = run["centralities"], run["occupancies"], run["outdir"]
+    hist_mean, hist_sigma, hist_s, hist_b, hist_soverb, hist_signif = prepared["hists"]
+    nevs = prepared["nevs"]
+    prepared["outfile"].cd()
+
+    for (icent, iocc, ipt), result in zip(prepared["fit_cells"], fit_results):
+        nev = nevs[icent, iocc]
+        hist_mean[icent][iocc].SetBinContent(ipt + 1, result["mean"][0])
+        hist_mean[icent][iocc].SetBinError(ipt + 1, result["mean"][1])
+        hist_sigma[icent][iocc].SetBinContent(ipt + 1, result["sigma"][0])
+        hist_sigma[icent][iocc].SetBinError(ipt + 1, result["sigma"][1])
+        hist_s[icent][iocc].SetBinContent(ipt + 1, result["signal"][0] / nev)
+        hist_s[icent][iocc].SetBinError(ipt + 1, result["signal"][1] / nev)
+        hist_b[icent][iocc].SetBinContent(ipt + 1, result["background"][0] / nev)
+        hist_b[icent][iocc].SetBinError(ipt + 1, result["background"][1] / nev)
+        hist_soverb[icent][iocc].SetBinContent(ipt + 1, result["s/b"][0])
+        hist_soverb[icent][iocc].SetBinError(ipt + 1, result["s/b"][1])
+        hist_signif[icent][iocc].SetBinContent(ipt + 1, result["significance"][0] / np.sqrt(nev))
+        hist_signif[icent][iocc].SetBinError(ipt + 1, result["significance"][1] / np.sqrt(nev))
+
+    for icent, (cent_min, cent_max) in enumerate(
+        zip(centralities[:-1], centralities[1:])
+    ):  # loop over centrality
+        for iocc, _ in enumerate(zip(occupancies[:-1], occupancies[1:])):
+            hist_mean[icent][iocc].Write()
+            hist_sigma[icent][iocc].Write()
+            hist_s[icent][iocc].Write()
+            hist_b[icent][iocc].Write()
+            hist_soverb[icent][iocc].Write()
+            hist_signif[icent][iocc].Write()
+
+        hist_ratio_mean, hist_ratio_mean_empty = [], []
+        hist_ratio_sigma, hist_ratio_sigma_empty = [], []
+        hist_ratio_s, hist_ratio_s_empty = [], []
+        hist_ratio_b, hist_ratio_b_empty = [], []
+        hist_ratio_signif, hist_ratio_signif_empty = [], []
+        hist_ratio_soverb, hist_ratio_soverb_empty = [], []
+
+        canvas_cent_ratio_s = ROOT.TCanvas(
+            f"cratio_s_cent{cent_min}_{cent_max}",
+            ";#it{p}_{T} (GeV/#it{c}); #it{S}(Occ) / #it{S}(0-2000)",
+            600,
+            600,
         )
-        hist_ratio_b[-1].Divide(hist_b[icent][iocc], hist_b[icent][0], 1.0, 1.0, "B")
-
-        set_style(hist_ratio_b[-1], "#it{B}(Occ)/#it{B}(0-2000)")
-        hist_ratio_b_empty.append(get_empty_clone(hist_ratio_b[-1]))
-        hist_ratio_b_empty[-1].SetDirectory(0)
-
-        canvas_cent_ratio_b.cd()
-        hist_ratio_b[-1].Draw("P SAME")
-        hist_ratio_b_empty[-1].Draw("P SAME")
-        legend.AddEntry(hist_ratio_b[-1], f"Occupancy {occ_min}-{occ_max}", "p")
-    legend.Draw()
-    canvas_cent_ratio_b.Write()
-
-    canvas_cent_ratio_soverb = ROOT.TCanvas(
-        f"cratio_soverb_cent{cent_min}_{cent_max}",
-        ";#it{p}_{T} (GeV/#it{c}); #it{S/B}(Occ)/#it{S/B}(0-2000)",
-        600,
-        600,
-    )
-    canvas_cent_ratio_soverb.cd().SetGridy()
-    canvas_cent_ratio_soverb.cd().SetGridx()
-    #canvas_cent_ratio_soverb.cd().SetLogy()
-    canvas_cent_ratio_soverb.cd().SetLeftMargin(0.2)
-
-    legend = ROOT.TLegend(0.35, 0.2, 0.8, 0.5)
-    legend.SetBorderSize(0)
-    legend.SetFillStyle(0)
-    legend.SetTextSize(0.035)
-    leg_empty = legend.Clone()
-    legend.SetHeader(f"D^{{#plus}} {cent_min}-{cent_max}% centrality")
-    leg_empty.SetHeader(" ")
-    for iocc, (occ_min, occ_max) in enumerate(
-        zip(occupancies[:-1], occupancies[1:])
-    ):  # loop over occupancy
-        hist_ratio_soverb.append(hist_soverb[icent][iocc].Clone())
-        hist_ratio_soverb[-1].SetName(
-            f"hist_ratio_soverb_cent{cent_min}_{cent_max}_occ{occ_min}_{occ_max}"
+        canvas_cent_ratio_s.cd().SetGridy()
+        canvas_cent_ratio_s.cd().SetGridx()
+        #canvas_cent_ratio_s.cd().SetLogy()
+        canvas_cent_ratio_s.cd().SetLeftMargin(0.2)
+
+        legend = ROOT.TLegend(0.35, 0.2, 0.8, 0.5)
+        legend.SetBorderSize(0)
+        legend.SetFillStyle(0)
+        legend.SetTextSize(0.035)
+        leg_empty = legend.Clone()
+        legend.SetHeader(f"D^{{#plus}} {cent_min}-{cent_max}% centrality")
+        leg_empty.SetHeader(" ")
+        for iocc, (occ_min, occ_max) in enumerate(
+            zip(occupancies[:-1], occupancies[1:])
+        ):  # loop over occupancy
+            hist_ratio_s.append(hist_s[icent][iocc].Clone())
+            hist_ratio_s[-1].SetName(
+                f"hist_ratio_s_cent{cent_min}_{cent_max}_occ{occ_min}_{occ_max}"
+            )
+            hist_ratio_s[-1].Divide(hist_s[icent][iocc], hist_s[icent][0], 1.0, 1.0, "B")
+
+            set_style(hist_ratio_s[-1], "#it{S}(Occ)/#it{S}(0-2000)", iocc)
+            hist_ratio_s_empty.append(get_empty_clone(hist_ratio_s[-1]))
+            hist_ratio_s_empty[-1].SetDirectory(0)
+
+            canvas_cent_ratio_s.cd()
+            hist_ratio_s[-1].Draw("P SAME")
+            hist_ratio_s_empty[-1].Draw("P SAME")
+            legend.AddEntry(hist_ratio_s[-1], f"Occupancy {occ_min}-{occ_max}", "p")
+        legend.Draw()
+        canvas_cent_ratio_s.Write()
+
+        canvas_cent_ratio_b = ROOT.TCanvas(
+            f"cratio_b_cent{cent_min}_{cent_max}",
+            ";#it{p}_{T} (GeV/#it{c}); #it{B}(Occ)/#it{B}(0-2000)",
+            600,
+            600,
         )
-        hist_ratio_soverb[-1].Divide(
-            hist_soverb[icent][iocc], hist_soverb[icent][0], 1.0, 1.0, "B"
+        canvas_cent_ratio_b.cd().SetGridy()
+        canvas_cent_ratio_b.cd().SetGridx()
+        #canvas_cent_ratio_b.cd().SetLogy()
+        canvas_cent_ratio_b.cd().SetLeftMargin(0.2)
+
+        legend = ROOT.TLegend(0.35, 0.2, 0.8, 0.5)
+        legend.SetBorderSize(0)
+        legend.SetFillStyle(0)
+        legend.SetTextSize(0.035)
+        leg_empty = legend.Clone()
+        legend.SetHeader(f"D^{{#plus}} {cent_min}-{cent_max}% centrality")
+        leg_empty.SetHeader(" ")
+        for iocc, (occ_min, occ_max) in enumerate(
+            zip(occupancies[:-1], occupancies[1:])
+        ):  # loop over occupancy
+            hist_ratio_b.append(hist_b[icent][iocc].Clone())
+            hist_ratio_b[-1].SetName(
+                f"hist_ratio_b_cent{cent_min}_{cent_max}_occ{occ_min}_{occ_max}"
+            )
+            hist_ratio_b[-1].Divide(hist_b[icent][iocc], hist_b[icent][0], 1.0, 1.0, "B")
+
+            set_style(hist_ratio_b[-1], "#it{B}(Occ)/#it{B}(0-2000)", iocc)
+            hist_ratio_b_empty.append(get_empty_clone(hist_ratio_b[-1]))
+            hist_ratio_b_empty[-1].SetDirectory(0)
+
+            canvas_cent_ratio_b.cd()
+            hist_ratio_b[-1].Draw("P SAME")
+            hist_ratio_b_empty[-1].Draw("P SAME")
+            legend.AddEntry(hist_ratio_b[-1], f"Occupancy {occ_min}-{occ_max}", "p")
+        legend.Draw()
+        canvas_cent_ratio_b.Write()
+
+        canvas_cent_ratio_soverb = ROOT.TCanvas(
+            f"cratio_soverb_cent{cent_min}_{cent_max}",
+            ";#it{p}_{T} (GeV/#it{c}); #it{S/B}(Occ)/#it{S/B}(0-2000)",
+            600,
+            600,
         )
+        canvas_cent_ratio_soverb.cd().SetGridy()
+        canvas_cent_ratio_soverb.cd().SetGridx()
+        #canvas_cent_ratio_soverb.cd().SetLogy()
+        canvas_cent_ratio_soverb.cd().SetLeftMargin(0.2)
+
+        legend = ROOT.TLegend(0.35, 0.2, 0.8, 0.5)
+        legend.SetBorderSize(0)
+        legend.SetFillStyle(0)
+        legend.SetTextSize(0.035)
+        leg_empty = legend.Clone()
+        legend.SetHeader(f"D^{{#plus}} {cent_min}-{cent_max}% centrality")
+        leg_empty.SetHeader(" ")
+        for iocc, (occ_min, occ_max) in enumerate(
+            zip(occupancies[:-1], occupancies[1:])
+        ):  # loop over occupancy
+            hist_ratio_soverb.append(hist_soverb[icent][iocc].Clone())
+            hist_ratio_soverb[-1].SetName(
+                f"hist_ratio_soverb_cent{cent_min}_{cent_max}_occ{occ_min}_{occ_max}"
+            )
+            hist_ratio_soverb[-1].Divide(
+                hist_soverb[icent][iocc], hist_soverb[icent][0], 1.0, 1.0, "B"
+            )
 
-        set_style(hist_ratio_soverb[-1], "#it{S/B}(Occ)/#it{S/B}(0-2000)")
-        hist_ratio_soverb_empty.append(get_empty_clone(hist_ratio_soverb[-1]))
-        hist_ratio_soverb_empty[-1].SetDirectory(0)
-
-        canvas_cent_ratio_soverb.cd()
-        hist_ratio_soverb[-1].Draw("P SAME")
-        hist_ratio_soverb_empty[-1].Draw("P SAME")
-        legend.AddEntry(hist_ratio_soverb[-1], f"Occupancy {occ_min}-{occ_max}", "p")
-    legend.Draw()
-    canvas_cent_ratio_soverb.Write()
-
-    canvas_cent_ratio_signif = ROOT.TCanvas(
-        f"cratio_signif_cent{cent_min}_{cent_max}",
-        ";#it{p}_{T} (GeV/#it{c}); Signif.(Occ)/Signif.(0-2000)",
-        600,
-        600,
-    )
-    canvas_cent_ratio_signif.cd().SetGridy()
-    canvas_cent_ratio_signif.cd().SetGridx()
-    #canvas_cent_ratio_signif.cd().SetLogy()
-    canvas_cent_ratio_signif.cd().SetLeftMargin(0.2)
-
-    legend = ROOT.TLegend(0.35, 0.2, 0.8, 0.5)
-    legend.SetBorderSize(0)
-    legend.SetFillStyle(0)
-    legend.SetTextSize(0.035)
-    leg_empty = legend.Clone()
-    legend.SetHeader(f"D^{{#plus}} {cent_min}-{cent_max}% centrality")
-    leg_empty.SetHeader(" ")
-    for iocc, (occ_min, occ_max) in enumerate(
-        zip(occupancies[:-1], occupancies[1:])
-    ):  # loop over occupancy
-        hist_ratio_signif.append(hist_signif[icent][iocc].Clone())
-        hist_ratio_signif[-1].SetName(
-            f"hist_ratio_signif_cent{cent_min}_{cent_max}_occ{occ_min}_{occ_max}"
-        )
-        hist_ratio_signif[-1].Divide(
-            hist_signif[icent][iocc], hist_signif[icent][0], 1.0, 1.0, "B"
+            set_style(hist_ratio_soverb[-1], "#it{S/B}(Occ)/#it{S/B}(0-2000)", iocc)
+            hist_ratio_soverb_empty.append(get_empty_clone(hist_ratio_soverb[-1]))
+            hist_ratio_soverb_empty[-1].SetDirectory(0)
+
+            canvas_cent_ratio_soverb.cd()
+            hist_ratio_soverb[-1].Draw("P SAME")
+            hist_ratio_soverb_empty[-1].Draw("P SAME")
+            legend.AddEntry(hist_ratio_soverb[-1], f"Occupancy {occ_min}-{occ_max}", "p")
+        legend.Draw()
+        canvas_cent_ratio_soverb.Write()
+
+        canvas_cent_ratio_signif = ROOT.TCanvas(
+            f"cratio_signif_cent{cent_min}_{cent_max}",
+            ";#it{p}_{T} (GeV/#it{c}); Signif.(Occ)/Signif.(0-2000)",
+            600,
+            600,
         )
+        canvas_cent_ratio_signif.cd().SetGridy()
+        canvas_cent_ratio_signif.cd().SetGridx()
+        #canvas_cent_ratio_signif.cd().SetLogy()
+        canvas_cent_ratio_signif.cd().SetLeftMargin(0.2)
+
+        legend = ROOT.TLegend(0.35, 0.2, 0.8, 0.5)
+        legend.SetBorderSize(0)
+        legend.SetFillStyle(0)
+        legend.SetTextSize(0.035)
+        leg_empty = legend.Clone()
+        legend.SetHeader(f"D^{{#plus}} {cent_min}-{cent_max}% centrality")
+        leg_empty.SetHeader(" ")
+        for iocc, (occ_min, occ_max) in enumerate(
+            zip(occupancies[:-1], occupancies[1:])
+        ):  # loop over occupancy
+            hist_ratio_signif.append(hist_signif[icent][iocc].Clone())
+            hist_ratio_signif[-1].SetName(
+                f"hist_ratio_signif_cent{cent_min}_{cent_max}_occ{occ_min}_{occ_max}"
+            )
+            hist_ratio_signif[-1].Divide(
+                hist_signif[icent][iocc], hist_signif[icent][0], 1.0, 1.0, "B"
+            )
 
-        set_style(hist_ratio_signif[-1], "Signif.(Occ)/Signif.(0-2000)")
-        hist_ratio_signif_empty.append(get_empty_clone(hist_ratio_signif[-1]))
-        hist_ratio_signif_empty[-1].SetDirectory(0)
-
-        canvas_cent_ratio_signif.cd()
-        hist_ratio_signif[-1].Draw("P SAME")
-        hist_ratio_signif_empty[-1].Draw("P SAME")
-        legend.AddEntry(hist_ratio_signif[-1], f"Occupancy {occ_min}-{occ_max}", "p")
-    legend.Draw()
-    canvas_cent_ratio_signif.Write()
-
-    canvas_cent_ratio_mean = ROOT.TCanvas(
-        f"cratio_mean_cent{cent_min}_{cent_max}",
-        ";#it{p}_{T} (GeV/#it{c}); #mu(Occ)/#mu(0-2000)",
-        600,
-        600,
-    )
-    canvas_cent_ratio_mean.cd().SetGridy()
-    canvas_cent_ratio_mean.cd().SetGridx()
-    canvas_cent_ratio_mean.cd().SetLeftMargin(0.2)
-
-    legend = ROOT.TLegend(0.35, 0.2, 0.8, 0.5)
-    legend.SetBorderSize(0)
-    legend.SetFillStyle(0)
-    legend.SetTextSize(0.035)
-    leg_empty = legend.Clone()
-    legend.SetHeader(f"D^{{#plus}} {cent_min}-{cent_max}% centrality")
-    leg_empty.SetHeader(" ")
-    for iocc, (occ_min, occ_max) in enumerate(
-        zip(occupancies[:-1], occupancies[1:])
-    ):  # loop over occupancy
-        hist_ratio_mean.append(hist_mean[icent][iocc].Clone())
-        hist_ratio_mean[-1].SetName(
-            f"hist_ratio_mean_cent{cent_min}_{cent_max}_occ{occ_min}_{occ_max}"
+            set_style(hist_ratio_signif[-1], "Signif.(Occ)/Signif.(0-2000)", iocc)
+            hist_ratio_signif_empty.append(get_empty_clone(hist_ratio_signif[-1]))
+            hist_ratio_signif_empty[-1].SetDirectory(0)
+
+            canvas_cent_ratio_signif.cd()
+            hist_ratio_signif[-1].Draw("P SAME")
+            hist_ratio_signif_empty[-1].Draw("P SAME")
+            legend.AddEntry(hist_ratio_signif[-1], f"Occupancy {occ_min}-{occ_max}", "p")
+        legend.Draw()
+        canvas_cent_ratio_signif.Write()
+
+        canvas_cent_ratio_mean = ROOT.TCanvas(
+            f"cratio_mean_cent{cent_min}_{cent_max}",
+            ";#it{p}_{T} (GeV/#it{c}); #mu(Occ)/#mu(0-2000)",
+            600,
+            600,
         )
-        hist_ratio_mean[-1].Divide(
-            hist_mean[icent][iocc], hist_mean[icent][0], 1.0, 1.0, "B"
+        canvas_cent_ratio_mean.cd().SetGridy()
+        canvas_cent_ratio_mean.cd().SetGridx()
+        canvas_cent_ratio_mean.cd().SetLeftMargin(0.2)
+
+        legend = ROOT.TLegend(0.35, 0.2, 0.8, 0.5)
+        legend.SetBorderSize(0)
+        legend.SetFillStyle(0)
+        legend.SetTextSize(0.035)
+        leg_empty = legend.Clone()
+        legend.SetHeader(f"D^{{#plus}} {cent_min}-{cent_max}% centrality")
+        leg_empty.SetHeader(" ")
+        for iocc, (occ_min, occ_max) in enumerate(
+            zip(occupancies[:-1], occupancies[1:])
+        ):  # loop over occupancy
+            hist_ratio_mean.append(hist_mean[icent][iocc].Clone())
+            hist_ratio_mean[-1].SetName(
+                f"hist_ratio_mean_cent{cent_min}_{cent_max}_occ{occ_min}_{occ_max}"
+            )
+            hist_ratio_mean[-1].Divide(
+                hist_mean[icent][iocc], hist_mean[icent][0], 1.0, 1.0, "B"
+            )
+
+            set_style(hist_ratio_mean[-1], "#mu(Occ)/#mu(0-2000)", iocc)
+            hist_ratio_mean_empty.append(get_empty_clone(hist_ratio_mean[-1]))
+            hist_ratio_mean_empty[-1].SetDirectory(0)
+
+            canvas_cent_ratio_mean.cd()
+            hist_ratio_mean[-1].Draw("P SAME")
+            hist_ratio_mean_empty[-1].Draw("P SAME")
+            legend.AddEntry(hist_ratio_mean[-1], f"Occupancy {occ_min}-{occ_max}", "p")
+        legend.Draw()
+        canvas_cent_ratio_mean.Write()
+
+        canvas_cent_ratio_sigma = ROOT.TCanvas(
+            f"cratio_sigma_cent{cent_min}_{cent_max}",
+            ";#it{p}_{T} (GeV/#it{c}); #sigma(Occ)/#sigma(0-2000)",
+            600,
+            600,
         )
+        canvas_cent_ratio_sigma.cd().SetGridy()
+        canvas_cent_ratio_sigma.cd().SetGridx()
+        canvas_cent_ratio_sigma.cd().SetLeftMargin(0.2)
+
+        legend = ROOT.TLegend(0.35, 0.2, 0.8, 0.5)
+        legend.SetBorderSize(0)
+        legend.SetFillStyle(0)
+        legend.SetTextSize(0.035)
+        leg_empty = legend.Clone()
+        legend.SetHeader(f"D^{{#plus}} {cent_min}-{cent_max}% centrality")
+        leg_empty.SetHeader(" ")
+        for iocc, (occ_min, occ_max) in enumerate(
+            zip(occupancies[:-1], occupancies[1:])
+        ):  # loop over occupancy
+            hist_ratio_sigma.append(hist_sigma[icent][iocc].Clone())
+            hist_ratio_sigma[-1].SetName(
+                f"hist_ratio_sigma_cent{cent_min}_{cent_max}_occ{occ_min}_{occ_max}"
+            )
+            hist_ratio_sigma[-1].Divide(
+                hist_sigma[icent][iocc], hist_sigma[icent][0], 1.0, 1.0, "B"
+            )
 
-        set_style(hist_ratio_mean[-1], "#mu(Occ)/#mu(0-2000)")
-        hist_ratio_mean_empty.append(get_empty_clone(hist_ratio_mean[-1]))
-        hist_ratio_mean_empty[-1].SetDirectory(0)
-
-        canvas_cent_ratio_mean.cd()
-        hist_ratio_mean[-1].Draw("P SAME")
-        hist_ratio_mean_empty[-1].Draw("P SAME")
-        legend.AddEntry(hist_ratio_mean[-1], f"Occupancy {occ_min}-{occ_max}", "p")
-    legend.Draw()
-    canvas_cent_ratio_mean.Write()
-
-    canvas_cent_ratio_sigma = ROOT.TCanvas(
-        f"cratio_sigma_cent{cent_min}_{cent_max}",
-        ";#it{p}_{T} (GeV/#it{c}); #sigma(Occ)/#sigma(0-2000)",
-        600,
-        600,
-    )
-    canvas_cent_ratio_sigma.cd().SetGridy()
-    canvas_cent_ratio_sigma.cd().SetGridx()
-    canvas_cent_ratio_sigma.cd().SetLeftMargin(0.2)
-
-    legend = ROOT.TLegend(0.35, 0.2, 0.8, 0.5)
-    legend.SetBorderSize(0)
-    legend.SetFillStyle(0)
-    legend.SetTextSize(0.035)
-    leg_empty = legend.Clone()
-    legend.SetHeader(f"D^{{#plus}} {cent_min}-{cent_max}% centrality")
-    leg_empty.SetHeader(" ")
-    for iocc, (occ_min, occ_max) in enumerate(
-        zip(occupancies[:-1], occupancies[1:])
-    ):  # loop over occupancy
-        hist_ratio_sigma.append(hist_sigma[icent][iocc].Clone())
-        hist_ratio_sigma[-1].SetName(
-            f"hist_ratio_sigma_cent{cent_min}_{cent_max}_occ{occ_min}_{occ_max}"
+            set_style(hist_ratio_sigma[-1], "#sigma(Occ)/#sigma(0-2000)", iocc)
+            hist_ratio_sigma_empty.append(get_empty_clone(hist_ratio_sigma[-1]))
+            hist_ratio_sigma_empty[-1].SetDirectory(0)
+
+            canvas_cent_ratio_sigma.cd()
+            hist_ratio_sigma[-1].Draw("P SAME")
+            hist_ratio_sigma_empty[-1].Draw("P SAME")
+            legend.AddEntry(hist_ratio_sigma[-1], f"Occupancy {occ_min}-{occ_max}", "p")
+        legend.Draw()
+        canvas_cent_ratio_sigma.Write()
+
+        canvas_cent_ratio_s.SaveAs(f"{outdir}/cratio_s_cent{cent_min}_{cent_max}.png")
+        canvas_cent_ratio_b.SaveAs(f"{outdir}/cratio_b_cent{cent_min}_{cent_max}.png")
+        canvas_cent_ratio_soverb.SaveAs(
+            f"{outdir}/cratio_soverb_cent{cent_min}_{cent_max}.png"
         )
-        hist_ratio_sigma[-1].Divide(
-            hist_sigma[icent][iocc], hist_sigma[icent][0], 1.0, 1.0, "B"
+        canvas_cent_ratio_signif.SaveAs(
+            f"{outdir}/cratio_signif_cent{cent_min}_{cent_max}.png"
+        )
+        canvas_cent_ratio_mean.SaveAs(f"{outdir}/cratio_mean_cent{cent_min}_{cent_max}.png")
+        canvas_cent_ratio_sigma.SaveAs(
+            f"{outdir}/cratio_sigma_cent{cent_min}_{cent_max}.png"
         )
 
-        set_style(hist_ratio_sigma[-1], "#sigma(Occ)/#sigma(0-2000)")
-        hist_ratio_sigma_empty.append(get_empty_clone(hist_ratio_sigma[-1]))
-        hist_ratio_sigma_empty[-1].SetDirectory(0)
-
-        canvas_cent_ratio_sigma.cd()
-        hist_ratio_sigma[-1].Draw("P SAME")
-        hist_ratio_sigma_empty[-1].Draw("P SAME")
-        legend.AddEntry(hist_ratio_sigma[-1], f"Occupancy {occ_min}-{occ_max}", "p")
-    legend.Draw()
-    canvas_cent_ratio_sigma.Write()
-
-    canvas_cent_ratio_s.SaveAs(f"{outdir}/cratio_s_cent{cent_min}_{cent_max}.png")
-    canvas_cent_ratio_b.SaveAs(f"{outdir}/cratio_b_cent{cent_min}_{cent_max}.png")
-    canvas_cent_ratio_soverb.SaveAs(
-        f"{outdir}/cratio_soverb_cent{cent_min}_{cent_max}.png"
-    )
-    canvas_cent_ratio_signif.SaveAs(
-        f"{outdir}/cratio_signif_cent{cent_min}_{cent_max}.png"
-    )
-    canvas_cent_ratio_mean.SaveAs(f"{outdir}/cratio_mean_cent{cent_min}_{cent_max}.png")
-    canvas_cent_ratio_sigma.SaveAs(
-        f"{outdir}/cratio_sigma_cent{cent_min}_{cent_max}.png"
-    )
-
-    for hist in hist_ratio_s:
-        hist.Write()
-    for hist in hist_ratio_b:
-        hist.Write()
-    for hist in hist_ratio_soverb:
-        hist.Write()
-    for hist in hist_ratio_signif:
-        hist.Write()
-    for hist in hist_ratio_mean:
-        hist.Write()
-    for hist in hist_ratio_sigma:
-        hist.Write()
-
-hcorr_cent_occ.Write()
+        for hist in hist_ratio_s:
+            hist.Write()
+        for hist in hist_ratio_b:
+            hist.Write()
+        for hist in hist_ratio_soverb:
+            hist.Write()
+        for hist in hist_ratio_signif:
+            hist.Write()
+        for hist in hist_ratio_mean:
+            hist.Write()
+        for hist in hist_ratio_sigma:
+            hist.Write()
+
+    prepared["hcorr_cent_occ"].Write()
+    prepared["outfile"].Close()
+
+
+def run_occupancy_study(config, n_workers=1, fit_backend="roofit", use_fit_cache=True, estimators=None,
+                        warm_start=False):
+    """
+    Analyses all the combinations of centrality sets and occupancy estimators of the configuration.
+    The THnSparse and the event counts are read once for each input, and the mass fits of all the
+    analyses are performed together in a pool of n_workers processes (with warm_start, the pt fits of
+    each centrality and occupancy interval are run in sequence, see run_fits)
+    """
+    ROOT.gROOT.SetBatch(True)
+    sparses, event_counters, runs = {}, {}, []
+    for run in get_runs(config, estimators):
+        sparse_key = (run["infile"], run["indir"])
+        if sparse_key not in sparses:
+            thn = load_thnsparse(run["infile"], run["indir"], config["thn_name"])
+            sparses[sparse_key] = (thn, read_filled_bins(thn))
+        events_key = (run["events"]["file"], run["events"]["hist_name"])
+        if events_key not in event_counters:
+            event_counters[events_key] = EventCounter(*events_key)
+
+        thn, filled_bins = sparses[sparse_key]
+        runs.append((run, prepare_run(run, thn, filled_bins, event_counters[events_key],
+                                      config["pt_bins"], config["mass_range"])))
+
+    # Perform invariant mass fits
+    fit_tasks = [task for _, prepared in runs for task in prepared["fit_tasks"]]
+    fit_cache_file = config["fit_cache"] if use_fit_cache else None
+    fit_results = run_fits(fit_tasks, n_workers, fit_backend, fit_cache_file, warm_start)
+
+    first_task = 0
+    for run, prepared in runs:
+        n_tasks = len(prepared["fit_tasks"])
+        write_run(run, prepared, fit_results[first_task:first_task + n_tasks])
+        first_task += n_tasks
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Arguments")
+    parser.add_argument("--config", "-c", metavar="text", default=None,
+                        help="YAML configuration of the occupancy study (default: occupancy_study.yml)")
+    parser.add_argument("--estimators", nargs="+", default=None,
+                        help="occupancy estimators of the configuration to be analysed (default: all)")
+    parser.add_argument("--nworkers", "-j", type=int, default=os.cpu_count(),
+                        help="number of processes used for the invariant-mass fits")
+    parser.add_argument("--fit-backend", choices=FIT_BACKENDS, default="roofit",
+                        help="backend of the invariant-mass fits (compare: both, with bin-by-bin comparison)")
+    parser.add_argument("--no-fit-cache", action="store_true", default=False,
+                        help="do not reuse (and store) the fit results of previous runs")
+    parser.add_argument("--warm-start", action="store_true", default=False,
+                        help="start each pt fit from the previous one of the same centrality and occupancy "
+                             "interval (serialises these fits, at most one process per interval)")
+    args = parser.parse_args()
+
+    run_occupancy_study(load_occupancy_config(args.config), args.nworkers, args.fit_backend,
+                        not args.no_fit_cache, args.estimators, args.warm_start)
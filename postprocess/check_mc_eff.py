@@ -4,8 +4,16 @@ Script to analyse output of taskMcEfficiency.cxx task
 
 import os
 import argparse
+import multiprocessing
 import numpy as np
 import ROOT
+from hist_utils import get_axis_edges, get_bin_contents, get_bin_errors2, get_range_bins, set_bin_contents
+from sparse_cube import read_filled_bins, thnsparse_from_bins
+from step_efficiency import StepEfficiencies, INTERVAL_METHODS, TABLE_COLUMNS
+from qa_summary import write_table, SUMMARY_FORMATS
+from input_merge import get_inputs_checksum, merge_root_files
+
+MERGE_MODES = ["none", "root", "numpy"]
 
 PDGCODES = {
     "dplus": 411,
@@ -25,6 +33,14 @@ COLORS = [ROOT.kBlue + 3, ROOT.kBlue + 1, ROOT.kAzure + 4, ROOT.kAzure + 2,
           ROOT.kGreen + 2, ROOT.kSpring - 6,  ROOT.kOrange + 7, ROOT.kOrange + 9,
           ROOT.kBlack, ROOT.kRed + 1]
 
+ORIGINS = {"prompt": 1, "nonprompt": 2} # bins of the origin axis
+FIRST_RECO_STEP = 6 # the collision association is meaningful only for the reconstructed steps
+N_STEPS = 10
+# workers sharing the steps of the same file, each one holding the whole container of the steps
+MAX_STEP_GROUPS = 2
+# input files whose filled bins are summed together in get_merged_bins
+MERGE_BATCH_SIZE = 64
+
 LEGNAMES = [
     "kHFStepMC",
     "kHFStepMcInRapidity",
@@ -54,7 +70,255 @@ def set_style(histo, color, open_markers=False):
         histo.SetMarkerStyle(ROOT.kFullCircle)
 
 
-def check_mc_eff(infile_names, outpath, had, pt_max, iddir=None):
+def get_candidates_name(iddir=None):
+    """
+    Name of the container of the THn of the steps in the output of taskMcEfficiency.cxx
+    """
+    if iddir is not None:
+        return f"hf-task-mc-efficiency_id{iddir}/hCandidates"
+    return "hf-task-mc-efficiency/hCandidates"
+
+
+def get_step_projections(thn, had, step):
+    """
+    Projections on pt (axis 0) and cos(theta_P) (axis 3) of a step for prompt and non-prompt
+    particles plus antiparticles, all and associated to the wrong collision (reconstructed steps only),
+    obtained from a single pass on the filled bins of the THn with the bin selection of TAxis::SetRangeUser
+
+    Returns:
+        - dictionary {(origin, badcoll): (pt contents, pt squared errors, cosp contents, cosp squared errors)},
+          including under- and overflow bins
+    """
+    axes = [thn.GetAxis(axis) for axis in range(thn.GetNdimensions())]
+    return project_filled_bins(read_filled_bins(thn), axes, had, step)
+
+
+def project_filled_bins(filled_bins, axes, had, step):
+    """
+    Projections of get_step_projections from the filled bins (coordinates, contents and squared
+    errors, see read_filled_bins) and the TAxis of a step
+    """
+    coords, contents, errors2 = filled_bins
+
+    def select(axis, vmin, vmax):
+        bin_min, bin_max = get_range_bins(axes[axis], vmin, vmax)
+        return (coords[:, axis] >= bin_min) & (coords[:, axis] <= bin_max)
+
+    pdg = PDGCODES[had]
+    is_had = select(2, pdg - 0.5, pdg + 0.5) | select(2, -pdg - 0.5, -pdg + 0.5)
+    is_badcoll = select(4, 0, 0)
+    n_bins = {axis: axes[axis].GetNbins() + 2 for axis in (0, 3)}
+
+    projections = {}
+    for origin, origin_bin in ORIGINS.items():
+        for badcoll in ([False, True] if step >= FIRST_RECO_STEP else [False]):
+            mask = is_had & select(5, origin_bin, origin_bin)
+            if badcoll:
+                mask &= is_badcoll
+            projections[origin, badcoll] = tuple(
+                np.bincount(coords[mask, axis], weights=weights[mask], minlength=n_bins[axis])
+                for axis in (0, 3) for weights in (contents, errors2)
+            )
+
+    return projections
+
+
+def project_steps(job):
+    """
+    Opens an input file and computes the projections of a list of steps (see get_step_projections),
+    each THn being reduced to the projections and the container released before returning
+
+    Returns:
+        - list of step, projections and (edges, title) of the pt and cos(theta_P) axes for the steps found
+    """
+    infile_name, iddir, had, steps = job
+    infile = ROOT.TFile.Open(infile_name)
+    candidates = infile.Get(get_candidates_name(iddir))
+    ROOT.SetOwnership(candidates, True) # deleted with all the THn of the steps when going out of scope
+
+    results = []
+    for step in steps:
+        thn = candidates.getTHn(step, True)
+        if not thn:
+            continue
+        axes = [(get_axis_edges(thn.GetAxis(axis)), thn.GetAxis(axis).GetTitle()) for axis in (0, 3)]
+        results.append((step, get_step_projections(thn, had, step), axes))
+    infile.Close()
+
+    return results
+
+
+def get_projections(infile_names, had, iddir=None, n_workers=1, max_step_groups=MAX_STEP_GROUPS):
+    """
+    Projections of all the steps of all the input files (see get_step_projections), computed
+    in parallel if n_workers > 1 and summed over the input files. The steps of a file are
+    split among several workers (at most max_step_groups) only if there are less files than
+    workers, since each worker reads the whole container of the steps
+
+    Returns:
+        - dictionaries {step: {(origin, badcoll): arrays}} and {step: axes}
+    """
+    n_groups = max(1, min(N_STEPS, max_step_groups, n_workers // len(infile_names)))
+    jobs = [(infile_name, iddir, had, list(range(igroup, N_STEPS, n_groups)))
+            for infile_name in infile_names for igroup in range(n_groups)]
+    if n_workers <= 1:
+        results = [project_steps(job) for job in jobs]
+    else:
+        with multiprocessing.get_context("fork").Pool(min(n_workers, len(jobs))) as pool:
+            results = pool.map(project_steps, jobs, chunksize=1)
+
+    projections, axes = {}, {}
+    for step, step_projections, step_axes in (result for job_results in results for result in job_results):
+        if step not in projections:
+            projections[step], axes[step] = step_projections, step_axes
+            continue
+        for key, arrays in step_projections.items():
+            projections[step][key] = tuple(summed + array for summed, array in zip(projections[step][key], arrays))
+
+    return dict(sorted(projections.items())), axes
+
+
+def read_step_bins(job):
+    """
+    Reads the filled bins of all the steps of an input file
+
+    Returns:
+        - dictionaries {step: (coordinates, contents, squared errors)} and {step: [(edges, title) of each axis]}
+    """
+    infile_name, iddir = job
+    infile = ROOT.TFile.Open(infile_name)
+    candidates = infile.Get(get_candidates_name(iddir))
+    ROOT.SetOwnership(candidates, True)
+
+    bins, axes = {}, {}
+    for step in range(N_STEPS):
+        thn = candidates.getTHn(step, True)
+        if not thn:
+            continue
+        bins[step] = read_filled_bins(thn)
+        axes[step] = [(get_axis_edges(thn.GetAxis(axis)), thn.GetAxis(axis).GetTitle())
+                      for axis in range(thn.GetNdimensions())]
+    infile.Close()
+
+    return bins, axes
+
+
+def sum_filled_bins(bins_list, shape):
+    """
+    Sum of several sets of filled bins (coordinates, contents, squared errors) of the same THn
+    with shape (number of bins + 2 of each axis), reduced at once on the linear bin indices
+    """
+    coords = np.concatenate([bins[0] for bins in bins_list])
+    unique, inverse = np.unique(np.ravel_multi_index(coords.T, shape), return_inverse=True)
+    inverse = inverse.ravel()
+    return (np.array(np.unravel_index(unique, shape), dtype=np.int32).T.copy(),
+            np.bincount(inverse, weights=np.concatenate([bins[1] for bins in bins_list]), minlength=len(unique)),
+            np.bincount(inverse, weights=np.concatenate([bins[2] for bins in bins_list]), minlength=len(unique)))
+
+
+def get_merged_bins(infile_names, iddir=None, cache_file=None, n_workers=1):
+    """
+    Filled bins of the THn of each step summed over the input files, read in parallel if
+    n_workers > 1. If cache_file (.npz) is set, the merged bins are stored there and
+    reused as long as the input files are unchanged
+
+    Returns:
+        - dictionaries {step: (coordinates, contents, squared errors)} and {step: [(edges, title) of each axis]}
+    """
+    if cache_file is not None and not cache_file.endswith(".npz"):
+        cache_file += ".npz" # added by np.savez otherwise, the cache would never be found
+    checksum = get_inputs_checksum(infile_names, get_candidates_name(iddir))
+    if cache_file is not None and os.path.isfile(cache_file):
+        with np.load(cache_file) as cache:
+            if str(cache["checksum"]) == checksum:
+                print(f"Merged inputs: filled bins taken from {cache_file}")
+                steps = sorted(int(key.split("_")[1]) for key in cache.files if key.startswith("coords_"))
+                bins = {step: tuple(cache[f"{name}_{step}"] for name in ("coords", "contents", "errors2"))
+                        for step in steps}
+                axes = {step: [(cache[f"edges_{step}_{axis}"], str(title))
+                               for axis, title in enumerate(cache[f"titles_{step}"])] for step in steps}
+                return bins, axes
+
+    jobs = [(infile_name, iddir) for infile_name in infile_names]
+    pending, axes = {}, {}
+
+    def reduce_step(step):
+        shape = tuple(len(edges) + 1 for edges, _ in axes[step])
+        pending[step] = [sum_filled_bins(pending[step], shape)]
+
+    def add(file_bins, file_axes):
+        # the bins of the files are summed in batches, not at each file
+        for step, step_bins in file_bins.items():
+            axes.setdefault(step, file_axes[step])
+            pending.setdefault(step, []).append(step_bins)
+            if len(pending[step]) >= MERGE_BATCH_SIZE:
+                reduce_step(step)
+
+    if n_workers <= 1:
+        for job in jobs:
+            add(*read_step_bins(job))
+    else:
+        with multiprocessing.get_context("fork").Pool(min(n_workers, len(jobs))) as pool:
+            for result in pool.imap(read_step_bins, jobs):
+                add(*result)
+    for step in pending:
+        reduce_step(step)
+    bins = {step: step_bins[0] for step, step_bins in pending.items()}
+
+    if cache_file is not None:
+        arrays = {"checksum": np.array(checksum)}
+        for step, (coords, contents, errors2) in bins.items():
+            arrays.update({f"coords_{step}": coords, f"contents_{step}": contents, f"errors2_{step}": errors2,
+                           f"titles_{step}": np.array([title for _, title in axes[step]])})
+            arrays.update({f"edges_{step}_{axis}": edges for axis, (edges, _) in enumerate(axes[step])})
+        np.savez(cache_file, **arrays)
+        print(f"Merged inputs: filled bins of {len(infile_names)} files stored in {cache_file}")
+
+    return bins, axes
+
+
+def project_merged_bins(bins, axes, had):
+    """
+    Projections of all the steps (see get_step_projections) computed once from the filled
+    bins summed over the input files (see get_merged_bins)
+
+    Returns:
+        - dictionaries {step: {(origin, badcoll): arrays}} and {step: axes}
+    """
+    projections, proj_axes = {}, {}
+    for step in sorted(bins):
+        taxes = [ROOT.TAxis(len(edges) - 1, np.asarray(edges, "d")) for edges, _ in axes[step]]
+        projections[step] = project_filled_bins(bins[step], taxes, had, step)
+        proj_axes[step] = [axes[step][0], axes[step][3]]
+
+    return projections, proj_axes
+
+
+def get_merged_sparses(bins, axes):
+    """
+    THnSparse of each step summed over the input files, built from the summed filled bins
+    (see get_merged_bins) instead of reading the THn of all the input files again
+
+    Returns:
+        - dictionary {step: merged THnSparse}
+    """
+    return {step: thnsparse_from_bins(f"histSparse_{step}", axes[step], bins[step]) for step in sorted(bins)}
+
+
+def get_hist(name, axis, contents, errors2):
+    """
+    TH1D with the binning and title of an axis (edges, title), from arrays including under- and overflow bins
+    """
+    edges, title = axis
+    hist = ROOT.TH1D(name, f";{title}", len(edges) - 1, np.asarray(edges, "d"))
+    hist.SetDirectory(0)
+    set_bin_contents(hist, contents, errors2)
+    return hist
+
+
+def check_mc_eff(infile_names, outpath, had, pt_max, iddir=None, n_workers=1, keep_sparse=False,
+                 eff_method="wilson", summary_format="json", merge="none", merged_file=None,
+                 max_step_groups=MAX_STEP_GROUPS):
     """
 
     enum HFStep { kHFStepMC = 0,              // MC mothers in the correct decay channel
@@ -118,101 +382,39 @@ def check_mc_eff(infile_names, outpath, had, pt_max, iddir=None):
     hist_pt_prompt_badcoll, hist_pt_nonprompt_badcoll = {}, {}
     hist_cosp_prompt, hist_cosp_nonprompt = {}, {}
     hist_cosp_prompt_badcoll, hist_cosp_nonprompt_badcoll = {}, {}
+    hists = {
+        ("prompt", False): (hist_pt_prompt, hist_cosp_prompt),
+        ("nonprompt", False): (hist_pt_nonprompt, hist_cosp_nonprompt),
+        ("prompt", True): (hist_pt_prompt_badcoll, hist_cosp_prompt_badcoll),
+        ("nonprompt", True): (hist_pt_nonprompt_badcoll, hist_cosp_nonprompt_badcoll),
+    }
+
+    if merge == "root":
+        # input files merged once (only the container of the steps) and reused while unchanged
+        if merged_file is None:
+            merged_file = os.path.join(outpath, "AnalysisResults_merged.root")
+        infile_names = [merge_root_files(infile_names, merged_file, get_candidates_name(iddir).split("/"),
+                                         n_workers)]
+    if merge == "numpy" or keep_sparse:
+        # filled bins summed on the fly over the input files, cached in merged_file if set (--merge numpy),
+        # also giving the THn of the steps to be kept, so that the input files are read only once
+        bins, bin_axes = get_merged_bins(infile_names, iddir, merged_file if merge == "numpy" else None, n_workers)
+        projections, axes = project_merged_bins(bins, bin_axes, had)
+    else:
+        projections, axes = get_projections(infile_names, had, iddir, n_workers, max_step_groups)
+    for step, step_projections in projections.items():  # see steps defined above
+        for (origin, badcoll), (pt, pt_err2, cosp, cosp_err2) in step_projections.items():
+            suffix = f"{origin}{'_badcoll' if badcoll else ''}_proj_{step}"
+            hists[origin, badcoll][0][step] = get_hist(f"hist_pt_{suffix}", axes[step][0], pt, pt_err2)
+            hists[origin, badcoll][1][step] = get_hist(f"hist_cosp_{suffix}", axes[step][1], cosp, cosp_err2)
+            for hist in hists[origin, badcoll]:
+                set_style(hist[step], COLORS[step], badcoll)
+
+        leg_steps_pt.AddEntry(hist_pt_prompt[step], LEGNAMES[step], "pl")
+        leg_steps_cosp.AddEntry(hist_cosp_prompt[step], LEGNAMES[step], "pl")
 
-    hist_list = []
-
-    for ifile, infile_name in enumerate(infile_names):
-        infile = ROOT.TFile.Open(infile_name)
-        if iddir is not None:
-            candidates = infile.Get(
-                f"hf-task-mc-efficiency_id{iddir}/hCandidates")
-        else:
-            candidates = infile.Get("hf-task-mc-efficiency/hCandidates")
-
-        for step in range(10):  # see steps defined above
-            hist = candidates.getTHn(step)
-            if not hist:
-                continue
-
-            hist_list.append(hist.Clone(f"histSparse_{step}"))
-            
-            # particle
-            hist.GetAxis(2).SetRangeUser(
-                PDGCODES[had] - 0.5, PDGCODES[had] + 0.5)
-            # prompt
-            hist.GetAxis(5).SetRangeUser(1, 1)
-            if step in hist_pt_prompt:
-                hist_pt_prompt[step].Add(hist.Projection(0))
-                hist_cosp_prompt[step].Add(hist.Projection(3))
-            else:
-                hist_pt_prompt[step] = hist.Projection(0)
-                hist_cosp_prompt[step] = hist.Projection(3)
-            # non-prompt
-            hist.GetAxis(5).SetRangeUser(2, 2)
-            if step in hist_pt_nonprompt:
-                hist_pt_nonprompt[step].Add(hist.Projection(0))
-                hist_cosp_nonprompt[step].Add(hist.Projection(3))
-            else:
-                hist_pt_nonprompt[step] = hist.Projection(0)
-                hist_cosp_nonprompt[step] = hist.Projection(3)
-
-            # badly associated
-            if step > 5:  # only for reco it is meaningful
-                hist.GetAxis(4).SetRangeUser(0, 0)
-                hist.GetAxis(5).SetRangeUser(2, 2)
-                if step in hist_pt_prompt_badcoll:
-                    hist_pt_prompt_badcoll[step].Add(hist.Projection(0))
-                    hist_cosp_prompt_badcoll[step].Add(hist.Projection(3))
-                else:
-                    hist_pt_prompt_badcoll[step] = hist.Projection(0)
-                    hist_cosp_prompt_badcoll[step] = hist.Projection(3)
-                hist.GetAxis(5).SetRangeUser(2, 2)
-                if step in hist_pt_nonprompt_badcoll:
-                    hist_pt_nonprompt_badcoll[step].Add(hist.Projection(0))
-                    hist_cosp_nonprompt_badcoll[step].Add(hist.Projection(3))
-                else:
-                    hist_pt_nonprompt_badcoll[step] = hist.Projection(0)
-                    hist_cosp_nonprompt_badcoll[step] = hist.Projection(3)
-                hist.GetAxis(4).SetRange(-1, -1)  # release
-
-            # anti-particle
-            hist.GetAxis(2).SetRangeUser(
-                -PDGCODES[had] - 0.5, -PDGCODES[had] + 0.5)
-            # prompt
-            hist.GetAxis(5).SetRangeUser(1, 1)
-            hist_pt_prompt[step].Add(hist.Projection(0))
-            hist_cosp_prompt[step].Add(hist.Projection(3))
-            # non-prompt
-            hist.GetAxis(5).SetRangeUser(2, 2)
-            hist_pt_nonprompt[step].Add(hist.Projection(0))
-            hist_cosp_nonprompt[step].Add(hist.Projection(3))
-
-            # badly associated
-            if step > 5:  # only for reco it is meaningful
-                hist.GetAxis(4).SetRangeUser(0, 0)
-                hist.GetAxis(5).SetRangeUser(2, 2)
-                hist_pt_prompt_badcoll[step].Add(hist.Projection(0))
-                hist_cosp_prompt_badcoll[step].Add(hist.Projection(3))
-                hist.GetAxis(5).SetRangeUser(2, 2)
-                hist_pt_nonprompt_badcoll[step].Add(hist.Projection(0))
-                hist_cosp_nonprompt_badcoll[step].Add(hist.Projection(3))
-                hist.GetAxis(4).SetRange(-1, -1)  # release
-
-            set_style(hist_pt_prompt[step], COLORS[step])
-            set_style(hist_cosp_prompt[step], COLORS[step])
-            set_style(hist_pt_nonprompt[step], COLORS[step])
-            set_style(hist_cosp_nonprompt[step], COLORS[step])
-            if step > 5:  # only for reco it is meaningful
-                set_style(hist_pt_prompt_badcoll[step], COLORS[step], True)
-                set_style(hist_cosp_prompt_badcoll[step], COLORS[step], True)
-                set_style(hist_pt_nonprompt_badcoll[step], COLORS[step], True)
-                set_style(
-                    hist_cosp_nonprompt_badcoll[step], COLORS[step], True)
-
-            if ifile == 0:
-                leg_steps_pt.AddEntry(hist_pt_prompt[step], LEGNAMES[step], "pl")
-                leg_steps_cosp.AddEntry(
-                    hist_cosp_prompt[step], LEGNAMES[step], "pl")
+    # the THn of the steps are kept (summed over the input files) only if requested
+    hist_list = list(get_merged_sparses(bins, bin_axes).values()) if keep_sparse else []
 
     used_steps = list(hist_pt_prompt.keys())
     used_steps_badcoll = list(hist_pt_prompt_badcoll.keys())
@@ -232,19 +434,31 @@ def check_mc_eff(infile_names, outpath, had, pt_max, iddir=None):
         hist_pt_nonprompt_badcoll[step] = hist_pt_nonprompt_badcoll[step].Rebin(
             npt_reb, f"hist_pt_nonprompt_badcoll_{step}", pt_rebin)
 
+    # efficiencies of each step with respect to all the other ones, computed at once
+    step_effs = {}
+    for origin, hist_pt, hist_cosp in (("prompt", hist_pt_prompt, hist_cosp_prompt),
+                                       ("nonprompt", hist_pt_nonprompt, hist_cosp_nonprompt)):
+        for variable, hist_var in (("pt", hist_pt), ("cosp", hist_cosp)):
+            step_effs[origin, variable] = StepEfficiencies(
+                used_steps,
+                get_axis_edges(hist_var[used_steps[0]].GetXaxis()),
+                [get_bin_contents(hist_var[step])[1:-1] for step in used_steps],
+                [get_bin_errors2(hist_var[step])[1:-1] for step in used_steps],
+                eff_method,
+            )
+    pt_title = f";{hist_pt_prompt[used_steps[0]].GetXaxis().GetTitle()}"
+
     h_pt_eff_prompt, h_pt_eff_nonprompt = {}, {}
     for step in steps_eff:
         if step in hist_pt_prompt:
-            h_pt_eff_prompt[step] = hist_pt_prompt[step].Clone(
-                f"h_pt_eff_prompt_step{step}")
-            h_pt_eff_prompt[step].Divide(
-                hist_pt_prompt[step], hist_pt_prompt[1], 1., 1., "B")
+            h_pt_eff_prompt[step] = step_effs["prompt", "pt"].get_hist(
+                f"h_pt_eff_prompt_step{step}", step, 1, pt_title)
+            set_style(h_pt_eff_prompt[step], COLORS[step])
             leg_steps_eff.AddEntry(hist_pt_prompt[step], LEGNAMES[step], "pl")
         if step in hist_pt_nonprompt:
-            h_pt_eff_nonprompt[step] = hist_pt_nonprompt[step].Clone(
-                f"h_pt_eff_nonprompt_step{step}")
-            h_pt_eff_nonprompt[step].Divide(
-                hist_pt_nonprompt[step], hist_pt_nonprompt[1], 1., 1., "B")
+            h_pt_eff_nonprompt[step] = step_effs["nonprompt", "pt"].get_hist(
+                f"h_pt_eff_nonprompt_step{step}", step, 1, pt_title)
+            set_style(h_pt_eff_nonprompt[step], COLORS[step])
 
     hist_pt_ratio_prompt_badcoll, hist_pt_ratio_nonprompt_badcoll = {}, {}
     for step in used_steps_badcoll:
@@ -259,38 +473,24 @@ def check_mc_eff(infile_names, outpath, had, pt_max, iddir=None):
 
     hist_pt_trackedovertrackable_prompt, hist_pt_trackedovertrackable_nonprompt = None, None
     if 5 in hist_pt_prompt and 6 in hist_pt_prompt:
-        hist_pt_trackedovertrackable_prompt = hist_pt_prompt[6].Clone(
-            "hist_pt_trackedovertrackable_prompt")
-        hist_pt_trackedovertrackable_prompt.Divide(
-            hist_pt_prompt[6], hist_pt_prompt[5], 1., 1., "B")
+        hist_pt_trackedovertrackable_prompt = step_effs["prompt", "pt"].get_hist(
+            "hist_pt_trackedovertrackable_prompt", 6, 5, pt_title)
+        set_style(hist_pt_trackedovertrackable_prompt, COLORS[6])
     if 5 in hist_pt_nonprompt and 6 in hist_pt_nonprompt:
-        hist_pt_trackedovertrackable_nonprompt = hist_pt_nonprompt[6].Clone(
-            "hist_pt_trackedovertrackable_nonprompt")
-        hist_pt_trackedovertrackable_nonprompt.Divide(
-            hist_pt_nonprompt[6], hist_pt_nonprompt[5], 1., 1., "B")
+        hist_pt_trackedovertrackable_nonprompt = step_effs["nonprompt", "pt"].get_hist(
+            "hist_pt_trackedovertrackable_nonprompt", 6, 5, pt_title)
+        set_style(hist_pt_trackedovertrackable_nonprompt, COLORS[6])
 
     hist_pt_duplicatesoversel_prompt, hist_pt_duplicatesoversel_nonprompt = None, None
     if 8 in hist_pt_prompt and 9 in hist_pt_prompt:
-        hist_pt_duplicatesoversel_prompt = hist_pt_prompt[9].Clone(
-            "hist_pt_duplicatesoversel_prompt")
-        hist_pt_duplicatesoversel_prompt.Divide(
-            hist_pt_prompt[9], hist_pt_prompt[8], 1., 1., "B")
+        hist_pt_duplicatesoversel_prompt = step_effs["prompt", "pt"].get_hist(
+            "hist_pt_duplicatesoversel_prompt", 9, 8, pt_title)
+        set_style(hist_pt_duplicatesoversel_prompt, COLORS[9])
     if 8 in hist_pt_nonprompt and 9 in hist_pt_nonprompt:
-        hist_pt_duplicatesoversel_nonprompt = hist_pt_nonprompt[9].Clone(
-            "hist_pt_duplicatesoversel_nonprompt")
-        hist_pt_duplicatesoversel_nonprompt.Divide(
-            hist_pt_nonprompt[9], hist_pt_nonprompt[8], 1., 1., "B")
+        hist_pt_duplicatesoversel_nonprompt = step_effs["nonprompt", "pt"].get_hist(
+            "hist_pt_duplicatesoversel_nonprompt", 9, 8, pt_title)
+        set_style(hist_pt_duplicatesoversel_nonprompt, COLORS[9])
 
-    for step in used_steps_badcoll:
-        hist_pt_ratio_prompt_badcoll[step] = hist_pt_prompt_badcoll[step].Clone(
-            f"hist_pt_ratio_prompt_badcoll_step{step}")
-        hist_pt_ratio_prompt_badcoll[step].Divide(
-            hist_pt_prompt_badcoll[step], hist_pt_prompt[step], 1., 1., "B")
-        hist_pt_ratio_nonprompt_badcoll[step] = hist_pt_nonprompt_badcoll[step].Clone(
-            f"hist_pt_ratio_nonprompt_badcoll_step{step}")
-        hist_pt_ratio_nonprompt_badcoll[step].Divide(
-            hist_pt_nonprompt_badcoll[step], hist_pt_nonprompt[step], 1., 1., "B")
-        
     output = ROOT.TFile(os.path.join(outpath, "Eff_output.root"), "recreate")
     dir_distr = output.mkdir("distr")
     dir_distr.cd()
@@ -306,9 +506,20 @@ def check_mc_eff(infile_names, outpath, had, pt_max, iddir=None):
     for hist in h_pt_eff_nonprompt.values():
         hist.Write()
     output.cd()
+    dir_step_eff = output.mkdir("step_efficiencies")
+    dir_step_eff.cd()
+    eff_table = {column: [] for column in TABLE_COLUMNS}
+    for (origin, variable), step_eff in step_effs.items():
+        for step_num, step_den in step_eff.get_pairs():
+            step_eff.get_graph(f"g_eff_{variable}_{origin}_step{step_num}_over_step{step_den}",
+                               step_num, step_den, f"{LEGNAMES[step_num]} / {LEGNAMES[step_den]}").Write()
+        step_eff.add_to_table(eff_table, origin, variable)
+    output.cd()
     for hist in hist_list:
         hist.Write()
     output.Close()
+    if summary_format != "none":
+        write_table(eff_table, os.path.join(outpath, f"Eff_steps.{summary_format}"), summary_format)
 
     pt_min = hist_pt_prompt[0].GetXaxis().GetBinLowEdge(1)
     pt_max = min(hist_pt_prompt[0].GetXaxis().GetBinUpEdge(hist_pt_prompt[0].GetNbinsX()), pt_max)
@@ -492,6 +703,25 @@ if __name__ == "__main__":
                         help="specific id of input directory")
     parser.add_argument("--pt_max", "-pt", type=float, default=999.,
                         help="max pt for histograms")
+    parser.add_argument("--nworkers", "-j", type=int, default=2,
+                        help="number of processes used for the projections of the steps "
+                             "(each one holding the container of the steps of a file in memory)")
+    parser.add_argument("--max-step-groups", type=int, default=MAX_STEP_GROUPS,
+                        help="maximum number of processes sharing the steps of the same input file")
+    parser.add_argument("--keep-sparse", action="store_true", default=False,
+                        help="store the THn of each step (summed over the input files) in the output file")
+    parser.add_argument("--eff-method", choices=INTERVAL_METHODS, default="wilson",
+                        help="confidence intervals of the step efficiencies "
+                             "(bayesian and clopper_pearson need scipy)")
+    parser.add_argument("--summary", choices=SUMMARY_FORMATS + ["none"], default="json",
+                        help="format of the table of the step efficiencies (Eff_steps.<format>)")
+    parser.add_argument("--merge", choices=MERGE_MODES, default="none",
+                        help="merge the input files before the projections: in a ROOT file (root) "
+                             "or as summed filled bins (numpy)")
+    parser.add_argument("--merged-file", metavar="text", default=None,
+                        help="cache of the merged inputs (.root for --merge root, .npz for --merge numpy)")
     args = parser.parse_args()
 
-    check_mc_eff(args.infiles, args.outpath, args.particle, args.pt_max, args.iddir)
\ No newline at end of file
+    check_mc_eff(args.infiles, args.outpath, args.particle, args.pt_max, args.iddir, args.nworkers,
+                 args.keep_sparse, args.eff_method, args.summary, args.merge, args.merged_file,
+                 args.max_step_groups)
\ No newline at end of file
@@ -2,10 +2,13 @@ import ROOT
 import yaml
 import argparse
 import os
+import numpy as np
+from hist_utils import get_axis_edges, get_y_slice_stats
 
 pdgs = [211, 321, 2212]  # pi, K, p
 pdg_label = {211: "pi", 321: "ka", 2212: "pr"}
 pdg_title = {211: "pi", 321: "kaon", 2212: "proton"}
+ESTIMATORS = ["mean", "median", "truncated_mean"]
 
 ROOT.gStyle.GetColorPalette(ROOT.kRainbow)
 
@@ -23,27 +26,28 @@ def download_anres(file_name, mclabel):
     else:
         print(f"File {file_name} already exists locally.")
 
-def make_mean_graph_x_slices(hist2, name):
-    graph = ROOT.TGraphErrors(hist2.GetNbinsX())
-    graph.SetName(name)
-
-    for ix in range(1, hist2.GetNbinsX() + 1):
-        projection = hist2.ProjectionY(f"{name}_proj_x{ix}", ix, ix)
-        projection.SetDirectory(0)
-
-        point = ix - 1
-        x_center = hist2.GetXaxis().GetBinCenter(ix)
-        x_err = 0.5 * hist2.GetXaxis().GetBinWidth(ix)
-
-        if projection.GetEntries() > 0:
-            y_mean = projection.GetMean()
-            y_err = projection.GetMeanError()
-        #else:
-        #    y_mean = 0.0
-        #    y_err = 0.0
+def make_mean_graph_x_slices(hist2, name, estimator="mean", truncation=(0., 0.6)):
+    """
+    Graph of an estimator of the y distribution in each x bin of a TH2, computed for all the
+    x bins at once (see hist_utils.get_y_slice_stats). Estimators (ESTIMATORS): mean, median
+    (error from the error of the mean, sqrt(pi/2) times larger for a gaussian distribution) and
+    mean between the quantiles truncation.
+    """
+    stats = get_y_slice_stats(hist2, quantiles=(0.5,), truncation=truncation)
+    if estimator == "mean":
+        y_values, y_errors = stats["mean"], stats["mean_err"]
+    elif estimator == "median":
+        y_values, y_errors = stats["quantiles"][:, 0], np.sqrt(np.pi / 2.) * stats["mean_err"]
+    elif estimator == "truncated_mean":
+        y_values, y_errors = stats["trunc_mean"], stats["trunc_mean_err"]
+    else:
+        raise ValueError(f"Unknown estimator {estimator}, choose among {ESTIMATORS}")
 
-        graph.SetPoint(point, x_center, y_mean)
-        graph.SetPointError(point, x_err, y_err)
+    x_edges = get_axis_edges(hist2.GetXaxis())
+    x_centers, x_errors = 0.5 * (x_edges[:-1] + x_edges[1:]), 0.5 * np.diff(x_edges)
+    graph = ROOT.TGraphErrors(len(x_centers), np.asarray(x_centers, "d"), np.asarray(y_values, "d"),
+                              np.asarray(x_errors, "d"), np.asarray(y_errors, "d"))
+    graph.SetName(name)
 
     graph.SetMarkerStyle(ROOT.kFullCircle)
     graph.SetMarkerSize(0.8)
@@ -84,6 +88,8 @@ if __name__ == "__main__":
     ymax = config['plot_style'].get('ymax', 1.0)
     rebinx = config['plot_style'].get('rebinx', 1)
     rebiny = config['plot_style'].get('rebiny', 1)
+    estimator = config['plot_style'].get('mean_estimator', 'mean')
+    truncation = config['plot_style'].get('truncation', [0., 0.6])
     outdir = config['output_directory']
     path_to_hist = config['path_to_th2']
 
@@ -186,7 +192,9 @@ if __name__ == "__main__":
 
             mean_graph = make_mean_graph_x_slices(
                 hist,
-                f"mean_{mclabel}_{pdg}"
+                f"mean_{mclabel}_{pdg}",
+                estimator,
+                truncation
             )
 
             mean_graphs[(mclabel, pdg)] = mean_graph
@@ -0,0 +1,104 @@
+"""
+Efficiencies of the QA outputs (efficiencies/h_eff* and efficiencies/h_effocc* histograms)
+read with a single scan of each file into a table, and ratios of the efficiencies in
+several centrality/occupancy intervals to a reference interval computed at once
+"""
+
+import re
+import numpy as np
+import ROOT
+from hist_utils import get_bin_contents, get_bin_errors2, set_bin_contents, divide
+
+EFF_DIR = "efficiencies"
+# h_<kind>_<category><channel>vcent<interval>, e.g. h_effocc_promptDzeroToKPivcent0_2000
+EFF_NAME_PATTERN = re.compile(r"^h_(eff|effocc)_(prompt|nonprompt|ratio)(\w+?)vcent(\w+)$")
+
+
+def parse_eff_name(name):
+    """
+    Kind (eff, effocc), category (prompt, nonprompt, ratio), channel and interval
+    of an efficiency histogram, None if the name does not match EFF_NAME_PATTERN
+    """
+    match = EFF_NAME_PATTERN.match(name)
+    return match.groups() if match else None
+
+
+def read_efficiencies(file_path, eff_dir=EFF_DIR):
+    """
+    Reads all the efficiency histograms of the directory eff_dir of a QA output
+    with a single scan of the keys of the directory
+
+    Returns:
+        - dictionary {(kind, category, channel, interval): histogram}
+    """
+    infile = ROOT.TFile.Open(file_path)
+    if not infile or not infile.IsOpen():
+        raise IOError(f"Could not open file {file_path}.")
+    directory = infile.Get(eff_dir)
+    if not directory:
+        raise ValueError(f"Directory {eff_dir} not found in file {file_path}.")
+
+    hists = {}
+    for key in directory.GetListOfKeys():
+        fields = parse_eff_name(key.GetName())
+        if fields is None:
+            continue
+        hist = key.ReadObj()
+        hist.SetDirectory(0)
+        hists[fields] = hist
+    infile.Close()
+
+    return hists
+
+
+class EfficiencyTable:
+    """
+    Efficiency histograms of a list of QA outputs, indexed by
+    (file index, kind, category, channel, interval)
+    """
+
+    def __init__(self, file_paths, eff_dir=EFF_DIR):
+        """
+        Opens each file of file_paths once and reads all its efficiencies
+        """
+        self.file_paths = list(file_paths)
+        self.hists = {}
+        for ifile, file_path in enumerate(self.file_paths):
+            for fields, hist in read_efficiencies(file_path, eff_dir).items():
+                self.hists[(ifile,) + fields] = hist
+        print(f"[info] {len(self.hists)} efficiencies read from {len(self.file_paths)} files")
+
+    def get(self, kind, category, channel, interval, ifile=0):
+        """
+        Efficiency histogram of the file with index ifile
+        """
+        key = (ifile, kind, category, channel, interval)
+        if key not in self.hists:
+            raise KeyError(f"Efficiency h_{kind}_{category}{channel}vcent{interval} not found in "
+                           f"{self.file_paths[ifile]}")
+        return self.hists[key]
+
+    def get_intervals(self, kind, category, channel, ifile=0):
+        """
+        Intervals available for an efficiency of the file with index ifile
+        """
+        return [key[4] for key in self.hists if key[:4] == (ifile, kind, category, channel)]
+
+
+def get_ratio_hists(hists, names, reference=0):
+    """
+    Ratios of a list of histograms with the same binning to the histogram with index reference,
+    computed at once on the NumPy arrays with binomial errors (as TH1::Divide with option "B").
+    The ratios are clones of the histograms (same style) named names
+    """
+    contents = np.array([get_bin_contents(hist) for hist in hists])
+    errors2 = np.array([get_bin_errors2(hist) for hist in hists])
+    ratios, ratios_err2 = divide(contents, contents[reference], errors2, errors2[reference], binomial=True)
+
+    ratio_hists = []
+    for hist, name, ratio, ratio_err2 in zip(hists, names, ratios, ratios_err2):
+        ratio_hists.append(hist.Clone(name))
+        ratio_hists[-1].SetDirectory(0)
+        set_bin_contents(ratio_hists[-1], ratio, ratio_err2)
+
+    return ratio_hists
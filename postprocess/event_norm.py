@@ -0,0 +1,52 @@
+"""
+Number of events in centrality and occupancy intervals, used to normalise the
+yields of the occupancy studies. The TH2 of the collisions is read once and
+any rectangular count is obtained from its 2D cumulative sums
+"""
+
+import numpy as np
+import ROOT
+from hist_utils import get_bin_contents
+
+DEFAULT_HIST_NAME = "hf-task-flow-charm-hadrons/hCollisionsCentOcc"
+
+
+class EventCounter:
+    """
+    Counts of the entries of a TH2 (e.g. collisions vs centrality and occupancy) in rectangular intervals
+    """
+
+    def __init__(self, file_name, hist_name=DEFAULT_HIST_NAME):
+        """
+        Reads the TH2 hist_name from the ROOT file file_name
+        """
+        infile = ROOT.TFile.Open(file_name, "READ")
+        if not infile or not infile.IsOpen():
+            raise IOError(f"Could not open file {file_name}.")
+
+        hist = infile.Get(hist_name)
+        if not hist or not isinstance(hist, ROOT.TH2):
+            raise ValueError(f"Histogram {hist_name} not found or not a TH2 in file {file_name}.")
+
+        self.x_axis = ROOT.TAxis(hist.GetXaxis())
+        self.y_axis = ROOT.TAxis(hist.GetYaxis())
+        # cumulative[i, j] = sum of the bins (x < i, y < j), under- and overflow bins included
+        contents = get_bin_contents(hist).T
+        self.cumulative = np.zeros((contents.shape[0] + 1, contents.shape[1] + 1))
+        self.cumulative[1:, 1:] = contents.cumsum(axis=0).cumsum(axis=1)
+        infile.Close()
+
+    def count(self, x_range, y_range):
+        """
+        Entries in the intervals x_range = (x_min, x_max) and y_range = (y_min, y_max),
+        the edges of the intervals being assigned to the bins inside the intervals
+        """
+        x_bin_min = self.x_axis.FindFixBin(x_range[0] + 0.0001)
+        x_bin_max = self.x_axis.FindFixBin(x_range[1] - 0.0001)
+        y_bin_min = self.y_axis.FindFixBin(y_range[0] + 0.0001)
+        y_bin_max = self.y_axis.FindFixBin(y_range[1] - 0.0001)
+        if x_bin_max < x_bin_min or y_bin_max < y_bin_min:
+            return 0.
+
+        return (self.cumulative[x_bin_max + 1, y_bin_max + 1] - self.cumulative[x_bin_min, y_bin_max + 1]
+                - self.cumulative[x_bin_max + 1, y_bin_min] + self.cumulative[x_bin_min, y_bin_min])
@@ -0,0 +1,250 @@
+"""
+Helper functions to move histogram contents between ROOT and NumPy
+"""
+
+import hashlib
+import numpy as np
+import ROOT
+
+# storage type of the TH1 classes, in the order they have to be checked
+_ARRAY_TYPES = [
+    ("TArrayD", np.float64),
+    ("TArrayF", np.float32),
+    ("TArrayL64", np.int64),
+    ("TArrayI", np.int32),
+    ("TArrayS", np.int16),
+    ("TArrayC", np.int8),
+]
+
+
+def get_shape(hist):
+    """
+    Shape of the NumPy view of a TH1/TH2/TH3, including under- and overflow bins.
+    The ROOT global bin is x + (nx+2) * (y + (ny+2) * z), hence the axes are reversed.
+    """
+    shape = [hist.GetNbinsX() + 2]
+    if hist.GetDimension() > 1:
+        shape.insert(0, hist.GetNbinsY() + 2)
+    if hist.GetDimension() > 2:
+        shape.insert(0, hist.GetNbinsZ() + 2)
+    return tuple(shape)
+
+
+def get_bin_contents(hist):
+    """
+    Returns the bin contents of a TH1/TH2/TH3 as a float64 NumPy array
+    (including under- and overflow bins) with shape get_shape(hist)
+    """
+    for array_type, dtype in _ARRAY_TYPES:
+        if hist.InheritsFrom(array_type):
+            break
+    else:
+        raise TypeError(f"Unsupported histogram type {hist.ClassName()}")
+
+    contents = np.frombuffer(hist.GetArray(), dtype=dtype, count=hist.GetNcells())
+    return contents.astype(np.float64).reshape(get_shape(hist))
+
+
+def get_bin_errors2(hist):
+    """
+    Returns the squared bin errors of a TH1/TH2/TH3 as a NumPy array
+    with shape get_shape(hist), Poisson errors if Sumw2 is not set
+    """
+    sumw2 = hist.GetSumw2()
+    if sumw2.GetSize() == 0:
+        return np.abs(get_bin_contents(hist))
+    errors2 = np.frombuffer(sumw2.GetArray(), dtype=np.float64, count=sumw2.GetSize())
+    return errors2.copy().reshape(get_shape(hist))
+
+
+def get_axis_edges(axis):
+    """
+    Returns the bin edges of a TAxis as a NumPy array
+    """
+    return np.array([axis.GetBinLowEdge(ibin) for ibin in range(1, axis.GetNbins() + 2)])
+
+
+def get_range_bins(axis, vmin, vmax):
+    """
+    Returns the first and last bin selected by TAxis::SetRangeUser(vmin, vmax)
+    """
+    bin_min = axis.FindFixBin(vmin)
+    bin_max = axis.FindFixBin(vmax)
+    if axis.GetBinUpEdge(bin_min) <= vmin:
+        bin_min += 1
+    if axis.GetBinLowEdge(bin_max) >= vmax:
+        bin_max -= 1
+    return bin_min, bin_max
+
+
+def rebin(contents, axis, new_edges):
+    """
+    Merges the bins along the last dimension of an array with the binning of a TAxis
+    (including under- and overflow bins) into new_edges, as TH1::Rebin with variable bins
+
+    Returns:
+        - rebinned array, including under- and overflow bins
+    """
+    contents = np.asarray(contents, dtype=np.float64)
+    new_edges = np.asarray(new_edges, dtype=np.float64)
+    edges = get_axis_edges(axis)
+    centers = 0.5 * (edges[:-1] + edges[1:])
+    # bins with center outside new_edges go to the under- and overflow bins
+    new_bins = np.concatenate(([0], np.searchsorted(new_edges, centers, side="right"), [len(new_edges)]))
+    rebinned = np.zeros((len(new_edges) + 1,) + contents.shape[:-1])
+    np.add.at(rebinned, new_bins, np.moveaxis(contents, -1, 0))
+    return np.moveaxis(rebinned, 0, -1)
+
+
+def set_bin_contents(hist, contents, errors2=None):
+    """
+    Fills a TH1/TH2/TH3 with the NumPy arrays of contents and squared errors
+    (including under- and overflow bins, same layout as get_bin_contents)
+    """
+    contents = np.ascontiguousarray(contents, dtype=np.float64).ravel()
+    if contents.size != hist.GetNcells():
+        raise ValueError(f"Expected {hist.GetNcells()} cells for {hist.GetName()}, got {contents.size}")
+    hist.SetContent(contents)
+    if errors2 is not None:
+        if hist.GetSumw2N() == 0:
+            hist.Sumw2()
+        errors = np.sqrt(np.ascontiguousarray(errors2, dtype=np.float64).ravel())
+        hist.SetError(errors)
+    hist.SetEntries(contents.sum())
+
+
+def th1_from_arrays(name, title, edges, contents, errors2=None):
+    """
+    Creates a TH1D with variable binning from the NumPy arrays of contents
+    and squared errors (without under- and overflow bins)
+    """
+    edges = np.asarray(edges, "d")
+    hist = ROOT.TH1D(name, title, len(edges) - 1, edges)
+    hist.SetDirectory(0)
+    set_bin_contents(hist, np.pad(np.asarray(contents, dtype=np.float64), 1),
+                     None if errors2 is None else np.pad(np.asarray(errors2, dtype=np.float64), 1))
+    return hist
+
+
+def th1_from_axis(name, title, axis, contents, errors2=None):
+    """
+    Creates a TH1D with the binning of a TAxis from the NumPy arrays of contents
+    and squared errors (including under- and overflow bins)
+    """
+    hist = ROOT.TH1D(name, title, axis.GetNbins(), get_axis_edges(axis))
+    hist.SetDirectory(0)
+    if not title:
+        hist.GetXaxis().SetTitle(axis.GetTitle())
+    set_bin_contents(hist, contents, errors2)
+    return hist
+
+
+def get_thn_projection(thn, axes):
+    """
+    Projects a THn/THnSparse on one to three axes in a single pass (respecting the
+    ranges set on the axes) and returns the projection with its contents and squared
+    errors as NumPy arrays indexed in the order of axes (including under- and overflow bins)
+    """
+    if len(axes) == 1:
+        proj = thn.Projection(axes[0], "E")
+    elif len(axes) == 2:
+        proj = thn.Projection(axes[1], axes[0], "E")
+    elif len(axes) == 3:
+        proj = thn.Projection(axes[0], axes[1], axes[2], "E")
+    else:
+        raise ValueError(f"Projection on {len(axes)} axes not supported")
+    proj.SetDirectory(0)
+
+    return proj, get_bin_contents(proj).T, get_bin_errors2(proj).T
+
+
+def divide(num, den, num_err2, den_err2, binomial=False):
+    """
+    Bin-by-bin ratio of NumPy arrays with the same error propagation of TH1::Divide
+    (option "B" for binomial errors), bins with empty denominator are set to 0
+
+    Returns:
+        - ratio and its squared errors
+    """
+    num, den = np.asarray(num, dtype=np.float64), np.asarray(den, dtype=np.float64)
+    num_err2, den_err2 = np.asarray(num_err2, dtype=np.float64), np.asarray(den_err2, dtype=np.float64)
+    mask = den != 0
+    safe_den = np.where(mask, den, 1.)
+    ratio = np.where(mask, num / safe_den, 0.)
+    if binomial:
+        err2 = np.abs(((1. - 2. * ratio) * num_err2 + ratio**2 * den_err2) / safe_den**2)
+        err2 = np.where(num != den, err2, 0.)
+    else:
+        err2 = (num_err2 * den**2 + den_err2 * num**2) / safe_den**4
+    err2 = np.where(mask, err2, 0.)
+
+    return ratio, err2
+
+
+def get_y_slice_stats(hist2, quantiles=(0.5,), truncation=(0., 1.)):
+    """
+    Statistics of the y distribution in each x bin of a TH2 (as the projections TH2::ProjectionY(ix, ix)
+    within the range of the y axis), computed for all the x bins at once from the bin contents:
+    sum of weights, mean, RMS, error of the mean, quantiles (interpolated within the bins as
+    TH1::GetQuantiles) and mean between the quantiles truncation = (q_min, q_max) with its error.
+    Slices with no content get 0
+
+    Returns:
+        - dictionary of arrays with one entry per x bin (shape (number of x bins, len(quantiles)) for quantiles)
+    """
+    first, last = hist2.GetYaxis().GetFirst(), hist2.GetYaxis().GetLast()
+    edges = get_axis_edges(hist2.GetYaxis())[first - 1:last + 1]
+    centers, widths = 0.5 * (edges[:-1] + edges[1:]), np.diff(edges)
+    # arrays indexed as (y, x), slices as (x, y)
+    contents = get_bin_contents(hist2)[first:last + 1, 1:-1].T
+    errors2 = get_bin_errors2(hist2)[first:last + 1, 1:-1].T
+
+    def weighted_stats(weights, weights2):
+        sumw = weights.sum(axis=1)
+        safe_sumw = np.where(sumw != 0, sumw, 1.)
+        mean = (weights * centers).sum(axis=1) / safe_sumw
+        rms = np.sqrt(np.maximum((weights * centers**2).sum(axis=1) / safe_sumw - mean**2, 0.))
+        sumw2 = weights2.sum(axis=1)
+        n_eff = np.where(sumw2 > 0, sumw**2 / np.where(sumw2 > 0, sumw2, 1.), 0.)
+        mean_err = np.where(n_eff > 0, rms / np.sqrt(np.where(n_eff > 0, n_eff, 1.)), 0.)
+        empty = sumw == 0
+        return sumw, np.where(empty, 0., mean), np.where(empty, 0., rms), np.where(empty, 0., mean_err)
+
+    sumw, mean, rms, mean_err = weighted_stats(contents, errors2)
+    stats = {"sumw": sumw, "mean": mean, "rms": rms, "mean_err": mean_err}
+
+    # cumulative fractions before and after each bin
+    safe_sumw = np.where(sumw != 0, sumw, 1.)[:, np.newaxis]
+    cum_after = np.cumsum(contents, axis=1) / safe_sumw
+    cum_before = cum_after - contents / safe_sumw
+
+    values = np.zeros((len(sumw), len(quantiles)))
+    for iq, quantile in enumerate(quantiles):
+        ibin = np.minimum((cum_after < quantile).sum(axis=1), len(centers) - 1)
+        rows = np.arange(len(sumw))
+        frac = (contents[rows, ibin] / safe_sumw[:, 0])
+        with np.errstate(invalid="ignore", divide="ignore"):
+            offset = np.where(frac > 0, (quantile - cum_before[rows, ibin]) / frac, 0.)
+        values[:, iq] = np.where(sumw != 0, edges[ibin] + widths[ibin] * offset, 0.)
+    stats["quantiles"] = values
+
+    # bin contents between the quantiles of the truncation, the bins crossing them being split linearly
+    overlap = np.clip(np.minimum(cum_after, truncation[1]) - np.maximum(cum_before, truncation[0]), 0., None)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        scale = np.where(contents != 0, overlap * safe_sumw / contents, 0.)
+    _, trunc_mean, _, trunc_mean_err = weighted_stats(contents * scale, errors2 * scale**2)
+    stats["trunc_mean"], stats["trunc_mean_err"] = trunc_mean, trunc_mean_err
+
+    return stats
+
+
+def compute_checksum(*arrays):
+    """
+    Returns a hex digest of the contents of a set of NumPy arrays
+    """
+    digest = hashlib.sha1()
+    for array in arrays:
+        array = np.ascontiguousarray(array, dtype=np.float64)
+        digest.update(str(array.shape).encode())
+        digest.update(array.tobytes())
+    return digest.hexdigest()
@@ -0,0 +1,82 @@
+"""
+Merging of selected objects of many ROOT files (e.g. run-by-run outputs) into a single
+cached file, performed in parallel on chunks of files as hadd -j
+"""
+
+import os
+import json
+import hashlib
+import multiprocessing
+import ROOT
+
+
+def get_inputs_checksum(infile_names, *tags):
+    """
+    Checksum of a list of input files (names, sizes and modification times) and of optional tags
+    """
+    digest = hashlib.sha1()
+    for infile_name in infile_names:
+        stat = os.stat(infile_name)
+        digest.update(f"{os.path.abspath(infile_name)}:{stat.st_size}:{stat.st_mtime_ns}".encode())
+    for tag in tags:
+        digest.update(str(tag).encode())
+    return digest.hexdigest()
+
+
+def merge_chunk(job):
+    """
+    Merges the objects object_names of a list of files with TFileMerger
+
+    Returns:
+        - True if the merge succeeded
+    """
+    infile_names, outfile_name, object_names = job
+    merger = ROOT.TFileMerger(False, False)
+    merger.SetPrintLevel(0)
+    merger.OutputFile(outfile_name, "RECREATE")
+    for infile_name in infile_names:
+        merger.AddFile(infile_name)
+    for object_name in object_names:
+        merger.AddObjectNames(object_name)
+    mode = ROOT.TFileMerger.kAll | ROOT.TFileMerger.kIncremental | ROOT.TFileMerger.kOnlyListed
+    return bool(merger.PartialMerge(mode))
+
+
+def merge_root_files(infile_names, outfile_name, object_names, n_workers=1):
+    """
+    Merges the objects object_names (names of directories and objects) of the input files into
+    outfile_name, splitting the files in n_workers chunks merged in parallel. The merged file is
+    reused if the input files and the objects are unchanged since the previous merge
+    (checksum stored in outfile_name.json)
+
+    Returns:
+        - name of the merged file
+    """
+    checksum_file = f"{outfile_name}.json"
+    checksum = get_inputs_checksum(infile_names, *object_names)
+    if os.path.isfile(outfile_name) and os.path.isfile(checksum_file):
+        with open(checksum_file, "r") as f:
+            if json.load(f).get("checksum") == checksum:
+                print(f"Merged inputs: {outfile_name} up to date, merge skipped")
+                return outfile_name
+
+    n_chunks = max(1, min(n_workers, len(infile_names) // 2))
+    if n_chunks == 1:
+        if not merge_chunk((infile_names, outfile_name, object_names)):
+            raise RuntimeError(f"Merge of the input files into {outfile_name} failed")
+    else:
+        jobs = [(infile_names[ichunk::n_chunks], f"{outfile_name}.part{ichunk}.root", object_names)
+                for ichunk in range(n_chunks)]
+        with multiprocessing.get_context("fork").Pool(n_chunks) as pool:
+            merged = pool.map(merge_chunk, jobs, chunksize=1)
+        part_names = [job[1] for job in jobs]
+        if not all(merged) or not merge_chunk((part_names, outfile_name, object_names)):
+            raise RuntimeError(f"Merge of the input files into {outfile_name} failed")
+        for part_name in part_names:
+            os.remove(part_name)
+
+    with open(checksum_file, "w") as f:
+        json.dump({"checksum": checksum, "inputs": list(infile_names)}, f, indent=2)
+    print(f"Merged inputs: {len(infile_names)} files merged into {outfile_name}")
+
+    return outfile_name
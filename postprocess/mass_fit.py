@@ -0,0 +1,599 @@
+"""
+Invariant-mass fits of the occupancy studies, with a scheduler to run
+the fits of independent histograms in a pool of processes (with warm start
+from neighbouring bins and caching of the results across runs).
+Two backends are available for the same model (Gaussian signal plus exponential
+background): RooFit and a binned Poisson likelihood fit in NumPy/SciPy
+"""
+
+import os
+import json
+import functools
+import multiprocessing
+import numpy as np
+import ROOT
+from hist_utils import get_axis_edges, get_bin_contents, get_bin_errors2, th1_from_arrays, compute_checksum
+
+FIT_BACKENDS = ["roofit", "numpy", "compare"]
+# initial value, min and max of the parameters of the model
+FIT_PARAMS = {
+    "mean": (1.87, 1.85, 1.89),
+    "sigma": (0.01, 0.005, 0.05),
+    "slope": (-1.0, -10.0, 0.0),
+    "sig_frac": (0.5, 0.0, 1.0),
+}
+FIT_QUANTITIES = ["mean", "sigma", "signal", "background", "s/b", "significance"]
+
+
+def get_init_value(par, init=None):
+    """
+    Initial value of a parameter of the model, taken from init (e.g. the parameters
+    of a converged fit of a neighbouring bin) if available, within the limits of FIT_PARAMS
+    """
+    default, par_min, par_max = FIT_PARAMS[par]
+    if init is None or par not in init:
+        return default
+    return min(max(init[par], par_min), par_max)
+
+
+def get_yield_ratios(signal_yield, signal_yield_err, background_yield, background_yield_err):
+    """
+    S/B and significance with their uncertainties
+    """
+    if background_yield > 0:
+        sb_ratio = signal_yield / background_yield
+        significance = signal_yield / (signal_yield + background_yield) ** 0.5
+        sb_ratio_err = (
+            sb_ratio
+            * (
+                (signal_yield_err / signal_yield) ** 2
+                + (background_yield_err / background_yield) ** 2
+            )
+            ** 0.5
+        )
+        significance_err = (
+            significance
+            * (
+                (signal_yield_err / signal_yield) ** 2
+                + (
+                    (signal_yield_err + background_yield_err)
+                    / (signal_yield + background_yield)
+                )
+                ** 2
+            )
+            ** 0.5
+        )
+    else:
+        sb_ratio, sb_ratio_err = float("inf"), 0
+        significance, significance_err = float("inf"), 0
+
+    return sb_ratio, sb_ratio_err, significance, significance_err
+
+
+def print_fit_results(results):
+    """
+    Prints the dictionary returned by the fit functions
+    """
+    print(f"Mean: {results['mean'][0]:.4f} ± {results['mean'][1]:.4f} GeV/c^2")
+    print(f"Sigma: {results['sigma'][0]:.4f} ± {results['sigma'][1]:.4f} GeV/c^2")
+    print(f"Signal Events: {results['signal'][0]:.2f} ± {results['signal'][1]:.2f}")
+    print(f"Background Events: {results['background'][0]:.2f} ± {results['background'][1]:.2f}")
+    print(f"S/B Ratio: {results['s/b'][0]:.2f} ± {results['s/b'][1]:.2f}")
+    print(f"Significance: {results['significance'][0]:.2f} ± {results['significance'][1]:.2f}")
+
+
+def draw_fit_labels(results):
+    """
+    Draws the fit results on the current pad
+    """
+    latex = ROOT.TLatex()
+    latex.SetTextSize(0.04)  # Set text size
+    latex.SetTextFont(42)  # Set font (42 = Helvetica)
+    latex.SetNDC(True)  # Use normalized device coordinates (NDC)
+
+    (mean_val, mean_err), (sigma_val, sigma_err) = results["mean"], results["sigma"]
+    latex.DrawLatex(
+        0.15, 0.84, f"#mu=({mean_val:.3f}#pm{mean_err:.3f}) GeV/#it{{c}}^{{2}}"
+    )
+    latex.DrawLatex(
+        0.15, 0.80, f"#sigma=({sigma_val:.3f}#pm{sigma_err:.3f}) GeV/#it{{c}}^{{2}}"
+    )
+    latex.DrawLatex(0.60, 0.84, "#it{{S}}={:.2f}#pm{:.2f}".format(*results["signal"]))
+    latex.DrawLatex(0.60, 0.80, "#it{{B}}={:.2f}#pm{:.2f}".format(*results["background"]))
+    latex.DrawLatex(0.60, 0.76, "#it{{S/B}}={:.2f}#pm{:.2f}".format(*results["s/b"]))
+    latex.DrawLatex(0.60, 0.72, "Signif.={:.2f}#pm{:.2f}".format(*results["significance"]))
+
+
+def fit_invariant_mass(hist, mass_range=(1.72, 2.04), label="", outdir=".", init=None):
+    """
+    Fit the invariant mass of D+ mesons, extract key parameters, and calculate uncertainties.
+
+    Parameters:
+    - hist (TH1): The invariant mass histogram to fit.
+    - mass_range (tuple): The mass range for fitting, e.g., (1.8, 2.0).
+    - label: label
+    - outdir: directory where the plot of the fit is saved
+    - init: dictionary with the initial values of (some of) the parameters, FIT_PARAMS by default
+
+    Returns:
+    - dict: A dictionary containing mean, sigma, signal, background, significance, S/B, and their uncertainties,
+      the fitted parameters (params) and the status of the minimisation (status, 0 if converged).
+    """
+    # Define the mass observable
+    mass = ROOT.RooRealVar(
+        "mass", "#it{M} (KK#pi)", mass_range[0], mass_range[1], "GeV/c^{2}"
+    )
+
+    # Import the histogram into a RooDataHist
+    data_hist = ROOT.RooDataHist(
+        "data_hist", "Data Histogram", ROOT.RooArgList(mass), hist
+    )
+
+    # Signal: Gaussian
+    mean = ROOT.RooRealVar("mean", "Mean", get_init_value("mean", init), *FIT_PARAMS["mean"][1:])
+    sigma = ROOT.RooRealVar("sigma", "Sigma", get_init_value("sigma", init), *FIT_PARAMS["sigma"][1:])
+    signal = ROOT.RooGaussian("signal", "Signal Gaussian", mass, mean, sigma)
+
+    # Background: Exponential
+    slope = ROOT.RooRealVar("slope", "Slope", get_init_value("slope", init), *FIT_PARAMS["slope"][1:])
+    background = ROOT.RooExponential(
+        "background", "Background Exponential", mass, slope
+    )
+
+    # Combined model: Signal + Background
+    sig_frac = ROOT.RooRealVar("sig_frac", "Signal Fraction", get_init_value("sig_frac", init), *FIT_PARAMS["sig_frac"][1:])
+    model = ROOT.RooAddPdf(
+        "model",
+        "Signal + Background",
+        ROOT.RooArgList(signal, background),
+        ROOT.RooArgList(sig_frac),
+    )
+
+    # Perform the fit
+    fit_result = model.fitTo(data_hist, ROOT.RooFit.Save())
+
+    # Extract uncertainties from the fit result
+    fit_params = {
+        "mean": (mean.getVal(), mean.getError()),
+        "sigma": (sigma.getVal(), sigma.getError()),
+        "sig_frac": (sig_frac.getVal(), sig_frac.getError()),
+        "slope": (slope.getVal(), slope.getError()),
+    }
+
+    # Define the 3σ range around the mean
+    mean_val, mean_err = fit_params["mean"]
+    sigma_val, sigma_err = fit_params["sigma"]
+    range_min = mean_val - 3 * sigma_val
+    range_max = mean_val + 3 * sigma_val
+    mass.setRange("signal_region", range_min, range_max)
+
+    # Integrals for signal and background in the 3σ region
+    signal_integral = signal.createIntegral(
+        ROOT.RooArgSet(mass),
+        ROOT.RooFit.NormSet(ROOT.RooArgSet(mass)),
+        ROOT.RooFit.Range("signal_region"),
+    ).getVal()
+    background_integral = background.createIntegral(
+        ROOT.RooArgSet(mass),
+        ROOT.RooFit.NormSet(ROOT.RooArgSet(mass)),
+        ROOT.RooFit.Range("signal_region"),
+    ).getVal()
+
+    # Total number of events in the histogram
+    total_events = data_hist.sumEntries()
+
+    # Signal and background yields
+    sig_frac_val, sig_frac_err = fit_params["sig_frac"]
+    signal_yield = sig_frac_val * total_events * signal_integral
+    background_yield = (1 - sig_frac_val) * total_events * background_integral
+
+    # Uncertainty propagation for signal and background yields
+    signal_yield_err = (
+        signal_yield * sig_frac_err / sig_frac_val if sig_frac_val != 0 else 0
+    )
+    background_yield_err = (
+        background_yield * sig_frac_err / (1 - sig_frac_val) if sig_frac_val != 1 else 0
+    )
+
+    # Calculate significance and S/B
+    sb_ratio, sb_ratio_err, significance, significance_err = get_yield_ratios(
+        signal_yield, signal_yield_err, background_yield, background_yield_err
+    )
+
+    results = {
+        "mean": (mean_val, mean_err),
+        "sigma": (sigma_val, sigma_err),
+        "signal": (signal_yield, signal_yield_err),
+        "background": (background_yield, background_yield_err),
+        "s/b": (sb_ratio, sb_ratio_err),
+        "significance": (significance, significance_err),
+        "params": {par: values[0] for par, values in fit_params.items()},
+        "status": fit_result.status(),
+    }
+    print_fit_results(results)
+
+    # Plot the fit
+    frame = mass.frame(ROOT.RooFit.Title(label))
+    data_hist.plotOn(
+        frame,
+        ROOT.RooFit.MarkerStyle(ROOT.kFullCircle),
+        ROOT.RooFit.MarkerColor(ROOT.kBlack),
+        ROOT.RooFit.MarkerSize(1.0),
+        ROOT.RooFit.DrawOption("PEZ1"),
+    )
+    model.plotOn(
+        frame,
+        ROOT.RooFit.Components("background"),
+        ROOT.RooFit.LineStyle(ROOT.kDashed),
+        ROOT.RooFit.LineColor(ROOT.kOrange + 1),
+    )
+    model.plotOn(frame, ROOT.RooFit.LineColor(ROOT.kAzure + 2))
+    model.plotOn(
+        frame,
+        ROOT.RooFit.Components("signal"),
+        ROOT.RooFit.LineColor(ROOT.kAzure + 2),
+        ROOT.RooFit.FillColor(ROOT.kAzure + 2),
+        ROOT.RooFit.FillStyle(3004),
+        ROOT.RooFit.LineWidth(1),
+        ROOT.RooFit.DrawOption("FL"),
+    )
+
+    # Draw the frame
+    canvas = ROOT.TCanvas("canvas", "Fit Results", 800, 600)
+    frame.Draw()
+
+    # Add LaTeX labels
+    draw_fit_labels(results)
+
+    canvas.SaveAs(f"{outdir}/fit_result_{hist.GetName()}.png")
+
+    return results
+
+
+def _gaus_cdf(x, mean, sigma):
+    """
+    Cumulative of the Gaussian, with its derivatives with respect to mean and sigma
+    """
+    from scipy.special import ndtr # pylint: disable=import-outside-toplevel
+    z = (x - mean) / sigma
+    pdf = np.exp(-0.5 * z**2) / np.sqrt(2 * np.pi)
+    return ndtr(z), -pdf / sigma, -pdf * z / sigma
+
+
+def _expo_cdf(x, slope, xmin):
+    """
+    Integral of exp(slope * (x - xmin)) from xmin to x, with its derivative with respect to slope
+    """
+    u = x - xmin
+    return np.expm1(slope * u) / slope, (u * np.exp(slope * u) - np.expm1(slope * u) / slope) / slope
+
+
+def _get_bin_fractions(edges, pars):
+    """
+    Fractions of the normalised Gaussian and exponential in the bins defined by edges (the first and
+    last edges being the fit range) and their derivatives with respect to (mean, sigma, slope)
+    """
+    mean, sigma, slope = pars
+    cdf, dcdf_dmean, dcdf_dsigma = _gaus_cdf(edges, mean, sigma)
+    norm = cdf[-1] - cdf[0]
+    frac_sig = np.diff(cdf) / norm
+    dfrac_sig = [(np.diff(dcdf) - frac_sig * (dcdf[-1] - dcdf[0])) / norm for dcdf in (dcdf_dmean, dcdf_dsigma)]
+
+    cdf, dcdf_dslope = _expo_cdf(edges, slope, edges[0])
+    norm = cdf[-1]
+    frac_bkg = np.diff(cdf) / norm
+    dfrac_bkg = (np.diff(dcdf_dslope) - frac_bkg * dcdf_dslope[-1]) / norm
+
+    return frac_sig, frac_bkg, dfrac_sig + [dfrac_bkg]
+
+
+def _get_expected(edges, pars):
+    """
+    Expected counts per bin for the parameters (signal yield, background yield, mean, sigma, slope)
+    and their jacobian with shape (number of bins, number of parameters)
+    """
+    n_sig, n_bkg = pars[:2]
+    frac_sig, frac_bkg, (dfrac_dmean, dfrac_dsigma, dfrac_dslope) = _get_bin_fractions(edges, pars[2:])
+    expected = n_sig * frac_sig + n_bkg * frac_bkg
+    jacobian = np.stack([frac_sig, frac_bkg, n_sig * dfrac_dmean, n_sig * dfrac_dsigma, n_bkg * dfrac_dslope],
+                        axis=1)
+    return expected, jacobian
+
+
+def fit_invariant_mass_numpy(edges, contents, mass_range=(1.72, 2.04), label="", outdir=".", name="hmass",
+                             init=None):
+    """
+    Fit of the invariant mass with the same model as fit_invariant_mass, as an extended binned
+    Poisson likelihood fit with analytic gradient minimised with scipy.optimize (L-BFGS-B).
+    The uncertainties are obtained from the inverse of the Fisher information matrix.
+
+    Parameters:
+    - edges, contents: bin edges and contents (without under- and overflow) of the histogram
+    - mass_range (tuple): The mass range for fitting, the bins with center in the range are used
+    - label: label
+    - outdir: directory where the plot of the fit is saved, None to skip the plot
+    - name: name of the histogram, used for the name of the plot
+    - init: dictionary with the initial values of (some of) the parameters, FIT_PARAMS by default
+
+    Returns:
+    - dict: the same dictionary as fit_invariant_mass
+    """
+    try:
+        from scipy.optimize import minimize # pylint: disable=import-outside-toplevel
+    except ImportError as exc:
+        raise ImportError("scipy needed for the numpy backend of the mass fits") from exc
+
+    edges, contents = np.asarray(edges, "d"), np.asarray(contents, "d")
+    centers = 0.5 * (edges[:-1] + edges[1:])
+    in_range = np.flatnonzero((centers >= mass_range[0]) & (centers <= mass_range[1]))
+    fit_edges = edges[in_range[0]:in_range[-1] + 2]
+    counts = contents[in_range]
+    total_events = counts.sum()
+
+    # yields normalised to the total number of events, so that all the parameters are of order 1
+    scale = np.array([total_events, total_events, 1., 1., 1.])
+    bounds = [(0., 2.), (0., 2.), FIT_PARAMS["mean"][1:], FIT_PARAMS["sigma"][1:],
+              (FIT_PARAMS["slope"][1], min(FIT_PARAMS["slope"][2], -1.e-6))] # slope = 0 singular in _expo_cdf
+    sig_frac_init = get_init_value("sig_frac", init)
+    pars_init = np.array([sig_frac_init, 1 - sig_frac_init, get_init_value("mean", init),
+                          get_init_value("sigma", init), min(get_init_value("slope", init), bounds[-1][1])])
+
+    def nll(pars):
+        expected, jacobian = _get_expected(fit_edges, pars * scale)
+        expected = np.maximum(expected, 1.e-300)
+        value = np.sum(expected - counts * np.log(expected))
+        gradient = ((1. - counts / expected) @ jacobian) * scale
+        return value / total_events, gradient / total_events
+
+    fit = minimize(nll, pars_init, jac=True, method="L-BFGS-B", bounds=bounds)
+    if not fit.success:
+        print(f"WARNING: numpy fit of {name} not converged: {fit.message}")
+    pars = fit.x * scale
+    expected, jacobian = _get_expected(fit_edges, pars)
+    fisher = jacobian.T @ (jacobian / np.maximum(expected, 1.e-300)[:, np.newaxis])
+    pars_err = np.sqrt(np.abs(np.diag(np.linalg.pinv(fisher))))
+
+    n_sig, n_bkg, mean_val, sigma_val, slope_val = pars
+    n_sig_err, n_bkg_err, mean_err, sigma_err, _ = pars_err
+
+    # Integrals for signal and background in the 3σ region (within the fit range)
+    region = np.clip([mean_val - 3 * sigma_val, mean_val + 3 * sigma_val], fit_edges[0], fit_edges[-1])
+    frac_sig, frac_bkg, _ = _get_bin_fractions(np.concatenate(([fit_edges[0]], region, [fit_edges[-1]])),
+                                               pars[2:])
+    signal_yield = n_sig * frac_sig[1]
+    background_yield = n_bkg * frac_bkg[1]
+    signal_yield_err = signal_yield * n_sig_err / n_sig if n_sig > 0 else 0
+    background_yield_err = background_yield * n_bkg_err / n_bkg if n_bkg > 0 else 0
+
+    sb_ratio, sb_ratio_err, significance, significance_err = get_yield_ratios(
+        signal_yield, signal_yield_err, background_yield, background_yield_err
+    )
+
+    results = {
+        "mean": (mean_val, mean_err),
+        "sigma": (sigma_val, sigma_err),
+        "signal": (signal_yield, signal_yield_err),
+        "background": (background_yield, background_yield_err),
+        "s/b": (sb_ratio, sb_ratio_err),
+        "significance": (significance, significance_err),
+        "params": {"mean": mean_val, "sigma": sigma_val, "slope": slope_val,
+                   "sig_frac": n_sig / (n_sig + n_bkg) if n_sig + n_bkg > 0 else 0.},
+        "status": int(fit.status),
+    }
+    print_fit_results(results)
+
+    if outdir is not None:
+        plot_fit_numpy(edges, contents, fit_edges, pars, name, label, outdir)
+
+    return results
+
+
+def plot_fit_numpy(edges, contents, fit_edges, pars, name, label, outdir):
+    """
+    Plots the histogram and the model fitted by fit_invariant_mass_numpy
+    """
+    n_sig, n_bkg, mean, sigma, slope = pars
+    hist = th1_from_arrays(f"{name}_fit", label, edges, contents, contents)
+    hist.GetXaxis().SetRangeUser(fit_edges[0], fit_edges[-1])
+    hist.GetXaxis().SetTitle("#it{M} (KK#pi) (GeV/#it{c}^{2})")
+    hist.SetMarkerStyle(ROOT.kFullCircle)
+    hist.SetMarkerColor(ROOT.kBlack)
+    hist.SetLineColor(ROOT.kBlack)
+
+    # densities times the bin width, to be compared with the bin contents
+    bin_width = hist.GetBinWidth(hist.FindBin(mean))
+    norm_sig = n_sig * bin_width / (sigma * np.sqrt(2 * np.pi)) \
+        / np.diff(_gaus_cdf(np.array([fit_edges[0], fit_edges[-1]]), mean, sigma)[0])[0]
+    norm_bkg = n_bkg * bin_width / _expo_cdf(fit_edges[-1], slope, fit_edges[0])[0]
+    func_bkg = ROOT.TF1("func_bkg", f"{norm_bkg}*exp({slope}*(x-{fit_edges[0]}))", fit_edges[0], fit_edges[-1])
+    func_tot = ROOT.TF1("func_tot", f"{norm_sig}*exp(-0.5*((x-{mean})/{sigma})**2) + "
+                        f"{norm_bkg}*exp({slope}*(x-{fit_edges[0]}))", fit_edges[0], fit_edges[-1])
+    func_bkg.SetLineStyle(ROOT.kDashed)
+    func_bkg.SetLineColor(ROOT.kOrange + 1)
+    func_tot.SetLineColor(ROOT.kAzure + 2)
+    func_bkg.SetNpx(500)
+    func_tot.SetNpx(500)
+
+    canvas = ROOT.TCanvas("canvas", "Fit Results", 800, 600)
+    hist.Draw("PEZ1")
+    func_bkg.Draw("same")
+    func_tot.Draw("same")
+    canvas.SaveAs(f"{outdir}/fit_result_{name}.png")
+
+
+def compare_fit_backends(names, results_roofit, results_numpy):
+    """
+    Prints the results of the two backends for each fitted histogram, with the
+    differences in units of the RooFit uncertainty
+
+    Returns:
+    - list: dictionaries {quantity: (value roofit, value numpy, difference / uncertainty roofit)}
+    """
+    comparisons = []
+    for name, res_roofit, res_numpy in zip(names, results_roofit, results_numpy):
+        print(f"Comparison of the fit backends for {name}")
+        comparison = {}
+        for quantity in FIT_QUANTITIES:
+            (val_roofit, err_roofit), (val_numpy, _) = res_roofit[quantity], res_numpy[quantity]
+            pull = (val_numpy - val_roofit) / err_roofit if err_roofit > 0 else float("nan")
+            comparison[quantity] = (val_roofit, val_numpy, pull)
+            print(f"    {quantity:>12}: roofit {val_roofit:.4g}, numpy {val_numpy:.4g}, diff/err {pull:.2f}")
+        comparisons.append(comparison)
+
+    return comparisons
+
+
+class FitCache:
+    """
+    Results of the fits of previous runs, stored in a JSON file and keyed by a checksum
+    of the histogram contents, of the fit range and of the model configuration
+    """
+
+    def __init__(self, cache_file=None):
+        self.cache_file = cache_file
+        self.results = {}
+        if cache_file is not None and os.path.isfile(cache_file):
+            with open(cache_file, "r") as f:
+                self.results = json.load(f)
+            print(f"Fit cache: loaded {len(self.results)} fit results from {cache_file}")
+
+    @staticmethod
+    def get_key(task, backend):
+        """
+        Key of the fit of a task with a backend
+        """
+        model = [FIT_PARAMS[par] for par in sorted(FIT_PARAMS)]
+        return f"{backend}_" + compute_checksum(task["edges"], task["contents"], task["errors2"],
+                                                task["mass_range"], model)
+
+    def get(self, key):
+        """
+        Returns the result of a previous fit, None if not available
+        """
+        return self.results.get(key)
+
+    def add(self, key, result):
+        """
+        Stores the result of a fit, if converged
+        """
+        if result["status"] == 0:
+            self.results[key] = result
+
+    def save(self):
+        """
+        Writes the results to the JSON file (if any)
+        """
+        if self.cache_file is None:
+            return
+        with open(self.cache_file, "w") as f:
+            json.dump(self.results, f, indent=2, sort_keys=True)
+
+
+def get_fit_task(hist, mass_range=(1.72, 2.04), label="", outdir=".", chain=None):
+    """
+    Stores the content of a mass histogram in NumPy arrays, so that
+    it can be sent to the process that performs the fit. The tasks with the same
+    chain (e.g. the pt bins of a centrality and occupancy interval) are fitted in
+    sequence with warm starts, each fit starting from the parameters of the previous converged one
+    """
+    return {
+        "name": hist.GetName(),
+        "edges": get_axis_edges(hist.GetXaxis()),
+        "contents": get_bin_contents(hist)[1:-1],
+        "errors2": get_bin_errors2(hist)[1:-1],
+        "mass_range": mass_range,
+        "label": label,
+        "outdir": outdir,
+        "chain": chain,
+    }
+
+
+def run_fit_task(task, backend="roofit", init=None):
+    """
+    Fits the mass histogram of a fit task with the roofit or numpy backend, starting
+    from the parameters in init. If the fit does not converge, it is repeated
+    starting from the default parameters
+    """
+    ROOT.gROOT.SetBatch(True)
+    if backend == "numpy":
+        fit_function = functools.partial(fit_invariant_mass_numpy, task["edges"], task["contents"],
+                                         task["mass_range"], task["label"], task["outdir"], task["name"])
+    else:
+        hist = th1_from_arrays(task["name"], "", task["edges"], task["contents"], task["errors2"])
+        fit_function = functools.partial(fit_invariant_mass, hist, task["mass_range"],
+                                         task["label"], task["outdir"])
+
+    result = fit_function(init=init)
+    if result["status"] != 0 and init is not None:
+        print(f"WARNING: fit of {task['name']} not converged (status {result['status']}), "
+              "repeated with the default initial parameters")
+        result = fit_function(init=None)
+    return result
+
+
+def run_fit_chain(tasks, backend="roofit", warm_start=True):
+    """
+    Fits a list of tasks in sequence, each fit starting from the parameters of the previous
+    converged fit if warm_start. The tasks with a cached result (from a previous run) are not refitted
+    """
+    results, init = [], None
+    for task in tasks:
+        result = task.get("cached")
+        if result is not None:
+            print(f"Fit of {task['name']} taken from the cache")
+        else:
+            result = run_fit_task(task, backend, init)
+        if warm_start and result["status"] == 0:
+            init = result["params"]
+        results.append(result)
+    return results
+
+
+def run_fits(tasks, n_workers=1, backend="roofit", cache_file=None, warm_start=False):
+    """
+    Performs the fits of a list of tasks (see get_fit_task), in parallel if n_workers > 1,
+    with the roofit or numpy backend. With backend compare, the fits are performed with
+    both backends and the results are compared, the RooFit ones being returned.
+    With warm_start, the chains of tasks are run in parallel and the fits of each chain in sequence
+    (see run_fit_chain), so that at most as many processes as chains are used; otherwise each fit
+    is an independent task and all the n_workers are used.
+    If cache_file is set, the converged fits are stored there and reused in the following
+    runs for identical histograms and model configuration
+
+    Returns:
+    - list: the dictionaries of fit_invariant_mass, in the same order as the tasks
+    """
+    if backend not in FIT_BACKENDS:
+        raise ValueError(f"Unknown fit backend {backend}, choose among {FIT_BACKENDS}")
+    if backend == "compare":
+        results_roofit = run_fits(tasks, n_workers, "roofit", cache_file, warm_start)
+        numpy_tasks = [dict(task, name=f"{task['name']}_numpy") for task in tasks]
+        results_numpy = run_fits(numpy_tasks, n_workers, "numpy", cache_file, warm_start)
+        compare_fit_backends([task["name"] for task in tasks], results_roofit, results_numpy)
+        return results_roofit
+
+    cache = FitCache(cache_file)
+    keys = [cache.get_key(task, backend) for task in tasks]
+    chains = {}
+    for itask, task in enumerate(tasks):
+        chain = task.get("chain") if warm_start else None
+        chains.setdefault(itask if chain is None else chain, []).append(itask)
+    chain_tasks = [[dict(tasks[itask], cached=cache.get(keys[itask])) for itask in itasks]
+                   for itasks in chains.values()]
+
+    fit_function = functools.partial(run_fit_chain, backend=backend, warm_start=warm_start)
+    if n_workers <= 1 or len(chain_tasks) <= 1:
+        chain_results = [fit_function(task_list) for task_list in chain_tasks]
+    else:
+        # fork, so that the workers do not re-import the calling script
+        with multiprocessing.get_context("fork").Pool(min(n_workers, len(chain_tasks))) as pool:
+            chain_results = pool.map(fit_function, chain_tasks, chunksize=1)
+
+    results = [None] * len(tasks)
+    for itasks, chain_result in zip(chains.values(), chain_results):
+        for itask, result in zip(itasks, chain_result):
+            results[itask] = result
+            cache.add(keys[itask], result)
+    cache.save()
+
+    return results
@@ -6,47 +6,16 @@ import os
 import argparse
 import numpy as np
 import ROOT
+from hist_utils import get_bin_contents, get_bin_errors2, get_range_bins, compute_checksum, \
+    get_thn_projection, th1_from_axis, th1_from_arrays, divide, rebin
+from qa_cache import QACache
+from qa_config import load_qa_config, get_species, get_species_labels, get_interval_plan
+from qa_summary import QASummary, SUMMARY_FORMATS
 
 # stop figure display
 ROOT.gROOT.SetBatch(True)
 
-# gloabal variables
-particle_data = [
-    ("DzeroToKPi", "D^{0}#rightarrow K#pi"),
-    ("DstarToDzeroPi", "D*^{+}#rightarrow D^{0}#pi"),
-    ("DplusToPiKPi", "D^{+}#rightarrow K#pi#pi"),
-    ("DplusToPhiPiToKKPi", "D^{+}#rightarrow KK#pi"),
-    ("DsToPhiPiToKKPi", "D_{s}^{+}#rightarrow#phi#pi#rightarrow KK#pi"),
-    ("DsToK0starKToKKPi", "D_{s}^{+}#rightarrow K^{*}K#rightarrow KK#pi"),
-    ("Ds1ToDStarK0s", "D_{s}1#rightarrow D*^{+}K^{0}_{s}"),
-    ("Ds2StarToDPlusK0s", "D_{s}2*#rightarrow D^{+}K^{0}_{s}"),
-    ("D10ToDStarPi", "D1^{0}#rightarrow D*^{+}#pi"),
-    ("D2Star0ToDPlusPi", "D2^{*}#rightarrow D^{+}#pi"),
-    ("LcToPKPi", "#Lambda_{c}^{+}#rightarrow pK#pi"),
-    ("LcToPiK0s", "#Lambda_{c}^{+}#rightarrow pK^{0}_{s}"),
-    ("XiCplusToPKPi", "#Xi_{c}^{+}#rightarrow pK#pi"),
-    ("XiCplusToXiPiPi", "#Xi_{c}^{+}#rightarrow#Xi#pi#pi"),
-    ("XiCzeroToXiPi", "#Xi_{c}^{0}#rightarrow#Xi#pi"),
-    ("OmegaCToOmegaPi", "#Omega_{c}^{0}#rightarrow#Omega#pi"),
-    ("OmegaCToXiPi", "#Omega_{c}^{0}#rightarrow#Xi#pi"),
-]
-plot_full=True # plot additional info, not needed for std QA
-nmesons=10 # number of meson needed to properly handle baryon histos
-
-# Extract part names and labels from particle_data
-part_names, part_labels = zip(*particle_data)
-
-# Decay labels and baryon labels are dynamically split based on the particle type
-decay_labels = part_labels[:nmesons]  # Meson decays
-decay_labels_baryons = part_labels[nmesons:]  # Baryon decays
-plot = [True] * len(part_names)
-
-pt_bins = np.array([0., 1., 2., 3., 4., 5., 6., 8., 10., 12., 16., 24., 36, 50.])
-
-#origin_labels = ["fake", "light", "charm", "beauty"]
-origin_labels = []
-
-def compute_eff_vcent(th2gen, th2reco, centmin, centmax):
+def compute_eff_vcent(th2gen, th2reco, centmin, centmax, pt_bins):
     proj_gen_p = th2gen.GetYaxis().SetRangeUser(centmin, centmax)
     proj_gen_p = th2gen.ProjectionX('gen')
     proj_reco_p = th2reco.GetYaxis().SetRangeUser(centmin, centmax)
@@ -67,6 +36,51 @@ def compute_eff_vcent(th2gen, th2reco, centmin, centmax):
 
     return h_eff
 
+def compute_slice_checksum(slices, pt_bins):
+    """
+    Checksum of the gen and reco TH2 (pt vs centrality/occupancy) in the selected intervals
+    """
+    arrays = [pt_bins]
+    for th2s, (vmin, vmax) in slices:
+        for th2 in th2s:
+            bin_min, bin_max = get_range_bins(th2.GetYaxis(), vmin, vmax)
+            arrays.append(get_bin_contents(th2)[bin_min:bin_max + 1])
+    return compute_checksum(*arrays)
+
+def get_eff_interval(hists, range_p, range_np, names, cache, key, pt_bins):
+    """
+    Returns prompt and non-prompt efficiencies in a centrality (occupancy) interval
+    and their ratio, taken from the previous output if the input slice is unchanged
+    """
+    gen_p, reco_p, gen_np, reco_np = hists
+    checksum = compute_slice_checksum([((gen_p, reco_p), range_p), ((gen_np, reco_np), range_np)], pt_bins)
+    if cache.is_unchanged(key, checksum):
+        cached = [cache.get(name) for name in names]
+        if all(hist is not None for hist in cached):
+            return cached, True
+
+    name_p, name_np, name_ratio = names
+    h_eff_p = compute_eff_vcent(gen_p, reco_p, *range_p, pt_bins)
+    h_eff_np = compute_eff_vcent(gen_np, reco_np, *range_np, pt_bins)
+    h_eff_p.SetName(name_p)
+    h_eff_np.SetName(name_np)
+    h_eff_ratio = h_eff_np.Clone(name_ratio)
+    if h_eff_p.GetEntries() != 0:
+        h_eff_ratio.Divide(h_eff_p)
+    h_eff_ratio.SetTitle(";#it{p}_{T} (GeV/#it{c});non-prompt / prompt")
+
+    set_style(h_eff_p)
+    set_style(h_eff_np, 'fd')
+    set_style(h_eff_ratio, '')
+
+    return [h_eff_p, h_eff_np, h_eff_ratio], False
+
+def is_plot_needed(pdf_name, unchanged):
+    """
+    A plot is (re)produced if its inputs changed or if it is missing from the output path
+    """
+    return not unchanged or not os.path.isfile(pdf_name)
+
 def set_style(th1, decay='prompt'):
     if decay == 'prompt':
         color = ROOT.kRed+1
@@ -94,11 +108,51 @@ def get_interval_label(index, bins, integrated_label):
         return integrated_label
     return f"{bins[index - 1]}-{bins[index]}%"
 
+def write_qa_summary(outpath, suffix, summary_format, n_events, n_events_gen, species, effs):
+    """
+    Writes the collision reconstruction efficiency and the efficiencies of all species
+    in the QA_summary{suffix} table, effs being a list of
+    (interval variable, intervals, prompt, non-prompt and ratio histograms per species)
+    """
+    if summary_format is None:
+        return
+    summary = QASummary(suffix.lstrip("_"))
+    if n_events_gen > 0:
+        coll_eff = n_events / n_events_gen
+        summary.add_value("collision_reco_eff", coll_eff,
+                          np.sqrt(max(n_events * (1 - coll_eff), 0.)) / n_events_gen)
+    for interval_var, intervals, h_eff_p, h_eff_np, h_eff_r in effs:
+        for spec, hists_p, hists_np, hists_r in zip(species, h_eff_p, h_eff_np, h_eff_r):
+            for (vmin, vmax, _, _), heff_p, heff_np, heff_r in zip(intervals, hists_p, hists_np, hists_r):
+                summary.add_hist("eff_prompt", heff_p, spec["name"], interval_var, (vmin, vmax))
+                summary.add_hist("eff_nonprompt", heff_np, spec["name"], interval_var, (vmin, vmax))
+                summary.add_hist("eff_ratio", heff_r, spec["name"], interval_var, (vmin, vmax))
+    summary.write(os.path.join(outpath, f"QA_summary{suffix}.{summary_format}"), summary_format)
+
 # pylint: disable=too-many-locals,too-many-statements, too-many-branches, no-member
-def perform_qa_mc_val(infile, outpath, suffix, coll_system, coll_ass_tof, event_type, batch):
+def perform_qa_mc_val(infile, outpath, suffix, coll_system, coll_ass_tof, event_type, batch, incremental=False,
+                      config=None, summary_format="json"):
     """
     Method used to perform QA
+
+    With incremental=True, the efficiencies of the species and centrality/occupancy
+    slices whose input histograms are unchanged since the previous run in outpath
+    are taken from the previous QA_output{suffix}.root and not re-plotted
+
+    The species, binnings and outputs are taken from config (see qa_mc_val.yml,
+    used if config is None)
+
+    The efficiencies are also exported in a QA_summary{suffix} table
+    (summary_format json or parquet, None to skip it)
     """
+    if config is None:
+        config = load_qa_config()
+    species = get_species(config)
+    pt_bins = np.array(config["binning"]["pt"], "d")
+    cent_intervals, occ_intervals = get_interval_plan(config, coll_system)
+    plot_full = config["outputs"]["plot_full"]
+    origin_labels = config["origin_labels"]
+
     ROOT.gStyle.SetPadTickX(1)
     ROOT.gStyle.SetPadTickY(1)
     ROOT.gStyle.SetPadLeftMargin(0.15)
@@ -121,12 +175,6 @@ def perform_qa_mc_val(infile, outpath, suffix, coll_system, coll_ass_tof, event_
     if event_type == "c":
         ev_tag = "_charm"
 
-    cent_bins = [0, 10, 20, 30, 40, 50, 60, 70, 80, 90, 100]
-    occ_bins = [0, 2000, 4000, 999999]
-    if coll_system == 'pp':
-        cent_bins = [0, 110] # default value in pp is 105
-        occ_bins = [0, 999999]
-
     ev_tag = ""
     outpath += ev_tag
     task_rec_name = f"hf-task-mc-validation-rec{ev_tag}"
@@ -137,6 +185,8 @@ def perform_qa_mc_val(infile, outpath, suffix, coll_system, coll_ass_tof, event_
     except FileExistsError:
         pass
 
+    cache = QACache(outpath, suffix, incremental)
+
     infile = ROOT.TFile.Open(infile)
     # gen collisions
     n_events_gen = infile.Get(f"{task_gen_name}/hNevGen").GetEntries()
@@ -245,7 +295,7 @@ def perform_qa_mc_val(infile, outpath, suffix, coll_system, coll_ass_tof, event_
     latex.SetNDC()
     latex.SetTextSize(0.04)
     h_abundances_promptmeson.GetYaxis().SetRangeUser(1.e-8, 1.e2)
-    for ipart, part_label in enumerate(decay_labels):
+    for ipart, part_label in enumerate(get_species_labels(config, "meson")):
         h_abundances_promptmeson.GetXaxis().SetBinLabel(ipart+1, part_label)
     h_abundances_promptmeson.GetYaxis().SetDecimals()
     h_abundances_promptmeson.GetXaxis().SetLabelSize(0.04)
@@ -288,7 +338,7 @@ def perform_qa_mc_val(infile, outpath, suffix, coll_system, coll_ass_tof, event_
     canv_abundances_baryons.SetLogy()
     canv_abundances_baryons.SetRightMargin(0.1)
     h_abundances_promptbaryon.GetYaxis().SetRangeUser(1.e-5, 1.e2)
-    for ipart, part_label in enumerate(decay_labels_baryons):
+    for ipart, part_label in enumerate(get_species_labels(config, "baryon")):
         h_abundances_promptbaryon.GetXaxis().SetBinLabel(ipart+1, part_label)
     h_abundances_promptbaryon.GetYaxis().SetDecimals()
     h_abundances_promptbaryon.GetXaxis().SetLabelSize(0.05)
@@ -351,6 +401,7 @@ def perform_qa_mc_val(infile, outpath, suffix, coll_system, coll_ass_tof, event_
     h_declen_gen_prompt, h_declen_gen_nonprompt = [], []
     h_eff_prompt, h_eff_nonprompt, h_eff_ratio = [], [], []
     h_effocc_prompt, h_effocc_nonprompt, h_effocc_ratio = [], [], []
+    eff_cached, effocc_cached = [], []
 
     leg = ROOT.TLegend(0.6, 0.3, 0.9, 0.4)
     leg.SetTextSize(0.045)
@@ -358,8 +409,10 @@ def perform_qa_mc_val(infile, outpath, suffix, coll_system, coll_ass_tof, event_
     leg.SetBorderSize(0)
 
     # loop over particle species
-    for ipart, (part_name, part_label) in enumerate(zip(part_names, part_labels)):
-        if ipart < nmesons:
+    for ipart, spec in enumerate(species):
+        part_name, part_label = spec["name"], spec["label"]
+        iproj = spec["ibin"]
+        if spec["type"] == "meson":
             h_pt_gen_p_hadron = h_pt_gen_prompt_meson_vshad
             h_pt_gen_np_hadron = h_pt_gen_nonprompt_meson_vshad
             h_pt_vcent_gen_p_hadron = h_pt_vcent_gen_prompt_meson_vshad
@@ -370,7 +423,6 @@ def perform_qa_mc_val(infile, outpath, suffix, coll_system, coll_ass_tof, event_
             h_y_gen_np_hadron = h_y_gen_nonprompt_meson_vshad
             h_dl_gen_p_hadron = h_declen_gen_prompt_meson_vshad
             h_dl_gen_np_hadron = h_declen_gen_nonprompt_meson_vshad
-            iproj = ipart + 1
         else:
             h_pt_gen_p_hadron = h_pt_gen_prompt_baryon_vshad
             h_pt_gen_np_hadron = h_pt_gen_nonprompt_baryon_vshad
@@ -382,7 +434,6 @@ def perform_qa_mc_val(infile, outpath, suffix, coll_system, coll_ass_tof, event_
             h_y_gen_np_hadron = h_y_gen_nonprompt_baryon_vshad
             h_dl_gen_p_hadron = h_declen_gen_prompt_baryon_vshad
             h_dl_gen_np_hadron = h_declen_gen_nonprompt_baryon_vshad
-            iproj = ipart + 1 - nmesons
 
         h_pt_gen_prompt.append(h_pt_gen_p_hadron.ProjectionY(
             f"h_pt_gen_prompt{part_name}", iproj, iproj))
@@ -440,6 +491,11 @@ def perform_qa_mc_val(infile, outpath, suffix, coll_system, coll_ass_tof, event_
             leg.AddEntry(h_pt_gen_prompt[ipart], "prompt", "p")
             leg.AddEntry(h_pt_gen_nonprompt[ipart], "non-prompt", "p")
 
+        gen_unchanged = cache.is_unchanged(f"{part_name}/gen", compute_checksum(
+            *(get_bin_contents(hists[ipart]) for hists in (h_pt_gen_prompt, h_pt_gen_nonprompt,
+                                                           h_y_gen_prompt, h_y_gen_nonprompt,
+                                                           h_declen_gen_prompt, h_declen_gen_nonprompt))))
+
         canv_pt = ROOT.TCanvas(f"canv_pt{part_name}", "", 500, 500)
         canv_pt.Divide(3, 2)
         canv_pt.cd().DrawFrame(0.,
@@ -455,7 +511,8 @@ def perform_qa_mc_val(infile, outpath, suffix, coll_system, coll_ass_tof, event_
         leg.Draw()
         canv_pt.Modified()
         canv_pt.Update()
-        if plot_full: canv_pt.SaveAs(os.path.join(outpath, f"{part_name}_ptgen_distr{suffix}.pdf"))
+        pdf_name = os.path.join(outpath, f"{part_name}_ptgen_distr{suffix}.pdf")
+        if plot_full and is_plot_needed(pdf_name, gen_unchanged): canv_pt.SaveAs(pdf_name)
 
         canv_y = ROOT.TCanvas(f"canv_y{part_name}", "", 500, 500)
         canv_y.Divide(3, 2)
@@ -472,7 +529,8 @@ def perform_qa_mc_val(infile, outpath, suffix, coll_system, coll_ass_tof, event_
         leg.Draw()
         canv_y.Modified()
         canv_y.Update()
-        if plot_full: canv_y.SaveAs(os.path.join(outpath, f"{part_name}_ygen_distr{suffix}.pdf"))
+        pdf_name = os.path.join(outpath, f"{part_name}_ygen_distr{suffix}.pdf")
+        if plot_full and is_plot_needed(pdf_name, gen_unchanged): canv_y.SaveAs(pdf_name)
 
         canv_declen = ROOT.TCanvas(f"canv_declen{part_name}", "", 500, 500)
         canv_declen.Divide(3, 2)
@@ -490,7 +548,8 @@ def perform_qa_mc_val(infile, outpath, suffix, coll_system, coll_ass_tof, event_
         leg.Draw()
         canv_declen.Modified()
         canv_declen.Update()
-        if plot_full:  canv_declen.SaveAs(os.path.join(outpath, f"{part_name}_declengen_distr{suffix}.pdf"))
+        pdf_name = os.path.join(outpath, f"{part_name}_declengen_distr{suffix}.pdf")
+        if plot_full and is_plot_needed(pdf_name, gen_unchanged): canv_declen.SaveAs(pdf_name)
 
         h_pt_gen_prompt[ipart] = h_pt_gen_prompt[ipart].Rebin(
             len(pt_bins)-1,
@@ -515,198 +574,120 @@ def perform_qa_mc_val(infile, outpath, suffix, coll_system, coll_ass_tof, event_
         h_effocc_prompt.append([]) # occupancy specific
         h_effocc_nonprompt.append([])
         h_effocc_ratio.append([])
-
-        # in PbPb, efficiency vs centrality
-        if coll_system == 'PbPb':
-            # Centrality study
-            # First entry 0-100% centrality
-            h_eff_prompt[ipart].append(compute_eff_vcent(h_pt_vcent_gen_prompt[part_name],
-                                                  h_pt_vcent_reco_prompt[part_name],
-                                                  0, 100))
-            h_eff_nonprompt[ipart].append(compute_eff_vcent(h_pt_vcent_gen_nonprompt[part_name],
-                                                     h_pt_vcent_reco_nonprompt[part_name],
-                                                     0, 100))
-            h_eff_prompt[ipart][-1].SetName(f"h_eff_prompt{part_name}vcent0_100")
-            h_eff_nonprompt[ipart][-1].SetName(f"h_eff_nonprompt{part_name}vcent0_100")
-            h_eff_ratio[ipart].append(h_eff_nonprompt[ipart][-1].Clone(f"h_eff_ratio{part_name}vcent0_100"))
-            if h_eff_prompt[ipart][-1].GetEntries() != 0:
-                h_eff_ratio[ipart][-1].Divide(h_eff_prompt[ipart][-1])
-            h_eff_ratio[ipart][-1].SetTitle(";#it{p}_{T} (GeV/#it{c});non-prompt / prompt")
-
-            set_style(h_eff_prompt[ipart][-1])
-            set_style(h_eff_nonprompt[ipart][-1], 'fd')
-            set_style(h_eff_ratio[ipart][-1], '')
-
-            for _, (cent_min, cent_max) in enumerate(zip(cent_bins[:-1], cent_bins[1:])):
-                h_eff_prompt[ipart].append(compute_eff_vcent(h_pt_vcent_gen_prompt[part_name],
-                                                      h_pt_vcent_reco_prompt[part_name],
-                                                      cent_min, cent_max))
-                h_eff_nonprompt[ipart].append(compute_eff_vcent(h_pt_vcent_gen_nonprompt[part_name],
-                                                      h_pt_vcent_reco_nonprompt[part_name],
-                                                      cent_min, cent_max))
-                h_eff_prompt[ipart][-1].SetName(f"h_eff_prompt{part_name}vcent{cent_min}_{cent_max}")
-                h_eff_nonprompt[ipart][-1].SetName(f"h_eff_nonprompt{part_name}vcent{cent_min}_{cent_max}")
-                h_eff_ratio[ipart].append(h_eff_nonprompt[ipart][-1].Clone(f"h_eff_ratio{part_name}vcent{cent_min}_{cent_max}"))
-                if h_eff_prompt[ipart][-1].GetEntries() != 0:
-                    h_eff_ratio[ipart][-1].Divide(h_eff_prompt[ipart][-1])
-                h_eff_ratio[ipart][-1].SetTitle(";#it{p}_{T} (GeV/#it{c});non-prompt / prompt")
-
-                set_style(h_eff_prompt[ipart][-1])
-                set_style(h_eff_nonprompt[ipart][-1], 'fd')
-                set_style(h_eff_ratio[ipart][-1], '')
-
-
-            # Occupancy study
-            # First entry occupancy integrated
-            h_effocc_prompt[ipart].append(compute_eff_vcent(h_pt_vocc_gen_prompt[part_name],
-                                                  h_pt_vocc_reco_prompt[part_name],
-                                                  0, 999999))
-            h_effocc_nonprompt[ipart].append(compute_eff_vcent(h_pt_vocc_gen_nonprompt[part_name],
-                                                     h_pt_vocc_reco_nonprompt[part_name],
-                                                     0, 99999))
-            h_effocc_prompt[ipart][-1].SetName(f"h_effocc_prompt{part_name}vocc0_99999")
-            h_effocc_nonprompt[ipart][-1].SetName(f"h_effocc_nonprompt{part_name}vocc0_99999")
-            h_effocc_ratio[ipart].append(h_effocc_nonprompt[ipart][-1].Clone(f"h_effocc_ratio{part_name}vocc0_99999"))
-            if h_effocc_prompt[ipart][-1].GetEntries() != 0:
-                h_effocc_ratio[ipart][-1].Divide(h_effocc_prompt[ipart][-1])
-            h_effocc_ratio[ipart][-1].SetTitle(";#it{p}_{T} (GeV/#it{c});non-prompt / prompt")
-
-            set_style(h_effocc_prompt[ipart][-1])
-            set_style(h_effocc_nonprompt[ipart][-1], 'fd')
-            set_style(h_effocc_ratio[ipart][-1], '')
-
-            for _, (cent_min, cent_max) in enumerate(zip(occ_bins[:-1], occ_bins[1:])):
-                h_effocc_prompt[ipart].append(compute_eff_vcent(h_pt_vocc_gen_prompt[part_name],
-                                                      h_pt_vocc_reco_prompt[part_name],
-                                                      cent_min, cent_max))
-                h_effocc_nonprompt[ipart].append(compute_eff_vcent(h_pt_vocc_gen_nonprompt[part_name],
-                                                      h_pt_vocc_reco_nonprompt[part_name],
-                                                      cent_min, cent_max))
-                h_effocc_prompt[ipart][-1].SetName(f"h_effocc_prompt{part_name}vcent{cent_min}_{cent_max}")
-                h_effocc_nonprompt[ipart][-1].SetName(f"h_effocc_nonprompt{part_name}vcent{cent_min}_{cent_max}")
-                h_effocc_ratio[ipart].append(h_effocc_nonprompt[ipart][-1].Clone(f"h_effocc_ratio{part_name}vcent{cent_min}_{cent_max}"))
-                if h_effocc_prompt[ipart][-1].GetEntries() != 0:
-                    h_effocc_ratio[ipart][-1].Divide(h_effocc_prompt[ipart][-1])
-                h_effocc_ratio[ipart][-1].SetTitle(";#it{p}_{T} (GeV/#it{c});non-prompt / prompt")
-
-                set_style(h_effocc_prompt[ipart][-1])
-                set_style(h_effocc_nonprompt[ipart][-1], 'fd')
-                set_style(h_effocc_ratio[ipart][-1], '')
-
-        # pp
-        else:
-            print("pp analysis")
-            h_eff_prompt[ipart].append(compute_eff_vcent(h_pt_vcent_gen_prompt[part_name],
-                                                  h_pt_vcent_reco_prompt[part_name],
-                                                  0, 110))
-            h_eff_nonprompt[ipart].append(compute_eff_vcent(h_pt_vcent_gen_nonprompt[part_name],
-                                                     h_pt_vcent_reco_nonprompt[part_name],
-                                                     0, 110))
-            h_eff_prompt[ipart][-1].SetName(f"h_eff_prompt{part_name}vcent0_110")
-            h_eff_nonprompt[ipart][-1].SetName(f"h_eff_nonprompt{part_name}vcent0_110")
-            h_eff_ratio[ipart].append(h_eff_nonprompt[ipart][-1].Clone(f"h_eff_ratio{part_name}vcent0_110"))
-            if h_eff_prompt[ipart][-1].GetEntries() != 0:
-                h_eff_ratio[ipart][-1].Divide(h_eff_prompt[ipart][-1])
-            h_eff_ratio[ipart][-1].SetTitle(";#it{p}_{T} (GeV/#it{c});non-prompt / prompt")
-
-            set_style(h_eff_prompt[ipart][-1])
-            set_style(h_eff_nonprompt[ipart][-1], 'fd')
-            set_style(h_eff_ratio[ipart][-1], '')
-
-        if plot[ipart]:
-            # Plot efficency (integrated if pp, vs cent if PbPb)
-            print("Plotting efficiency vs centrality (or integrated if pp)")
-            for ihisto, (heff_p, heff_np, heff_ratio) in enumerate(zip(h_eff_prompt[ipart],
-                                                                       h_eff_nonprompt[ipart],
-                                                                       h_eff_ratio[ipart])):
-
-                if (heff_p.GetEntries() == 0 or heff_np.GetEntries() == 0):
-                    print(f"Skipping {part_name} centrality bin {ihisto} due to empty histogram")
-                    continue
-
-                if ihisto == 0:
-                    cent_min = 0
-                    cent_max = 100
-                else:
-                    cent_min = cent_bins[ihisto-1]
-                    cent_max = cent_bins[ihisto]
-                cent_label = f'_vcent{cent_min}_{cent_max}'
-
-                canv = ROOT.TCanvas(f"c{part_name}{cent_label}", "", 500, 500)
-                canv.cd().SetGridy()
-                canv.cd().SetGridx()
-                canv.cd().DrawFrame(1.e-10,
-                                    max(min(heff_p.GetMinimum(), heff_np.GetMinimum()), 1.e-5) * 0.5,
-                                    pt_bins[-1],
-                                    1.5,
-                                    "Centrality interval ;#it{p}_{T} (GeV/#it{c});"
-                                    f"{part_label} efficiency #times acceptance")
-                canv.cd().SetLogy()
-                heff_p.Draw("same")
-                heff_np.Draw("same")
-                leg.Draw()
-                if coll_system == 'PbPb': latex.DrawLatex(0.2, 0.2, f'Centrality {cent_min} - {cent_max}')
-                canv.Modified()
-                canv.Update()
-                
-                canv.SaveAs(os.path.join(outpath, f"{part_name}_efficiency{cent_label}{suffix}.pdf"))
-                canv_ratio = ROOT.TCanvas(f"cratio{part_name}", "", 500, 500)
-                canv_ratio.Divide(3, 2)
-                canv_ratio.cd().DrawFrame(0., 0.5, pt_bins[-1], 1.5,
-                                          ";#it{p}_{T} (GeV/#it{c});"
-                                          f"{part_label} non-prompt / prompt")
-                heff_ratio.Draw("same")
-                if coll_system == 'PbPb': latex.DrawLatex(0.2, 0.2, f'Centrality {cent_min} - {cent_max}')
-                canv_ratio.Modified()
-                canv_ratio.Update()
-                if plot_full: canv_ratio.SaveAs(os.path.join(outpath, f"{part_name}_efficiency_ratio{cent_label}{suffix}.pdf"))
-
-            if coll_system == 'PbPb':
-                # Plot efficency vs occ (only PbPb)
-                for ihisto, (heff_p, heff_np, heff_ratio) in enumerate(zip(h_effocc_prompt[ipart],
-                                                                           h_effocc_nonprompt[ipart],
-                                                                           h_effocc_ratio[ipart])):
-
-                    if (heff_p.GetEntries() == 0 or heff_np.GetEntries() == 0):
-                        continue
-
-                    print(len(h_effocc_prompt[ipart]))
-                    if ihisto == 0:
-                        occ_min = 0
-                        occ_max = 99999
-                    else:
-                        occ_min = occ_bins[ihisto-1]
-                        occ_max = occ_bins[ihisto]
-                    occ_label = f'_vocc{occ_min}_{occ_max}'
-
-                    canv = ROOT.TCanvas(f"c{part_name}{occ_label}", "", 500, 500)
-                    canv.cd().SetGridy()
-                    canv.cd().SetGridx()
-                    canv.cd().DrawFrame(1.e-10,
-                                        max(min(heff_p.GetMinimum(), heff_np.GetMinimum()), 1.e-5) * 0.5,
-                                        pt_bins[-1],
-                                        1.5,
-                                        "Occupancy interval ;#it{p}_{T} (GeV/#it{c});"
-                                        f"{part_label} efficiency #times acceptance")
-                    canv.cd().SetLogy()
-                    heff_p.Draw("same")
-                    heff_np.Draw("same")
-                    leg.Draw()
-                    if coll_system == 'PbPb': latex.DrawLatex(0.2, 0.2, f'Occupancy {occ_min} - {occ_max}')
-                    canv.Modified()
-                    canv.Update()
-
-                    canv.SaveAs(os.path.join(outpath, f"{part_name}_efficiency{occ_label}{suffix}.pdf"))
-                    canv_ratio = ROOT.TCanvas(f"cratio{part_name}", "", 500, 500)
-                    canv_ratio.Divide(3, 2)
-                    canv_ratio.cd().DrawFrame(0., 0.5, pt_bins[-1], 1.5,
-                                              ";#it{p}_{T} (GeV/#it{c});"
-                                              f"{part_label} non-prompt / prompt")
-                    heff_ratio.Draw("same")
-                    if coll_system == 'PbPb': latex.DrawLatex(0.2, 0.2, f'Occupancy {occ_min} - {occ_max}')
-                    canv_ratio.Modified()
-                    canv_ratio.Update()
-                    if plot_full: canv_ratio.SaveAs(os.path.join(outpath, f"{part_name}_efficiency_ratio{occ_label}{suffix}.pdf"))
+        eff_cached.append([])
+        effocc_cached.append([])
+
+        hists_vcent = (h_pt_vcent_gen_prompt[part_name], h_pt_vcent_reco_prompt[part_name],
+                       h_pt_vcent_gen_nonprompt[part_name], h_pt_vcent_reco_nonprompt[part_name])
+        hists_vocc = (h_pt_vocc_gen_prompt[part_name], h_pt_vocc_reco_prompt[part_name],
+                      h_pt_vocc_gen_nonprompt[part_name], h_pt_vocc_reco_nonprompt[part_name])
+
+        # efficiency vs centrality in PbPb (integrated in pp), first entry integrated
+        for cent_min, cent_max, cent_label, _ in cent_intervals:
+            effs, cached = get_eff_interval(hists_vcent, (cent_min, cent_max), (cent_min, cent_max),
+                                            [f"h_eff_prompt{part_name}{cent_label}",
+                                             f"h_eff_nonprompt{part_name}{cent_label}",
+                                             f"h_eff_ratio{part_name}{cent_label}"],
+                                            cache, f"{part_name}/{cent_label}", pt_bins)
+            h_eff_prompt[ipart].append(effs[0])
+            h_eff_nonprompt[ipart].append(effs[1])
+            h_eff_ratio[ipart].append(effs[2])
+            eff_cached[ipart].append(cached)
+
+        # efficiency vs occupancy (only PbPb), first entry integrated
+        for occ_min, occ_max, occ_label, _ in occ_intervals:
+            effs, cached = get_eff_interval(hists_vocc, (occ_min, occ_max), (occ_min, occ_max),
+                                            [f"h_effocc_prompt{part_name}{occ_label}",
+                                             f"h_effocc_nonprompt{part_name}{occ_label}",
+                                             f"h_effocc_ratio{part_name}{occ_label}"],
+                                            cache, f"{part_name}/occ_{occ_label}", pt_bins)
+            h_effocc_prompt[ipart].append(effs[0])
+            h_effocc_nonprompt[ipart].append(effs[1])
+            h_effocc_ratio[ipart].append(effs[2])
+            effocc_cached[ipart].append(cached)
+
+        # Plot efficency (integrated if pp, vs cent if PbPb)
+        print("Plotting efficiency vs centrality (or integrated if pp)")
+        for ihisto, ((cent_min, cent_max, _, cent_label), heff_p, heff_np, heff_ratio) in enumerate(
+                zip(cent_intervals, h_eff_prompt[ipart], h_eff_nonprompt[ipart], h_eff_ratio[ipart])):
+
+            if (heff_p.GetEntries() == 0 or heff_np.GetEntries() == 0):
+                print(f"Skipping {part_name} centrality bin {ihisto} due to empty histogram")
+                continue
+
+            pdf_name = os.path.join(outpath, f"{part_name}_efficiency{cent_label}{suffix}.pdf")
+            if not is_plot_needed(pdf_name, eff_cached[ipart][ihisto]):
+                print(f"Skipping {part_name} centrality bin {ihisto}, inputs unchanged")
+                continue
+
+            canv = ROOT.TCanvas(f"c{part_name}{cent_label}", "", 500, 500)
+            canv.cd().SetGridy()
+            canv.cd().SetGridx()
+            canv.cd().DrawFrame(1.e-10,
+                                max(min(heff_p.GetMinimum(), heff_np.GetMinimum()), 1.e-5) * 0.5,
+                                pt_bins[-1],
+                                1.5,
+                                "Centrality interval ;#it{p}_{T} (GeV/#it{c});"
+                                f"{part_label} efficiency #times acceptance")
+            canv.cd().SetLogy()
+            heff_p.Draw("same")
+            heff_np.Draw("same")
+            leg.Draw()
+            if coll_system == 'PbPb': latex.DrawLatex(0.2, 0.2, f'Centrality {cent_min} - {cent_max}')
+            canv.Modified()
+            canv.Update()
+
+            canv.SaveAs(pdf_name)
+            canv_ratio = ROOT.TCanvas(f"cratio{part_name}", "", 500, 500)
+            canv_ratio.Divide(3, 2)
+            canv_ratio.cd().DrawFrame(0., 0.5, pt_bins[-1], 1.5,
+                                      ";#it{p}_{T} (GeV/#it{c});"
+                                      f"{part_label} non-prompt / prompt")
+            heff_ratio.Draw("same")
+            if coll_system == 'PbPb': latex.DrawLatex(0.2, 0.2, f'Centrality {cent_min} - {cent_max}')
+            canv_ratio.Modified()
+            canv_ratio.Update()
+            if plot_full: canv_ratio.SaveAs(os.path.join(outpath, f"{part_name}_efficiency_ratio{cent_label}{suffix}.pdf"))
+
+        # Plot efficency vs occ (only PbPb)
+        for ihisto, ((occ_min, occ_max, _, occ_label), heff_p, heff_np, heff_ratio) in enumerate(
+                zip(occ_intervals, h_effocc_prompt[ipart], h_effocc_nonprompt[ipart], h_effocc_ratio[ipart])):
+
+            if (heff_p.GetEntries() == 0 or heff_np.GetEntries() == 0):
+                continue
+
+            pdf_name = os.path.join(outpath, f"{part_name}_efficiency{occ_label}{suffix}.pdf")
+            if not is_plot_needed(pdf_name, effocc_cached[ipart][ihisto]):
+                continue
+
+            canv = ROOT.TCanvas(f"c{part_name}{occ_label}", "", 500, 500)
+            canv.cd().SetGridy()
+            canv.cd().SetGridx()
+            canv.cd().DrawFrame(1.e-10,
+                                max(min(heff_p.GetMinimum(), heff_np.GetMinimum()), 1.e-5) * 0.5,
+                                pt_bins[-1],
+                                1.5,
+                                "Occupancy interval ;#it{p}_{T} (GeV/#it{c});"
+                                f"{part_label} efficiency #times acceptance")
+            canv.cd().SetLogy()
+            heff_p.Draw("same")
+            heff_np.Draw("same")
+            leg.Draw()
+            latex.DrawLatex(0.2, 0.2, f'Occupancy {occ_min} - {occ_max}')
+            canv.Modified()
+            canv.Update()
+
+            canv.SaveAs(pdf_name)
+            canv_ratio = ROOT.TCanvas(f"cratio{part_name}", "", 500, 500)
+            canv_ratio.Divide(3, 2)
+            canv_ratio.cd().DrawFrame(0., 0.5, pt_bins[-1], 1.5,
+                                      ";#it{p}_{T} (GeV/#it{c});"
+                                      f"{part_label} non-prompt / prompt")
+            heff_ratio.Draw("same")
+            latex.DrawLatex(0.2, 0.2, f'Occupancy {occ_min} - {occ_max}')
+            canv_ratio.Modified()
+            canv_ratio.Update()
+            if plot_full: canv_ratio.SaveAs(os.path.join(outpath, f"{part_name}_efficiency_ratio{occ_label}{suffix}.pdf"))
 
     # Add multipad figure for efficiency vs centrality (or integrated if pp)
     # D0, D+, Lc, Xic prompt and non-prompt efficiency and their ratio
@@ -719,10 +700,13 @@ def perform_qa_mc_val(infile, outpath, suffix, coll_system, coll_ass_tof, event_
     )
     summary_canvas.Divide(2, 4)
     ipad = 1
-    for ihisto, (hp, hnp, heff_r) in enumerate(zip(h_eff_prompt, h_eff_nonprompt, h_eff_ratio)):
-        # plot only D0, D+, Lc, Xic
-        if ihisto not in [0, 2, 10, 12]:
+    species_names = [spec["name"] for spec in species]
+    for summary_name in config["outputs"]["summary_species"]:
+        # plot only the selected species (D0, D+, Lc, Xic by default)
+        if summary_name not in species_names:
             continue
+        ihisto = species_names.index(summary_name)
+        hp, hnp, heff_r = h_eff_prompt[ihisto], h_eff_nonprompt[ihisto], h_eff_ratio[ihisto]
         # plot prompt and non-prompt efficiency in the left pad
         summary_canvas.cd(ipad)
         summary_canvas.cd(ipad).SetGridy()
@@ -733,7 +717,7 @@ def perform_qa_mc_val(infile, outpath, suffix, coll_system, coll_ass_tof, event_
                                               pt_bins[-1],
                                               1.5,
                                               "Centrality interval ;#it{p}_{T} (GeV/#it{c});"
-                                              f"{part_labels[ihisto]} efficiency #times acceptance")
+                                              f"{species[ihisto]['label']} efficiency #times acceptance")
         hp[0].Draw("same")
         hnp[0].Draw("same")
         # plot ratio in the right pad
@@ -745,12 +729,12 @@ def perform_qa_mc_val(infile, outpath, suffix, coll_system, coll_ass_tof, event_
     summary_canvas.Update()
     summary_canvas.SaveAs(os.path.join(outpath, f"efficiency_summary{suffix}.pdf"))
 
-    h_ass, h_nonass, h_assgood, h_assgood_amb, \
+    h_ass, h_nonass, h_assgood, \
         h_eff_ass, h_eff_assgood, h_eff_assgood_wamb = (
-            [] for _ in range(7))
-    h_ass_eta, h_nonass_eta, h_assgood_eta, h_assgood_amb_eta, \
+            [] for _ in range(6))
+    h_ass_eta, h_nonass_eta, h_assgood_eta, \
         h_eff_ass_eta, h_eff_assgood_eta, h_eff_assgood_wamb_eta = (
-            [] for _ in range(7))
+            [] for _ in range(6))
     h_zvtx_goodass = []
 
     track_to_coll_path = 'TrackToCollChecks'
@@ -805,138 +789,81 @@ def perform_qa_mc_val(infile, outpath, suffix, coll_system, coll_ass_tof, event_
     delta_zvtx_max = 10.
 
     colors = [ROOT.kGray+1, ROOT.kGreen+2, ROOT.kRed+1, ROOT.kAzure+4]
-    for iorigin, origin_label in enumerate(origin_labels):
-        bin_zvtx_min = h_coll_assogood.GetAxis(
-            3).FindBin(-delta_zvtx_max*0.999)
-        bin_zvtx_max = h_coll_assogood.GetAxis(
-            3).FindBin(delta_zvtx_max*0.999)
-        h_coll_asso.GetAxis(0).SetRange(iorigin+1, iorigin+1)
-        h_coll_not_asso.GetAxis(0).SetRange(iorigin+1, iorigin+1)
-        h_coll_assogood.GetAxis(0).SetRange(iorigin+1, iorigin+1)
-        h_coll_assogood_ambiguous.GetAxis(0).SetRange(iorigin+1, iorigin+1)
+    # project each THnSparse once on (origin, pT), (origin, eta) and (origin, Zvtx residual)
+    # and compute the efficiencies of all the origins in one go
+    # no origins requested: the association sparses are not projected
+    if origin_labels:
         if coll_ass_tof:
-            h_coll_asso.GetAxis(5).SetRange(2, 2)
-            h_coll_not_asso.GetAxis(5).SetRange(2, 2)
-            h_coll_assogood.GetAxis(5).SetRange(2, 2)
-            h_coll_assogood_ambiguous.GetAxis(5).SetRange(2, 2)
+            for hsparse in [h_coll_asso, h_coll_not_asso, h_coll_assogood, h_coll_assogood_ambiguous]:
+                hsparse.GetAxis(5).SetRange(2, 2)
+        bin_zvtx_min = h_coll_assogood.GetAxis(3).FindBin(-delta_zvtx_max*0.999)
+        bin_zvtx_max = h_coll_assogood.GetAxis(3).FindBin(delta_zvtx_max*0.999)
         h_coll_assogood.GetAxis(3).SetRange(bin_zvtx_min, bin_zvtx_max)
-        h_ass.append(h_coll_asso.Projection(1))
-        h_nonass.append(h_coll_not_asso.Projection(1))
-        h_assgood.append(h_coll_assogood.Projection(1))
-        h_assgood_amb.append(h_coll_assogood_ambiguous.Projection(1))
-        h_nonass[iorigin].Sumw2()
-        h_ass[iorigin].Sumw2()
-        h_assgood[iorigin].Sumw2()
-        h_assgood_amb[iorigin].Sumw2()
-        h_assgood_amb[iorigin].Add(h_assgood[iorigin])
-        h_nonass[iorigin].SetName(f"h_nonass_{origin_label}")
-        h_ass[iorigin].SetName(f"h_ass_{origin_label}")
-        h_assgood[iorigin].SetName(f"h_assgood_{origin_label}")
-        h_assgood_amb[iorigin].SetName(f"h_assgood_amb_{origin_label}")
-        h_nonass[iorigin].SetLineColor(colors[iorigin])
-        h_ass[iorigin].SetLineColor(colors[iorigin])
-        h_assgood[iorigin].SetLineColor(colors[iorigin])
-        h_assgood_amb[iorigin].SetLineColor(colors[iorigin])
-        h_nonass[iorigin].SetMarkerColor(colors[iorigin])
-        h_ass[iorigin].SetMarkerColor(colors[iorigin])
-        h_assgood[iorigin].SetMarkerColor(colors[iorigin])
-        h_assgood_amb[iorigin].SetMarkerColor(colors[iorigin])
-        h_nonass[iorigin].SetMarkerStyle(ROOT.kFullCircle)
-        h_ass[iorigin].SetMarkerStyle(ROOT.kFullCircle)
-        h_assgood[iorigin].SetMarkerStyle(ROOT.kFullCircle)
-        h_assgood_amb[iorigin].SetMarkerStyle(ROOT.kOpenCircle)
-        h_nonass[iorigin].SetLineWidth(2)
-        h_ass[iorigin].SetLineWidth(2)
-        h_assgood[iorigin].SetLineWidth(2)
-        h_assgood_amb[iorigin].SetLineWidth(2)
-        h_eff_ass.append(h_nonass[iorigin].Clone(
-            f"h_eff_ass_{origin_label}"))
-        h_eff_ass[iorigin].Divide(
-            h_nonass[iorigin], h_ass[iorigin], 1., 1.)
-        h_eff_assgood.append(h_assgood[iorigin].Clone(
-            f"h_eff_assgood_{origin_label}"))
-        h_eff_assgood[iorigin].Divide(
-            h_assgood[iorigin], h_ass[iorigin], 1., 1., "B")
-        h_eff_assgood_wamb.append(h_assgood_amb[iorigin].Clone(
-            f"h_eff_assgood_wamb_{origin_label}"))
-        h_eff_assgood_wamb[iorigin].Divide(
-            h_assgood_amb[iorigin], h_ass[iorigin], 1., 1., "B")
-
-        canv_coll_association.cd().SetLogy()
-        h_eff_ass[iorigin].Draw("esame")
-        leg_orig.AddEntry(h_eff_ass[iorigin], origin_label, "pl")
-
-        canv_coll_association_good.cd()
-        h_eff_assgood[iorigin].Draw("esame")
-        h_eff_assgood_wamb[iorigin].Draw("esame")
-        if iorigin != 0:
-            leg_orig_wofake.AddEntry(h_eff_ass[iorigin], origin_label, "pl")
-
-        h_ass_eta.append(h_coll_asso.Projection(2))
-        h_nonass_eta.append(h_coll_not_asso.Projection(2))
-        h_assgood_eta.append(h_coll_assogood.Projection(2))
-        h_assgood_amb_eta.append(h_coll_assogood_ambiguous.Projection(2))
-        h_nonass_eta[iorigin].Sumw2()
-        h_ass_eta[iorigin].Sumw2()
-        h_assgood_eta[iorigin].Sumw2()
-        h_assgood_amb_eta[iorigin].Sumw2()
-        h_assgood_amb_eta[iorigin].Add(h_assgood_eta[iorigin])
-        h_nonass_eta[iorigin].SetName(f"h_nonass_eta_{origin_label}")
-        h_ass_eta[iorigin].SetName(f"h_ass_eta_{origin_label}")
-        h_assgood_eta[iorigin].SetName(f"h_assgood_eta_{origin_label}")
-        h_assgood_amb_eta[iorigin].SetName(
-            f"h_assgood_amb_eta_{origin_label}")
-        h_nonass_eta[iorigin].SetLineColor(colors[iorigin])
-        h_ass_eta[iorigin].SetLineColor(colors[iorigin])
-        h_assgood_eta[iorigin].SetLineColor(colors[iorigin])
-        h_assgood_amb_eta[iorigin].SetLineColor(colors[iorigin])
-        h_nonass_eta[iorigin].SetMarkerColor(colors[iorigin])
-        h_ass_eta[iorigin].SetMarkerColor(colors[iorigin])
-        h_assgood_eta[iorigin].SetMarkerColor(colors[iorigin])
-        h_assgood_amb_eta[iorigin].SetMarkerColor(colors[iorigin])
-        h_nonass_eta[iorigin].SetMarkerStyle(ROOT.kFullCircle)
-        h_ass_eta[iorigin].SetMarkerStyle(ROOT.kFullCircle)
-        h_assgood_eta[iorigin].SetMarkerStyle(ROOT.kFullCircle)
-        h_assgood_amb_eta[iorigin].SetMarkerStyle(ROOT.kOpenCircle)
-        h_nonass_eta[iorigin].SetLineWidth(2)
-        h_ass_eta[iorigin].SetLineWidth(2)
-        h_assgood_eta[iorigin].SetLineWidth(2)
-        h_assgood_amb_eta[iorigin].SetLineWidth(2)
-        h_eff_ass_eta.append(h_nonass_eta[iorigin].Clone(
-            f"h_eff_ass_eta_{origin_label}"))
-        h_eff_ass_eta[iorigin].Divide(
-            h_nonass_eta[iorigin], h_ass_eta[iorigin], 1., 1.)
-        h_eff_assgood_eta.append(h_assgood_eta[iorigin].Clone(
-            f"h_eff_assgood_eta_{origin_label}"))
-        h_eff_assgood_eta[iorigin].Divide(
-            h_assgood_eta[iorigin], h_ass_eta[iorigin], 1., 1., "B")
-        h_eff_assgood_wamb_eta.append(h_assgood_amb_eta[iorigin].Clone(
-            f"h_eff_assgood_eta_{origin_label}"))
-        h_eff_assgood_wamb_eta[iorigin].Divide(
-            h_assgood_amb_eta[iorigin], h_ass_eta[iorigin], 1., 1., "B")
-
-        canv_coll_association_eta.cd().SetLogy()
-        h_eff_ass_eta[iorigin].Draw("esame")
-
-        canv_coll_association_good_eta.cd()
-        h_eff_assgood_eta[iorigin].Draw("esame")
-        h_eff_assgood_wamb_eta[iorigin].Draw("esame")
-
-        h_zvtx_goodass.append(h_coll_assogood.Projection(3))
-
-        canv_zvtx.cd()
-        h_zvtx_goodass[iorigin].SetNameTitle(
-            f"h_zvtx_goodass_{origin_label}",
-            ";#it{Z}_{vtx}^{ reco} - #it{Z}_{vtx}^{ gen} (cm);entries"
-        )
-        h_zvtx_goodass[iorigin].SetLineWidth(2)
-        h_zvtx_goodass[iorigin].SetLineColor(colors[iorigin])
-        h_zvtx_goodass[iorigin].SetNdivisions(505)
-        if iorigin > 0:
-            drawopt = "hist"
-            if iorigin > 1:
-                drawopt = "histsame"
-            h_zvtx_goodass[iorigin].Draw(drawopt)
+
+        for var_axis, var_tag, h_ass_var, h_nonass_var, h_assgood_var, h_eff_ass_var, \
+                h_eff_assgood_var, h_eff_assgood_wamb_var in zip(
+                    [1, 2], ["", "_eta"], [h_ass, h_ass_eta], [h_nonass, h_nonass_eta],
+                    [h_assgood, h_assgood_eta], [h_eff_ass, h_eff_ass_eta],
+                    [h_eff_assgood, h_eff_assgood_eta], [h_eff_assgood_wamb, h_eff_assgood_wamb_eta]):
+            proj, ass, ass_err2 = get_thn_projection(h_coll_asso, (0, var_axis))
+            _, nonass, nonass_err2 = get_thn_projection(h_coll_not_asso, (0, var_axis))
+            _, assgood, assgood_err2 = get_thn_projection(h_coll_assogood, (0, var_axis))
+            _, assgood_amb, assgood_amb_err2 = get_thn_projection(h_coll_assogood_ambiguous, (0, var_axis))
+            assgood_amb += assgood
+            assgood_amb_err2 += assgood_err2
+            eff_ass, eff_ass_err2 = divide(nonass, ass, nonass_err2, ass_err2)
+            eff_assgood, eff_assgood_err2 = divide(assgood, ass, assgood_err2, ass_err2, binomial=True)
+            eff_assgood_wamb, eff_assgood_wamb_err2 = divide(
+                assgood_amb, ass, assgood_amb_err2, ass_err2, binomial=True)
+
+            var_axis_proj = proj.GetYaxis()
+            for iorigin, origin_label in enumerate(origin_labels):
+                ibin = iorigin + 1
+                for hist_list, name, cont, err2, marker in zip(
+                        [h_ass_var, h_nonass_var, h_assgood_var,
+                         h_eff_ass_var, h_eff_assgood_var, h_eff_assgood_wamb_var],
+                        ["h_ass", "h_nonass", "h_assgood",
+                         "h_eff_ass", "h_eff_assgood", "h_eff_assgood_wamb"],
+                        [ass, nonass, assgood, eff_ass, eff_assgood, eff_assgood_wamb],
+                        [ass_err2, nonass_err2, assgood_err2,
+                         eff_ass_err2, eff_assgood_err2, eff_assgood_wamb_err2],
+                        [ROOT.kFullCircle] * 5 + [ROOT.kOpenCircle]):
+                    hist_list.append(th1_from_axis(f"{name}{var_tag}_{origin_label}", "",
+                                                   var_axis_proj, cont[ibin], err2[ibin]))
+                    set_summary_style(hist_list[-1], colors[iorigin], marker)
+
+        proj_zvtx, zvtx_goodass, zvtx_goodass_err2 = get_thn_projection(h_coll_assogood, (0, 3))
+        for iorigin, origin_label in enumerate(origin_labels):
+            canv_coll_association.cd().SetLogy()
+            h_eff_ass[iorigin].Draw("esame")
+            leg_orig.AddEntry(h_eff_ass[iorigin], origin_label, "pl")
+
+            canv_coll_association_good.cd()
+            h_eff_assgood[iorigin].Draw("esame")
+            h_eff_assgood_wamb[iorigin].Draw("esame")
+            if iorigin != 0:
+                leg_orig_wofake.AddEntry(h_eff_ass[iorigin], origin_label, "pl")
+
+            canv_coll_association_eta.cd().SetLogy()
+            h_eff_ass_eta[iorigin].Draw("esame")
+
+            canv_coll_association_good_eta.cd()
+            h_eff_assgood_eta[iorigin].Draw("esame")
+            h_eff_assgood_wamb_eta[iorigin].Draw("esame")
+
+            canv_zvtx.cd()
+            h_zvtx_goodass.append(th1_from_axis(
+                f"h_zvtx_goodass_{origin_label}",
+                ";#it{Z}_{vtx}^{ reco} - #it{Z}_{vtx}^{ gen} (cm);entries",
+                proj_zvtx.GetYaxis(), zvtx_goodass[iorigin+1], zvtx_goodass_err2[iorigin+1]))
+            h_zvtx_goodass[iorigin].SetLineWidth(2)
+            h_zvtx_goodass[iorigin].SetLineColor(colors[iorigin])
+            h_zvtx_goodass[iorigin].SetNdivisions(505)
+            if iorigin > 0:
+                drawopt = "hist"
+                if iorigin > 1:
+                    drawopt = "histsame"
+                h_zvtx_goodass[iorigin].Draw(drawopt)
 
     canv_coll_association.cd()
     leg_orig.Draw()
@@ -968,26 +895,20 @@ def perform_qa_mc_val(infile, outpath, suffix, coll_system, coll_ass_tof, event_
     canv_fracanv_amb = ROOT.TCanvas("canv_fracanv_amb", "", 800, 800)
     canv_fracanv_amb.DrawFrame(
         0., 0., 10., 1., ";#it{p}_{T} (GeV/#it{c});fraction of ambiguous tracks")
-    h_tr_per_origin, h_ambtr_per_origin, h_fracanv_amb_per_origin = [], [], []
+    h_fracanv_amb_per_origin = []
     h_tr = infile.Get(f"{task_rec_name}/histTracks")
     h_ambtr = infile.Get(f"{task_rec_name}/{track_to_coll_path}/histAmbiguousTracks")
-    for iorigin, origin_label in enumerate(origin_labels[1:]):
-        h_tr_per_origin.append(h_tr.ProjectionY(
-            f"h_tr_per_origin_{origin_label}", iorigin+2, iorigin+2))
-        h_ambtr_per_origin.append(h_ambtr.ProjectionY(
-            f"h_ambtr_per_origin_{origin_label}", iorigin+2, iorigin+2))
-        h_tr_per_origin[iorigin].Sumw2()
-        h_ambtr_per_origin[iorigin].Sumw2()
-        h_fracanv_amb_per_origin.append(
-            h_ambtr_per_origin[iorigin].Clone(f"h_fracanv_amb_per_origin_{origin_label}"))
-        h_fracanv_amb_per_origin[iorigin].Divide(
-            h_ambtr_per_origin[iorigin], h_tr_per_origin[iorigin], 1., 1., "B")
-        h_fracanv_amb_per_origin[iorigin].SetLineColor(colors[iorigin+1])
-        h_fracanv_amb_per_origin[iorigin].SetMarkerColor(colors[iorigin+1])
-        h_fracanv_amb_per_origin[iorigin].SetMarkerStyle(ROOT.kFullCircle)
-        h_fracanv_amb_per_origin[iorigin].SetLineWidth(2)
-        canv_fracanv_amb.cd()
-        h_fracanv_amb_per_origin[iorigin].Draw("same")
+    # origin on the x axis, pT on the y axis (only for the origins after the first one)
+    if len(origin_labels) > 1:
+        frac_amb, frac_amb_err2 = divide(get_bin_contents(h_ambtr).T, get_bin_contents(h_tr).T,
+                                         get_bin_errors2(h_ambtr).T, get_bin_errors2(h_tr).T, binomial=True)
+        for iorigin, origin_label in enumerate(origin_labels[1:]):
+            h_fracanv_amb_per_origin.append(th1_from_axis(
+                f"h_fracanv_amb_per_origin_{origin_label}", "", h_ambtr.GetYaxis(),
+                frac_amb[iorigin+2], frac_amb_err2[iorigin+2]))
+            set_summary_style(h_fracanv_amb_per_origin[iorigin], colors[iorigin+1], ROOT.kFullCircle)
+            canv_fracanv_amb.cd()
+            h_fracanv_amb_per_origin[iorigin].Draw("same")
     canv_fracanv_amb.cd()
     leg_orig_wofake.Draw()
     if plot_full:
@@ -1236,6 +1157,128 @@ def perform_qa_mc_val(infile, outpath, suffix, coll_system, coll_ass_tof, event_
     for hist in h_eff_assgood_eta:
         hist.Write()
     output.Close()
+    cache.save()
+
+    write_qa_summary(outpath, suffix, summary_format, n_events, n_events_gen, species,
+                     [("centrality", cent_intervals, h_eff_prompt, h_eff_nonprompt, h_eff_ratio),
+                      ("occupancy", occ_intervals, h_effocc_prompt, h_effocc_nonprompt, h_effocc_ratio)])
+
+    print(" ")
+    print("Finshed!")
+
+
+# pylint: disable=too-many-locals, no-member
+def perform_qa_mc_val_pp(infile, outpath, suffix, config=None, summary_format="json"):
+    """
+    Fast QA for pp: integrated efficiencies of all species computed in one pass
+    from the bin contents, writing only the objects used by compare_qa_mc_val.py
+    (no canvases, no track-to-collision association studies) and the QA summary
+    """
+    if config is None:
+        config = load_qa_config()
+    species = get_species(config)
+    pt_bins = np.array(config["binning"]["pt"], "d")
+    cent_min, cent_max, cent_label, _ = get_interval_plan(config, "pp")[0][0]
+
+    task_rec_name = "hf-task-mc-validation-rec"
+    task_gen_name = "hf-task-mc-validation-gen"
+    os.makedirs(outpath, exist_ok=True)
+
+    infile = ROOT.TFile.Open(infile)
+    n_events_gen = infile.Get(f"{task_gen_name}/hNevGen").GetEntries()
+    n_events = infile.Get(f"{task_rec_name}/histXvtxReco").GetEntries()
+    if n_events == 0:
+        n_events = 1
+
+    h_collisions = ROOT.TH1F("h_collisions", ";;counts", 2, 0.5, 2.5)
+    h_collisions.SetDirectory(0)
+    h_collisions.GetXaxis().SetBinLabel(1, "generated collisions")
+    h_collisions.GetXaxis().SetBinLabel(2, "reconstructed collisions")
+    h_collisions.SetBinContent(1, n_events_gen)
+    h_collisions.SetBinContent(2, n_events)
+
+    gen_distr = []
+    for hist_name in ["histXvtxReco", "histYvtxReco", "histDeltaZvtx"]:
+        gen_distr.append(infile.Get(f"{task_rec_name}/{hist_name}"))
+        gen_distr[-1].SetDirectory(0)
+    gen_distr.append(gen_distr[-1].ProjectionY("histDeltaZvtxProj"))
+    gen_distr[-1].SetDirectory(0)
+    for hist in gen_distr:
+        set_style(hist)
+
+    h_eff = []
+    for spec_type, gen_dir, gen_tag in [("meson", "CharmMesons", "Mesons"), ("baryon", "CharmBaryons", "Baryons")]:
+        species_type = [spec for spec in species if spec["type"] == spec_type]
+        rows = [spec["ibin"] for spec in species_type]
+
+        for origin, origin_tag in [("prompt", "Prompt"), ("nonprompt", "NonPrompt")]:
+            gen_path = f"{task_gen_name}/{origin_tag}{gen_dir}/h{origin_tag}{gen_tag}"
+            h_abundances = infile.Get(f"{gen_path}PtDistr").ProjectionX(f"h_abundances_{origin}{spec_type}")
+            h_abundances.SetDirectory(0)
+            h_abundances.Scale(1. / n_events)
+            gen_distr.append(h_abundances)
+            if not species_type:
+                continue
+
+            # generated distributions vs species (x axis) for all the species at once
+            for var, var_tag in [("Pt", "pt"), ("Y", "y"), ("DecLen", "declenen")]:
+                h_gen = infile.Get(f"{gen_path}{var}Distr")
+                contents, errors2 = get_bin_contents(h_gen).T[rows], get_bin_errors2(h_gen).T[rows]
+                for spec, cont, err2 in zip(species_type, contents, errors2):
+                    name = f"h_{var_tag}_gen_{origin}{spec['name']}"
+                    if var == "Pt":
+                        gen_distr.append(th1_from_arrays(name, "", pt_bins,
+                                                         rebin(cont, h_gen.GetYaxis(), pt_bins)[1:-1],
+                                                         rebin(err2, h_gen.GetYaxis(), pt_bins)[1:-1]))
+                    else:
+                        gen_distr.append(th1_from_axis(name, "", h_gen.GetYaxis(), cont, err2))
+                    set_style(gen_distr[-1], "prompt" if origin == "prompt" else "fd")
+
+            # generated (species, pT, centrality) and reconstructed (pT, centrality) in the centrality interval
+            h_gen = infile.Get(f"{gen_path}PtCentDistr")
+            bin_min, bin_max = get_range_bins(h_gen.GetZaxis(), cent_min, cent_max)
+            gen = get_bin_contents(h_gen).T[rows, :, bin_min:bin_max + 1].sum(axis=2)
+            gen_err2 = get_bin_errors2(h_gen).T[rows, :, bin_min:bin_max + 1].sum(axis=2)
+            gen, gen_err2 = rebin(gen, h_gen.GetYaxis(), pt_bins), rebin(gen_err2, h_gen.GetYaxis(), pt_bins)
+            reco, reco_err2 = [], []
+            for spec in species_type:
+                h_reco = infile.Get(f"{task_rec_name}/{spec['name']}/histPtCentReco{origin_tag}")
+                bin_min, bin_max = get_range_bins(h_reco.GetYaxis(), cent_min, cent_max)
+                reco.append(rebin(get_bin_contents(h_reco).T[:, bin_min:bin_max + 1].sum(axis=1),
+                                  h_reco.GetXaxis(), pt_bins))
+                reco_err2.append(rebin(get_bin_errors2(h_reco).T[:, bin_min:bin_max + 1].sum(axis=1),
+                                       h_reco.GetXaxis(), pt_bins))
+            h_eff.append((species_type, origin, *divide(np.array(reco), gen, np.array(reco_err2), gen_err2,
+                                                        binomial=True)))
+
+    # prompt and non-prompt efficiencies of the same species type are consecutive
+    h_eff_out, h_eff_species = [], {}
+    for (species_type, _, eff_p, eff_p_err2), (_, _, eff_np, eff_np_err2) in zip(h_eff[::2], h_eff[1::2]):
+        ratio, ratio_err2 = divide(eff_np, eff_p, eff_np_err2, eff_p_err2)
+        for ispec, spec in enumerate(species_type):
+            h_eff_species[spec["name"]] = []
+            for origin, style, cont, err2 in [("prompt", "prompt", eff_p, eff_p_err2),
+                                              ("nonprompt", "fd", eff_np, eff_np_err2),
+                                              ("ratio", "", ratio, ratio_err2)]:
+                h_eff_out.append(th1_from_arrays(f"h_eff_{origin}{spec['name']}{cent_label}",
+                                                 ";#it{p}_{T} (GeV/#it{c});" + (
+                                                     "non-prompt / prompt" if origin == "ratio"
+                                                     else "efficiency #times acceptance"),
+                                                 pt_bins, cont[ispec][1:-1], err2[ispec][1:-1]))
+                set_style(h_eff_out[-1], style)
+                h_eff_species[spec["name"]].append([h_eff_out[-1]])
+    infile.Close()
+
+    output = ROOT.TFile(os.path.join(outpath, f"QA_output{suffix}.root"), "recreate")
+    for dir_name, hists in [("gen-distr", gen_distr), ("efficiencies", h_eff_out), ("pv", [h_collisions])]:
+        output.mkdir(dir_name).cd()
+        for hist in hists:
+            hist.Write()
+    output.Close()
+
+    write_qa_summary(outpath, suffix, summary_format, n_events, n_events_gen, species,
+                     [("centrality", [(cent_min, cent_max, cent_label, "")],
+                       *zip(*(h_eff_species[spec["name"]] for spec in species)))])
 
     print(" ")
     print("Finshed!")
@@ -1254,6 +1297,26 @@ if __name__ == "__main__":
     parser.add_argument("--eventType", "-e", choices=["all", "mb", "b", "c"], metavar="text", default="all",
                         help="kind of events to keep, using generator information")
     parser.add_argument("--batch", help="suppress video output", action="store_true")
+    parser.add_argument("--incremental", action="store_true", default=False,
+                        help="recompute only the slices whose input histograms changed since the previous run")
+    parser.add_argument("--config", "-c", metavar="text", default=None,
+                        help="YAML/JSON file with species, binning and outputs (default: qa_mc_val.yml)")
+    parser.add_argument("--fast", action="store_true", default=False,
+                        help="pp only: compute only the integrated efficiencies and the inputs of compare_qa_mc_val.py")
+    parser.add_argument("--summary", choices=SUMMARY_FORMATS + ["none"], default="json",
+                        help="format of the QA_summary table with all the efficiencies (none to skip it)")
     args = parser.parse_args()
+    if args.fast and args.coll_system != "pp":
+        parser.error("--fast is only available for pp")
+    if args.fast and (args.incremental or args.eventType != "all" or args.collassTOF or args.batch):
+        parser.error("--fast cannot be combined with --incremental, --eventType, --collassTOF or --batch")
+    summary_fmt = None if args.summary == "none" else args.summary
+
+    # validate the configuration before opening any input
+    qa_config = load_qa_config(args.config)
 
-    perform_qa_mc_val(args.infile, args.outpath, args.suffix, args.coll_system, args.collassTOF, args.eventType, args.batch)
\ No newline at end of file
+    if args.fast:
+        perform_qa_mc_val_pp(args.infile, args.outpath, args.suffix, qa_config, summary_fmt)
+    else:
+        perform_qa_mc_val(args.infile, args.outpath, args.suffix, args.coll_system, args.collassTOF, args.eventType,
+                          args.batch, args.incremental, qa_config, summary_fmt)
\ No newline at end of file
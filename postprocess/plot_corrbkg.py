@@ -1,26 +1,204 @@
 #!/usr/bin/env python3
+import os
+import json
+import argparse
+import multiprocessing
+import numpy as np
 import ROOT
+from hist_utils import set_bin_contents
+from input_merge import get_inputs_checksum
 
-# Input file and tree
-root_file = "/alice/cern.ch/user/a/alihyperloop/outputs/0069/691495/251360"
-tree_name = "DF_2298103924494048/O2hfcanddplite"
-outlabel = "24h1d"
-do_download = True
-
-if do_download:
-    import os
-    if not os.path.isfile(root_file):
-        print(f"File {root_file} not found locally. Downloading from MonALISA...")
-        os.system(f"alien_cp alien:{root_file}/AO2D.root file:./AO2D_corrbkg_{outlabel}.root")
-        root_file = f"AO2D_corrbkg_{outlabel}.root"
+MASS_BINS = (200, 1.6, 2.2) # number of bins, min, max
+TREE_NAME = "O2hfcanddplite"
+COLUMNS = ["fM", "fPt", "fFlagMcMatchRec", "fFlagMcDecayChanRec"]
+
+
+def read_candidates(tree, columns=COLUMNS):
+    """
+    Reads the columns of the candidate tree as NumPy arrays with a single pass (RDataFrame)
+    """
+    return {col: np.asarray(values) for col, values in ROOT.RDataFrame(tree).AsNumpy(columns).items()}
+
+
+def get_mass_bins(mass, mass_bins=MASS_BINS):
+    """
+    Bin of each mass value as TAxis::FindFixBin with fixed bins (0 underflow, number of bins + 1 overflow)
+    """
+    n_bins, mass_min, mass_max = mass_bins
+    mass = np.asarray(mass, dtype=np.float64)
+    bins = np.floor(n_bins * (mass - mass_min) / (mass_max - mass_min)).astype(np.int64) + 1
+    return np.clip(bins, 0, n_bins + 1)
+
+
+def select_pt(candidates, pt_range=None):
+    """
+    Candidates with pt_min <= fPt < pt_max for pt_range = (pt_min, pt_max), all the candidates if None
+    """
+    if pt_range is None:
+        return candidates
+    sel = (candidates["fPt"] >= pt_range[0]) & (candidates["fPt"] < pt_range[1])
+    return {col: values[sel] for col, values in candidates.items()}
+
+
+def fill_channel_counts(candidates, n_channels, n_reso, mass_bins=MASS_BINS, pt_edges=None):
+    """
+    Mass distributions of the candidates with fFlagMcMatchRec == channel and fFlagMcDecayChanRec == resonant
+    channel for all the channels at once, with a bincount grouped by (channel, resonant channel, mass bin).
+    If pt_edges are set, the distributions are also split in the pt intervals (pt_min <= fPt < pt_max)
+    and the candidates outside pt_edges are discarded
+
+    Returns:
+        - counts with shape (n_channels, n_reso, number of mass bins + 2), or (n_channels, n_reso,
+          number of pt bins, number of mass bins + 2) with pt_edges, including mass under- and overflow bins
+    """
+    flag_match, flag_reso = candidates["fFlagMcMatchRec"], candidates["fFlagMcDecayChanRec"]
+    n_mass = mass_bins[0] + 2
+    sel = (flag_match >= 0) & (flag_match < n_channels) & (flag_reso >= 0) & (flag_reso < n_reso)
+    shape = (n_channels, n_reso, n_mass)
+    n_pt, pt_bins = 1, 0
+    if pt_edges is not None:
+        n_pt = len(pt_edges) - 1
+        pt_bins = np.searchsorted(pt_edges, candidates["fPt"], side="right") - 1
+        sel &= (pt_bins >= 0) & (pt_bins < n_pt)
+        pt_bins = pt_bins[sel]
+        shape = (n_channels, n_reso, n_pt, n_mass)
+    group = flag_match[sel].astype(np.int64) * n_reso + flag_reso[sel]
+    index = (group * n_pt + pt_bins) * n_mass + get_mass_bins(candidates["fM"][sel], mass_bins)
+    counts = np.bincount(index, minlength=n_channels * n_reso * n_pt * n_mass)
+    return counts.reshape(shape).astype(np.float64)
+
+
+def fill_integrated_counts(candidates, mass_bins=MASS_BINS):
+    """
+    Mass distribution of all the matched candidates (fFlagMcMatchRec > 0), including under- and overflow bins
+    """
+    sel = candidates["fFlagMcMatchRec"] > 0
+    counts = np.bincount(get_mass_bins(candidates["fM"][sel], mass_bins), minlength=mass_bins[0] + 2)
+    return counts.astype(np.float64)
+
+
+def get_tree_paths(file_name, tree_name=TREE_NAME):
+    """
+    Paths of the tree tree_name in all the DF_* directories of an AO2D file
+    """
+    infile = ROOT.TFile.Open(file_name)
+    if not infile or not infile.IsOpen():
+        raise IOError(f"Could not open file {file_name}.")
+    paths = [f"{key.GetName()}/{tree_name}" for key in infile.GetListOfKeys()
+             if key.GetName().startswith("DF_") and infile.Get(f"{key.GetName()}/{tree_name}")]
+    infile.Close()
+    return paths
+
+
+def get_tree_jobs(file_names, tree_name=TREE_NAME):
+    """
+    Pairs (file name, tree path) of the trees of all the DF_* directories of the input files
+    """
+    jobs = [(file_name, tree_path) for file_name in file_names for tree_path in get_tree_paths(file_name, tree_name)]
+    if not jobs:
+        raise RuntimeError(f"Tree {tree_name} not found in any DF_* directory of the input files")
+    return jobs
+
+
+def read_tree(job):
+    """
+    Opens a tree of an AO2D file and reads its COLUMNS (see read_candidates)
+    """
+    file_name, tree_path = job
+    infile = ROOT.TFile.Open(file_name)
+    tree = infile.Get(tree_path)
+    if not tree:
+        raise RuntimeError(f"Tree {tree_path} not found in {file_name}")
+    candidates = read_candidates(tree)
+    infile.Close()
+    return candidates
+
+
+def count_tree(job):
+    """
+    Reads a tree of an AO2D file and fills the counts of all the channels (see fill_channel_counts)
+    and of all the matched candidates (see fill_integrated_counts)
+    """
+    file_name, tree_path, n_channels, n_reso, mass_bins, pt_range, pt_edges = job
+    candidates = select_pt(read_tree((file_name, tree_path)), pt_range)
+    return (fill_channel_counts(candidates, n_channels, n_reso, mass_bins, pt_edges),
+            fill_integrated_counts(candidates, mass_bins))
+
+
+def get_counts(file_names, tree_name, n_channels, n_reso, n_workers=1, mass_bins=MASS_BINS, pt_range=None,
+               pt_edges=None):
+    """
+    Counts of fill_channel_counts and fill_integrated_counts summed over the trees of all the
+    DF_* directories of all the input files, each tree being processed by one of n_workers processes
+    """
+    jobs = [job + (n_channels, n_reso, mass_bins, pt_range, pt_edges)
+            for job in get_tree_jobs(file_names, tree_name)]
+    print(f"Reading {len(jobs)} trees from {len(file_names)} files with {min(n_workers, len(jobs))} workers")
+
+    counts, counts_integrated = 0., 0.
+    if n_workers <= 1:
+        for tree_counts, tree_counts_integrated in map(count_tree, jobs):
+            counts, counts_integrated = counts + tree_counts, counts_integrated + tree_counts_integrated
     else:
+        with multiprocessing.get_context("fork").Pool(min(n_workers, len(jobs))) as pool:
+            for tree_counts, tree_counts_integrated in pool.imap_unordered(count_tree, jobs):
+                counts, counts_integrated = counts + tree_counts, counts_integrated + tree_counts_integrated
+
+    return counts, counts_integrated
+
+
+def load_candidates(cache_dir):
+    """
+    Candidates stored by extract_candidates, as memory-mapped arrays
+    """
+    return {col: np.load(os.path.join(cache_dir, f"{col}.npy"), mmap_mode="r") for col in COLUMNS}
+
+
+def extract_candidates(file_names, cache_dir, tree_name=TREE_NAME, n_workers=1):
+    """
+    Dumps the COLUMNS of the trees of all the DF_* directories of the input files (read by
+    n_workers processes) into one .npy file per column in cache_dir. The cache is reused as long
+    as the input files are unchanged (checksum of names, sizes and modification times)
+
+    Returns:
+        - candidates as memory-mapped arrays (see load_candidates)
+    """
+    checksum_file = os.path.join(cache_dir, "checksum.json")
+    checksum = get_inputs_checksum(file_names, tree_name, *COLUMNS)
+    if os.path.isfile(checksum_file):
+        with open(checksum_file, "r") as f:
+            if json.load(f).get("checksum") == checksum:
+                print(f"Candidates taken from the cache {cache_dir}")
+                return load_candidates(cache_dir)
+
+    jobs = get_tree_jobs(file_names, tree_name)
+    print(f"Extracting {len(jobs)} trees from {len(file_names)} files into {cache_dir}")
+    if n_workers <= 1:
+        results = [read_tree(job) for job in jobs]
+    else:
+        with multiprocessing.get_context("fork").Pool(min(n_workers, len(jobs))) as pool:
+            results = pool.map(read_tree, jobs, chunksize=1)
+
+    os.makedirs(cache_dir, exist_ok=True)
+    for col in COLUMNS:
+        np.save(os.path.join(cache_dir, f"{col}.npy"), np.concatenate([result[col] for result in results]))
+    with open(checksum_file, "w") as f:
+        json.dump({"checksum": checksum, "inputs": list(file_names), "tree": tree_name}, f, indent=2)
+
+    return load_candidates(cache_dir)
+
+
+def download_input(root_file, outlabel):
+    """
+    Downloads the AO2D.root of a grid output directory if root_file is not found locally
+    """
+    if os.path.isfile(root_file):
         print(f"File {root_file} already exists locally.")
+        return root_file
+    print(f"File {root_file} not found locally. Downloading from MonALISA...")
+    os.system(f"alien_cp alien:{root_file}/AO2D.root file:./AO2D_corrbkg_{outlabel}.root")
+    return f"AO2D_corrbkg_{outlabel}.root"
 
-# Open file and tree
-file = ROOT.TFile.Open(root_file)
-tree = file.Get(tree_name)
-if not tree:
-    raise RuntimeError(f"Tree {tree_name} not found in {root_file}")
 
 # --- Decay channel mapping (from your enum) ---
 channels = {
@@ -145,110 +323,221 @@ labels_reso = {
 }
 
 
-# Output file
-outfile = ROOT.TFile("invMassOverlay.root", "RECREATE")
-
-# Create canvas
-canvas = ROOT.TCanvas("c", "Invariant Mass Overlay", 800, 800)
-canvas.SetLogy()
-
-# Legend
-legend = ROOT.TLegend(0.45, 0.7, 0.88, 0.88)
-legend.SetBorderSize(0)
-legend.SetFillStyle(0)
-legend.SetTextSize(0.02)
-legend.SetNColumns(2)
-
-# --- Integrated histogram (all channels) ---
-hIntegrated = ROOT.TH1F("hIntegrated", ";#it{M} (GeV/c^{2});Entries", 200, 1.6, 2.2)
-tree.Draw("fM>>hIntegrated", "fFlagMcMatchRec>0", "goff")
-hIntegrated.SetLineColor(ROOT.kBlack)
-hIntegrated.SetLineWidth(2)
-hIntegrated.SetStats(0)
-hIntegrated.GetYaxis().SetRangeUser(1, hIntegrated.GetMaximum() * 20.4)
-hIntegrated.GetXaxis().SetRangeUser(1.65, 2.08)
-hIntegrated.Draw("HIST")
-
-# Colors from kRainBow
-ROOT.gStyle.SetPalette(ROOT.kRainBow)
-_COLOR_BASES = [
-    ROOT.kRed + 1,
-    ROOT.kAzure + 4,
-    ROOT.kOrange + 2,
-    ROOT.kGreen + 2,
-    ROOT.kViolet + 4,
-    ROOT.kCyan + 2,
-    ROOT.kTeal + 2,
-    ROOT.kPink + 1,
-    ROOT.kYellow + 1,
-    ROOT.kOrange + 1,
-    ROOT.kCyan + 1,
-    ROOT.kMagenta + 1,
-    ROOT.kGreen + 1,
-    ROOT.kBlue + 1,
-    ROOT.kRed + 1,
-    ROOT.kViolet + 1,
-    ROOT.kAzure + 1,
-    ROOT.kPink + 2,
-    ROOT.kYellow + 2,
-    ROOT.kOrange + 3,
-    ROOT.kCyan + 3,
-    ROOT.kMagenta + 3,
-    ROOT.kGreen + 3,
-    ROOT.kBlue + 3,
-    ROOT.kRed + 3,
-    ROOT.kViolet + 3,
-]
-colors = [ROOT.TColor.GetColorTransparent(c, 0.6) for c in _COLOR_BASES]
-
-
-# --- Per-channel histograms ---
-histos = []
-hratios = []
-counter = 0
-for i, (chan, label) in enumerate(channels.items()):
-    for j, (reso, resolabel) in enumerate(channelsRes.items()):
-        if chan == 0 and reso == 0:
-            continue  # Skip resonant sub-channels for "All"
-
-        full_label = f"{label}_{resolabel}"
-        hist_name = f"hM_{full_label}"
-
-        hist = ROOT.TH1F(hist_name, ";M (GeV/c^{2});Entries", 200, 1.6, 2.2)
-
-        cut = f"fFlagMcDecayChanRec=={reso} && fFlagMcMatchRec=={chan}"
-        tree.Draw(f"fM>>{hist_name}", cut, "goff")
-
-        # Only keep non-empty histograms
-        if hist.GetEntries() > 0 and hist.Integral() > 1000:
-
-            hist.SetLineColor(colors[counter])
-            hist.SetMarkerColor(colors[counter])
-            hist.SetFillColorAlpha(colors[counter], 0.3)
-
-            counter += 1
-            hist.SetLineWidth(2)
-            histos.append(hist)
-            hist.Draw("a5 HIST SAME")
-            legend.AddEntry(hist, f"{labels_channels[chan]} - {labels_reso[reso]}", "f") if labels_reso[reso] != "" else legend.AddEntry(hist, f"{labels_channels[chan]}", "f")
-
-            # Ratio to integrated
-            ratio_name = f"hRatio_{full_label}"
-            ratio = hist.Clone(ratio_name)
-            ratio.SetTitle(f";M (GeV/c^{{2}});{full_label}/All channels")
-            ratio.Divide(ratio, hIntegrated, 1.0, 1.0, "B")
-            hratios.append(ratio)
-
-# Draw legend and save
-legend.Draw()
-canvas.Update()
-
-canvas.SaveAs(f"invMassOverlay_{outlabel}.png")
-canvas.SaveAs(f"invMassOverlay_{outlabel}.pdf")
-canvas.Write()
-
-
-outfile.Close()
-file.Close()
-
-print("Saved overlay plot to invMassOverlay.png/pdf and histograms in invMassOverlay.root")
+def plot_corrbkg(infile_names, outlabel, tree_name=TREE_NAME, n_workers=1, cache_dir=None,
+                 mass_bins=MASS_BINS, pt_range=None, min_integral=1000.):
+    """
+    Overlay of the invariant-mass distributions of the correlated-background channels with more
+    than min_integral entries. If cache_dir is set, the candidates are extracted once into a
+    columnar cache (see extract_candidates) and the histograms are filled from the cached arrays
+    """
+    if pt_range is not None:
+        outlabel = f"{outlabel}_pt{pt_range[0]:g}_{pt_range[1]:g}"
+
+    # Output file
+    outfile = ROOT.TFile("invMassOverlay.root", "RECREATE")
+
+    # Create canvas
+    canvas = ROOT.TCanvas("c", "Invariant Mass Overlay", 800, 800)
+    canvas.SetLogy()
+
+    # Legend
+    legend = ROOT.TLegend(0.45, 0.7, 0.88, 0.88)
+    legend.SetBorderSize(0)
+    legend.SetFillStyle(0)
+    legend.SetTextSize(0.02)
+    legend.SetNColumns(2)
+
+    # --- Integrated histogram (all channels) ---
+    if cache_dir is not None:
+        candidates = select_pt(extract_candidates(infile_names, cache_dir, tree_name, n_workers), pt_range)
+        counts = fill_channel_counts(candidates, len(channels), len(channelsRes), mass_bins)
+        counts_integrated = fill_integrated_counts(candidates, mass_bins)
+    else:
+        counts, counts_integrated = get_counts(infile_names, tree_name, len(channels), len(channelsRes),
+                                               n_workers, mass_bins, pt_range)
+    hIntegrated = ROOT.TH1F("hIntegrated", ";#it{M} (GeV/c^{2});Entries", *mass_bins)
+    set_bin_contents(hIntegrated, counts_integrated)
+    hIntegrated.SetLineColor(ROOT.kBlack)
+    hIntegrated.SetLineWidth(2)
+    hIntegrated.SetStats(0)
+    hIntegrated.GetYaxis().SetRangeUser(1, hIntegrated.GetMaximum() * 20.4)
+    hIntegrated.GetXaxis().SetRangeUser(1.65, 2.08)
+    hIntegrated.Draw("HIST")
+
+    # Colors from kRainBow
+    ROOT.gStyle.SetPalette(ROOT.kRainBow)
+    _COLOR_BASES = [
+        ROOT.kRed + 1,
+        ROOT.kAzure + 4,
+        ROOT.kOrange + 2,
+        ROOT.kGreen + 2,
+        ROOT.kViolet + 4,
+        ROOT.kCyan + 2,
+        ROOT.kTeal + 2,
+        ROOT.kPink + 1,
+        ROOT.kYellow + 1,
+        ROOT.kOrange + 1,
+        ROOT.kCyan + 1,
+        ROOT.kMagenta + 1,
+        ROOT.kGreen + 1,
+        ROOT.kBlue + 1,
+        ROOT.kRed + 1,
+        ROOT.kViolet + 1,
+        ROOT.kAzure + 1,
+        ROOT.kPink + 2,
+        ROOT.kYellow + 2,
+        ROOT.kOrange + 3,
+        ROOT.kCyan + 3,
+        ROOT.kMagenta + 3,
+        ROOT.kGreen + 3,
+        ROOT.kBlue + 3,
+        ROOT.kRed + 3,
+        ROOT.kViolet + 3,
+    ]
+    colors = [ROOT.TColor.GetColorTransparent(c, 0.6) for c in _COLOR_BASES]
+
+
+    # --- Per-channel histograms, all filled at once ---
+    histos = []
+    hratios = []
+    counter = 0
+    for i, (chan, label) in enumerate(channels.items()):
+        for j, (reso, resolabel) in enumerate(channelsRes.items()):
+            if chan == 0 and reso == 0:
+                continue  # Skip resonant sub-channels for "All"
+
+            full_label = f"{label}_{resolabel}"
+            hist_name = f"hM_{full_label}"
+
+            hist = ROOT.TH1F(hist_name, ";M (GeV/c^{2});Entries", *mass_bins)
+            set_bin_contents(hist, counts[chan, reso])
+
+            # Only keep non-empty histograms
+            if hist.GetEntries() > 0 and hist.Integral() > min_integral:
+
+                hist.SetLineColor(colors[counter])
+                hist.SetMarkerColor(colors[counter])
+                hist.SetFillColorAlpha(colors[counter], 0.3)
+
+                counter += 1
+                hist.SetLineWidth(2)
+                histos.append(hist)
+                hist.Draw("a5 HIST SAME")
+                legend.AddEntry(hist, f"{labels_channels[chan]} - {labels_reso[reso]}", "f") if labels_reso[reso] != "" else legend.AddEntry(hist, f"{labels_channels[chan]}", "f")
+
+                # Ratio to integrated
+                ratio_name = f"hRatio_{full_label}"
+                ratio = hist.Clone(ratio_name)
+                ratio.SetTitle(f";M (GeV/c^{{2}});{full_label}/All channels")
+                ratio.Divide(ratio, hIntegrated, 1.0, 1.0, "B")
+                hratios.append(ratio)
+
+    # Draw legend and save
+    legend.Draw()
+    canvas.Update()
+
+    canvas.SaveAs(f"invMassOverlay_{outlabel}.png")
+    canvas.SaveAs(f"invMassOverlay_{outlabel}.pdf")
+    canvas.Write()
+
+
+    outfile.Close()
+
+    print("Saved overlay plot to invMassOverlay.png/pdf and histograms in invMassOverlay.root")
+
+
+def make_templates(infile_names, outlabel, pt_edges, tree_name=TREE_NAME, n_workers=1, cache_dir=None,
+                   mass_bins=MASS_BINS):
+    """
+    pt-differential mass templates of all the (channel, resonant channel) pairs, filled at once
+    (see fill_channel_counts) and stored in corrbkgTemplates_<outlabel>.npz (see load_templates)
+    and as TH1D hM_<channel>_<resonant channel>_pt<min>_<max> in corrbkgTemplates_<outlabel>.root.
+    The templates are only written out, the mass fits (mass_fit.py) have no template component
+    """
+    pt_edges = np.asarray(pt_edges, dtype=np.float64)
+    if cache_dir is not None:
+        candidates = extract_candidates(infile_names, cache_dir, tree_name, n_workers)
+        counts = fill_channel_counts(candidates, len(channels), len(channelsRes), mass_bins, pt_edges)
+    else:
+        counts, _ = get_counts(infile_names, tree_name, len(channels), len(channelsRes), n_workers, mass_bins,
+                               pt_edges=pt_edges)
+
+    outfile_name = f"corrbkgTemplates_{outlabel}"
+    np.savez(f"{outfile_name}.npz", counts=counts, pt_edges=pt_edges,
+             mass_edges=np.linspace(mass_bins[1], mass_bins[2], mass_bins[0] + 1),
+             channels=np.array(list(channels.values())), resonances=np.array(list(channelsRes.values())))
+
+    outfile = ROOT.TFile(f"{outfile_name}.root", "RECREATE")
+    for chan, label in channels.items():
+        for reso, resolabel in channelsRes.items():
+            if (chan == 0 and reso == 0) or counts[chan, reso].sum() == 0:
+                continue
+            for ipt, (pt_min, pt_max) in enumerate(zip(pt_edges[:-1], pt_edges[1:])):
+                hist = ROOT.TH1D(f"hM_{label}_{resolabel}_pt{pt_min:g}_{pt_max:g}",
+                                 f"{pt_min:g} < #it{{p}}_{{T}} < {pt_max:g} GeV/#it{{c}};M (GeV/c^{{2}});Entries",
+                                 *mass_bins)
+                set_bin_contents(hist, counts[chan, reso, ipt], counts[chan, reso, ipt])
+                hist.Write()
+    outfile.Close()
+
+    print(f"Saved the templates in {outfile_name}.npz and {outfile_name}.root")
+
+
+def load_templates(file_name):
+    """
+    Templates stored by make_templates, as a dictionary with the counts (channel, resonant channel,
+    pt bin, mass bin including under- and overflow bins), pt_edges, mass_edges, channels and resonances
+    """
+    with np.load(file_name) as templates:
+        return {key: templates[key] for key in templates.files}
+
+
+def get_template(templates, channel, resonance, pt_bin):
+    """
+    Mass edges and contents (without under- and overflow bins) of a template of load_templates,
+    channel and resonance being names or indices (same binning as the histograms
+    of the corrbkgTemplates_<outlabel>.root file)
+    """
+    if isinstance(channel, str):
+        channel = list(templates["channels"]).index(channel)
+    if isinstance(resonance, str):
+        resonance = list(templates["resonances"]).index(resonance)
+    return templates["mass_edges"], templates["counts"][channel, resonance, pt_bin, 1:-1]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Arguments")
+    parser.add_argument("--infiles", "-i", nargs="+",
+                        default=["/alice/cern.ch/user/a/alihyperloop/outputs/0069/691495/251360"],
+                        help="AO2D input files (grid output directories are downloaded if not found locally)")
+    parser.add_argument("--outlabel", "-o", metavar="text", default="24h1d",
+                        help="label of the output files")
+    parser.add_argument("--tree", metavar="text", default=TREE_NAME,
+                        help="name of the candidate tree in the DF_* directories")
+    parser.add_argument("--no-download", action="store_true", default=False,
+                        help="do not download the input files not found locally")
+    parser.add_argument("--nworkers", "-j", type=int, default=os.cpu_count(),
+                        help="number of processes reading the trees")
+    parser.add_argument("--cache", metavar="text", default=None,
+                        help="directory of the columnar cache of the candidates, created if missing or outdated")
+    parser.add_argument("--mass-bins", nargs=3, type=float, default=None, metavar=("NBINS", "MIN", "MAX"),
+                        help=f"binning of the mass histograms (default {MASS_BINS})")
+    parser.add_argument("--pt-range", nargs=2, type=float, default=None, metavar=("MIN", "MAX"),
+                        help="select the candidates in a pt interval")
+    parser.add_argument("--min-integral", type=float, default=1000.,
+                        help="minimum integral of the channels shown in the overlay")
+    parser.add_argument("--templates", nargs="+", type=float, default=None, metavar="PT_EDGE",
+                        help="produce the pt-differential templates in the pt intervals defined by these edges "
+                             "instead of the overlay")
+    args = parser.parse_args()
+
+    infiles = args.infiles
+    if not args.no_download:
+        infiles = [download_input(infile, f"{args.outlabel}_{ifile}" if len(infiles) > 1 else args.outlabel)
+                   for ifile, infile in enumerate(infiles)]
+    mass_bins = MASS_BINS if args.mass_bins is None else (int(args.mass_bins[0]), *args.mass_bins[1:])
+    if args.templates is not None:
+        make_templates(infiles, args.outlabel, args.templates, args.tree, args.nworkers, args.cache, mass_bins)
+    else:
+        plot_corrbkg(infiles, args.outlabel, args.tree, args.nworkers, args.cache, mass_bins, args.pt_range,
+                     args.min_integral)
@@ -1,5 +1,6 @@
 import ROOT
 import os
+from eff_comparison import EfficiencyTable, get_ratio_hists
 
 
 def get_empty_clone(hist):
@@ -62,6 +63,9 @@ file_paths = [
     "/home/spolitan/alice/analyses/hf-mc/postprocess/outputs/HF_LHC24g2_Small_2P3PDstar_50100_train288635/QA_output_HF_LHC24g2_Small_2P3PDstar_50100_train288635.root",
 ]
 
+# Read all the efficiencies of the files at once
+eff_table = EfficiencyTable(file_paths)
+
 # Define particle speceis to be analysed
 particle_data = [
     (
@@ -184,8 +188,7 @@ for meson in particle_data:
             else:
                 cent_class = 2
 
-            file = ROOT.TFile.Open(file_paths[cent_class])
-            heff = file.Get(f"efficiencies/h_eff_{category}{mes}vcent{centrality}")
+            heff = eff_table.get("eff", category, mes, centrality, cent_class)
 
             heff.SetTitle("")
             heff.SetDirectory(0)
@@ -221,9 +224,7 @@ for meson in particle_data:
 
             # plot np / p eff. ratio
             if category == "nonprompt":  # redoundant otherwise
-                heff_npvp_ratio = file.Get(
-                    f"efficiencies/h_eff_ratio{mes}vcent{centrality}"
-                )
+                heff_npvp_ratio = eff_table.get("eff", "ratio", mes, centrality, cent_class)
 
                 heff_npvp_ratio.SetTitle("")
                 heff_npvp_ratio.SetDirectory(0)
@@ -268,18 +269,16 @@ for meson in particle_data:
         canvas_cent_ratio.cd().SetGridy()
         canvas_cent_ratio.cd().SetGridx()
 
-        h_ratio = []
+        # ratios to the first interval, all at once
+        h_ratio = get_ratio_hists(
+            hratio, [f"h_ratio_{category}{mes}_{cent}_over_0_10" for cent in centralities]
+        )
         h_ratio_empty = []
-        for ih, (h) in enumerate(hratio):
-            h_ratio.append(
-                h.Clone(f"h_ratio_{category}{mes}_{centralities[ih]}_over_0_10")
-            )
-            h_ratio[-1].SetDirectory(0)
-            h_ratio[-1].GetYaxis().SetTitle(
+        for h in h_ratio:
+            h.GetYaxis().SetTitle(
                 f"Acc.#times#varepsilon(cent) / Acc.#times#varepsilon(0-10%)"
             )
-            h_ratio[-1].Divide(h, hratio[0], 1.0, 1.0, "B")
-            h_ratio_empty.append(get_empty_clone(h_ratio[-1]))
+            h_ratio_empty.append(get_empty_clone(h))
 
         for ih, (hratio, hratioempty) in enumerate(zip(h_ratio, h_ratio_empty)):
             hratio.GetYaxis().SetRangeUser(0.0, meson[3])
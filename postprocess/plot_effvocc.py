@@ -1,5 +1,6 @@
 import ROOT
 import os
+from eff_comparison import EfficiencyTable, get_ratio_hists
 
 def get_empty_clone(hist):
     '''
@@ -47,6 +48,9 @@ file_paths = [
     "/home/spolitan/alice/analyses/hf-mc/postprocess/outputs/HF_LHC24g2_Small_2P3PDstar_50100_train288635/QA_output_HF_LHC24g2_Small_2P3PDstar_50100_train288635.root",
 ]
 
+# Read all the efficiencies of the files at once
+eff_table = EfficiencyTable(file_paths)
+
 # Define particle speceis to be analysed
 particle_data = [
     ("DzeroToKPi", "D^{0}#rightarrow K#pi", 1.e-2, 2, 2), # channel, label, ymin comparison, ymax cent ratio, ymax np / p ratio
@@ -107,7 +111,6 @@ outfile = ROOT.TFile("eff_vocc.root", "recreate")
 
 # Loop over centrality (3 bins)
 for icent, (file_path) in enumerate(file_paths):
-    file = ROOT.TFile.Open(file_path)
     heff_empty = []
     heff_npvp_ratio_empty = []
     if icent == 0:
@@ -170,7 +173,7 @@ for icent, (file_path) in enumerate(file_paths):
 
             # Loop over occupancy
             for iocc, (occupancy) in enumerate(occupancies):
-                heff = file.Get(f"efficiencies/h_effocc_{category}{mes}vcent{occupancy}")
+                heff = eff_table.get("effocc", category, mes, occupancy, icent)
 
                 heff.SetTitle("")
                 heff.SetDirectory(0)
@@ -206,9 +209,7 @@ for icent, (file_path) in enumerate(file_paths):
 
                 # plot np / p eff. ratio
                 if category == "nonprompt":  # redoundant otherwise
-                    heff_npvp_ratio = file.Get(
-                        f"efficiencies/h_effocc_ratio{mes}vcent{occupancy}"
-                    )
+                    heff_npvp_ratio = eff_table.get("effocc", "ratio", mes, occupancy, icent)
 
                     heff_npvp_ratio.SetTitle("")
                     heff_npvp_ratio.SetDirectory(0)
@@ -253,18 +254,16 @@ for icent, (file_path) in enumerate(file_paths):
             canvas_cent_ratio.cd().SetGridy()
             canvas_cent_ratio.cd().SetGridx()
 
-            h_ratio = []
+            # ratios to the first interval, all at once
+            h_ratio = get_ratio_hists(
+                hratio, [f"h_ratio_{category}{mes}_{occ}_over_0_10" for occ in occupancies]
+            )
             h_ratio_empty = []
-            for ih, (h) in enumerate(hratio):
-                h_ratio.append(
-                    h.Clone(f"h_ratio_{category}{mes}_{occupancies[ih]}_over_0_10")
-                )
-                h_ratio[-1].SetDirectory(0)
-                h_ratio[-1].GetYaxis().SetTitle(
+            for h in h_ratio:
+                h.GetYaxis().SetTitle(
                     f"Acc.#times#varepsilon(Occ) / Acc.#times#varepsilon(0-2000)"
                 )
-                h_ratio[-1].Divide(h, hratio[0], 1.0, 1.0, "B")
-                h_ratio_empty.append(get_empty_clone(h_ratio[-1]))
+                h_ratio_empty.append(get_empty_clone(h))
 
             for ih, (hratio, hratioempty) in enumerate(zip(h_ratio, h_ratio_empty)):
                 hratio.GetYaxis().SetRangeUser(0.0, meson[3])
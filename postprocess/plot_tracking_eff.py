@@ -2,6 +2,11 @@ import ROOT
 import yaml
 import argparse
 import os
+import multiprocessing
+import numpy as np
+from hist_utils import get_axis_edges, get_bin_contents, get_bin_errors2, th1_from_arrays
+from input_merge import get_inputs_checksum
+from step_efficiency import teff_to_th1
 
 pdgs = [211, 321, 2212]  # pi, K, p
 pdg_label = {211: "#pi^{+}", 321: "K^{+}", 2212: "p", -211: "#pi^{-}", -321: "K^{-}", -2212: "#bar{p}"}
@@ -63,35 +68,15 @@ def set_legend_style(legend, header):
 def convert_teff_to_th1(teff, name):
     """
     Converts a ROOT TEfficiency object to a TH1 histogram.
+    The efficiencies and intervals of all the bins are computed at once from the passed and total
+    histograms (see step_efficiency.teff_to_th1), with the statistic option of the TEfficiency.
     Parameters:
         teff (ROOT.TEfficiency): The TEfficiency object to convert.
         name (str): The name for the resulting TH1 histogram.
     Returns:
         ROOT.TH1: The converted TH1 histogram with efficiency values and errors.
     """
-    total = teff.GetTotalHistogram()
-    passed = teff.GetPassedHistogram()
-
-    hist = total.Clone(name)
-    hist.Reset("ICES")
-    hist.SetDirectory(0)
-
-    for ibin in range(1, hist.GetNbinsX() + 1):
-        n_total = total.GetBinContent(ibin)
-        n_passed = passed.GetBinContent(ibin)
-
-        if n_total <= 0 or n_passed < 0 or n_passed > n_total:
-            hist.SetBinContent(ibin, 0.0)
-            hist.SetBinError(ibin, 0.0)
-            continue
-
-        hist.SetBinContent(ibin, teff.GetEfficiency(ibin))
-
-        err_low = teff.GetEfficiencyErrorLow(ibin)
-        err_up = teff.GetEfficiencyErrorUp(ibin)
-        hist.SetBinError(ibin, 0.5 * (err_low + err_up))
-
-    return hist
+    return teff_to_th1(teff, name)
 
 def set_style(hist, color, marker, label, xmin=0, xmax=10, ymin=0, ymax=1.2):
     """
@@ -177,6 +162,74 @@ def get_heff(infile, folder_name, pdg, teff_name="ITS-TPC_vsPt_Prm_Trk"):
 
     return heff
 
+def get_local_file_name(input_file, mclabel, download_file):
+    """
+    Name of the local copy of an input file (downloaded inputs are stored as AnalysisResults_trackeff_<mclabel>.root)
+    """
+    return f"AnalysisResults_trackeff_{mclabel}.root" if download_file else input_file
+
+def extract_efficiencies(job):
+    """
+    Downloads (if needed) and opens an input file, and converts the TEfficiency objects of the
+    requested PDG codes to arrays, optionally cached in an .npz file reused as long as the local
+    file is unchanged.
+    Parameters:
+        job (tuple): input file, MC label, download flag, folder name, list of (pdg, TEfficiency name), cache file or None.
+    Returns:
+        dict: {(pdg, TEfficiency name): (bin edges, contents, squared errors)} without under- and overflow bins.
+    """
+    input_file, mclabel, download_file, folder_name, teff_keys, cache_file = job
+    local_file = get_local_file_name(input_file, mclabel, download_file)
+    if download_file and not os.path.isfile(local_file):
+        download_anres(input_file, mclabel)
+
+    checksum = get_inputs_checksum([local_file], folder_name, *teff_keys)
+    if cache_file is not None and os.path.isfile(cache_file):
+        with np.load(cache_file) as cache:
+            if str(cache["checksum"]) == checksum:
+                print(f"Efficiencies of {mclabel} taken from {cache_file}")
+                return {key: (cache[f"edges_{ikey}"], cache[f"contents_{ikey}"], cache[f"errors2_{ikey}"])
+                        for ikey, key in enumerate(teff_keys)}
+
+    infile = ROOT.TFile.Open(local_file, "READ")
+    if not infile or infile.IsZombie():
+        raise RuntimeError(f"Cannot open ROOT file: {local_file}")
+    efficiencies = {}
+    for pdg, teff_name in teff_keys:
+        heff = get_heff(infile, folder_name, pdg, teff_name)
+        efficiencies[pdg, teff_name] = (get_axis_edges(heff.GetXaxis()), get_bin_contents(heff)[1:-1],
+                                        get_bin_errors2(heff)[1:-1])
+    infile.Close()
+
+    if cache_file is not None:
+        arrays = {"checksum": np.array(checksum)}
+        for ikey, key in enumerate(teff_keys):
+            arrays.update({f"edges_{ikey}": efficiencies[key][0], f"contents_{ikey}": efficiencies[key][1],
+                           f"errors2_{ikey}": efficiencies[key][2]})
+        np.savez(cache_file, **arrays)
+    print(f"Efficiencies of {mclabel} extracted from {local_file}")
+
+    return efficiencies
+
+def get_efficiencies(jobs, n_workers=1):
+    """
+    Extracts the efficiencies of all the input files (see extract_efficiencies), with
+    the input files fetched and processed concurrently by n_workers processes.
+    Returns:
+        list: efficiencies of each job, in the order of jobs.
+    """
+    if n_workers <= 1:
+        return [extract_efficiencies(job) for job in jobs]
+    with multiprocessing.get_context("fork").Pool(min(n_workers, len(jobs))) as pool:
+        return pool.map(extract_efficiencies, jobs, chunksize=1)
+
+def get_heff_from_arrays(efficiencies, pdg, name, teff_name="ITS-TPC_vsPt_Prm_Trk"):
+    """
+    Tracking efficiency histogram of a PDG code from the arrays of extract_efficiencies.
+    """
+    edges, contents, errors2 = efficiencies[pdg, teff_name]
+    return th1_from_arrays(name, "", edges, contents, errors2)
+
 
 
 if __name__ == "__main__":
@@ -184,6 +237,8 @@ if __name__ == "__main__":
     # Parse command line arguments
     parser = argparse.ArgumentParser(description="Plot tracking efficiency from ROOT files based on a YAML configuration.")
     parser.add_argument("--config", type=str, default="tracking_efficiency_config.yaml", help="Path to the YAML configuration file.", required=True)
+    parser.add_argument("--nworkers", "-j", type=int, default=os.cpu_count(), help="Number of input files fetched and processed concurrently.")
+    parser.add_argument("--no-cache", action="store_true", default=False, help="Do not cache the extracted efficiencies.")
     args = parser.parse_args()
 
     #load configuration from YAML file
@@ -216,6 +271,23 @@ if __name__ == "__main__":
     outfile_name += ".root"
     print(f"Output file will be: {outfile_name}")
 
+    # Fetch and extract the efficiencies of all the input files concurrently
+    cache_dir = None if args.no_cache else config.get('cache_directory', f"{outdir}cache/")
+    if cache_dir is not None:
+        os.makedirs(cache_dir, exist_ok=True)
+    teff_keys = [(sign * pdg, "ITS-TPC_vsPt_Prm_Trk") for pdg in pdgs for sign in (1, -1)]
+    if do_plots['do_reco_gen']:
+        teff_keys += [(pdg, "ITS-TPC_vsPt_Prm") for pdg in pdgs]
+    jobs = []
+    for input_file, mclabel, download_file, id in zip(input_files, mclabels, download_files, wagonid):
+        folder_name = "qa-efficiency"
+        if id:
+            folder_name += f"_{id}"
+        folder_name += "/EfficiencyMC"
+        cache_file = None if cache_dir is None else f"{cache_dir}trackeff_{mclabel}.npz"
+        jobs.append((input_file, mclabel, download_file, folder_name, teff_keys, cache_file))
+    efficiencies = get_efficiencies(jobs, args.nworkers)
+
     outfile = ROOT.TFile(f"{outdir}{outfile_name}", "RECREATE")
 
     heff_compare = {}
@@ -229,23 +301,8 @@ if __name__ == "__main__":
         heff_compare[mclabel] = {}
 
         if download_file:
-            download_anres(input_file, mclabel)
-
-        folder_name = "qa-efficiency"
-        if id:
-            folder_name += f"_{id}"
-        folder_name += "/EfficiencyMC"
-        print(f"Using folder: {folder_name}")
-
-        if download_file:
-            infile = ROOT.TFile(f"AnalysisResults_trackeff_{mclabel}.root", "READ")
-            if not infile or infile.IsZombie():
-                raise RuntimeError(f"Cannot open ROOT file: AnalysisResults_trackeff_{mclabel}.root")
             input_origin_label.append(f"wagon {get_run_number_from_path(input_file)}")
         else:
-            infile = ROOT.TFile.Open(input_file, "READ")
-            if not infile or infile.IsZombie():
-                raise RuntimeError(f"Cannot open ROOT file: {input_file}")
             input_origin_label.append('local test')
         
         heff_its_tpc_pos = []
@@ -256,7 +313,7 @@ if __name__ == "__main__":
         for ipdg, pdg in enumerate(pdgs):
             heff_compare[mclabel][pdg] = {}
 
-            heff_pos = get_heff(infile, folder_name, pdg)
+            heff_pos = get_heff_from_arrays(efficiencies[ifile], pdg, f"pdg{pdg}_pos")
             set_style(heff_pos, colors[ipdg], marker_styles[0], labels[ipdg])
             outfile.mkdir(f"{mclabel}/pdg{pdg}")
             outfile.cd(f"{mclabel}/pdg{pdg}")
@@ -264,7 +321,7 @@ if __name__ == "__main__":
             heff_its_tpc_pos.append(heff_pos)
             heff_compare[mclabel][pdg]["pos"] = heff_pos
 
-            heff_neg = get_heff(infile, folder_name, -pdg)
+            heff_neg = get_heff_from_arrays(efficiencies[ifile], -pdg, f"pdg{-pdg}_pos")
             set_style(heff_neg, colors[ipdg+3], marker_styles[1], labels[ipdg])
             outfile.mkdir(f"{mclabel}/pdg{-pdg}")
             outfile.cd(f"{mclabel}/pdg{-pdg}")
@@ -273,7 +330,7 @@ if __name__ == "__main__":
             heff_compare[mclabel][pdg]["neg"] = heff_neg
 
             if do_plots['do_reco_gen']:
-                heff_gen = get_heff(infile, folder_name, pdg, teff_name="ITS-TPC_vsPt_Prm")
+                heff_gen = get_heff_from_arrays(efficiencies[ifile], pdg, f"pdg{pdg}_pos", teff_name="ITS-TPC_vsPt_Prm")
                 set_style(heff_gen, colors[ipdg+3], marker_styles[2], labels[ipdg])
                 outfile.mkdir(f"{mclabel}/pdg{pdg}/gen")
                 outfile.cd(f"{mclabel}/pdg{pdg}/gen")
@@ -490,6 +547,5 @@ if __name__ == "__main__":
         canvas_compare.Write()
 
         outfile.Close()
-        infile.Close()
 
     print("Tracking efficiency histograms saved to tracking_efficiency.root")
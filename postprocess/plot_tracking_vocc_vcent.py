@@ -1,8 +1,12 @@
+import numpy as np
 import ROOT
+from hist_utils import get_bin_contents, get_bin_errors2, set_bin_contents, divide, th1_from_axis
 
 def compute_ratio_th3(file_name, hist1_name, hist2_name, output_hist_name):
     """
     Computes the ratio of two TH3 histograms and writes the result to a new histogram.
+    The ratio is computed on the NumPy arrays of the bin contents at once, with binomial
+    uncertainties (as TH1::Divide with option "B") and 0 in the bins with empty denominator.
 
     Parameters:
         file_name (str): The name of the ROOT file containing the histograms.
@@ -32,26 +36,46 @@ def compute_ratio_th3(file_name, hist1_name, hist2_name, output_hist_name):
     ratio_hist.SetDirectory(0)  # Detach from the file
     ratio_hist.Reset()  # Reset contents to zero
 
-    # Compute the ratio bin by bin
-    for x_bin in range(1, hist1.GetNbinsX() + 1):
-        for y_bin in range(1, hist1.GetNbinsY() + 1):
-            for z_bin in range(1, hist1.GetNbinsZ() + 1):
-                numerator = hist1.GetBinContent(x_bin, y_bin, z_bin)
-                denominator = hist2.GetBinContent(x_bin, y_bin, z_bin)
-
-                if denominator != 0:
-                    ratio = numerator / denominator
-                    ratio_hist.SetBinContent(x_bin, y_bin, z_bin, ratio)
-                else:
-                    ratio_hist.SetBinContent(x_bin, y_bin, z_bin, 0)  # Avoid division by zero
+    # Compute the ratio of all the bins at once
+    numerator, denominator = get_bin_contents(hist1), get_bin_contents(hist2)
+    if numerator.shape != denominator.shape:
+        raise ValueError(f"Histograms {hist1_name} and {hist2_name} have different binning.")
+    ratio, ratio_err2 = divide(numerator, denominator, get_bin_errors2(hist1), get_bin_errors2(hist2),
+                               binomial=True)
+    set_bin_contents(ratio_hist, ratio, ratio_err2)
 
     file.Close()
 
     return ratio_hist
 
+def get_range_sums(contents, axis, bin_ranges):
+    """
+    Sums of a NumPy array along an axis (including under- and overflow bins) in the bin ranges
+    [(bin_min, bin_max), ...], with the bin ranges of TAxis::SetRange (clamped to the under- and
+    overflow bins, all the bins including under- and overflow for (0, 0), bin_max < bin_min and
+    the other ranges resetting the axis range), for all the ranges at once.
+
+    Returns:
+        np.ndarray: array with the axis replaced by one entry per bin range.
+    """
+    n_cells = contents.shape[axis] - 1
+    bin_ranges = np.asarray(bin_ranges, dtype=np.int64).reshape(-1, 2)
+    bin_min, bin_max = bin_ranges[:, 0], bin_ranges[:, 1]
+    invalid = ((bin_max < bin_min) | ((bin_min == 0) & (bin_max == 0)) | ((bin_min < 0) & (bin_max < 0))
+               | ((bin_min > n_cells) & (bin_max > n_cells)) | ((bin_min < 0) & (bin_max > n_cells)))
+    bin_min = np.where(invalid, 0, np.clip(bin_min, 0, n_cells))
+    bin_max = np.where(invalid, n_cells, np.clip(bin_max, 0, n_cells))
+
+    cumulative = np.cumsum(contents, axis=axis)
+    cumulative = np.concatenate((np.zeros_like(np.take(cumulative, [0], axis=axis)), cumulative), axis=axis)
+    return np.take(cumulative, bin_max + 1, axis=axis) - np.take(cumulative, bin_min, axis=axis)
+
+
 def project_and_save_z(hist, x_bins, y_bins, output_prefix):
     """
     Projects a TH3 histogram along the z-axis in given bins of x and y axes and saves the projections.
+    All the projections are computed at once from the NumPy arrays of the TH3 (as TH3::ProjectionZ)
+    and written together with the zy projection in a single opening of the output file.
 
     Parameters:
         hist (ROOT.TH3): The input TH3 histogram.
@@ -59,25 +83,27 @@ def project_and_save_z(hist, x_bins, y_bins, output_prefix):
         y_bins (list of tuple): List of (y_bin_min, y_bin_max) ranges for the y-axis.
         output_prefix (str): The prefix for the output projection histograms.
     """
-    if not isinstance(x_bins, list) or not isinstance(y_bins, list):
-        raise ValueError("x_bins and y_bins must be lists of tuples.")
-
-    for x_range in x_bins:
-        for y_range in y_bins:
-            x_bin_min, x_bin_max = x_range
-            y_bin_min, y_bin_max = y_range
-
-            # Project along the z-axis
-            projection = hist.ProjectionZ(f"{output_prefix}_x{x_bin_min}_{x_bin_max}_y{y_bin_min}_{y_bin_max}",
-                                          x_bin_min, x_bin_max, y_bin_min, y_bin_max)
-            projection_ptocc = hist.Project3D("zy")
-
-            # Write the projection to a file
-            output_file = ROOT.TFile(f"{output_prefix}_projections.root", "UPDATE")
-            output_file.cd()
+    x_bins, y_bins = [tuple(x_range) for x_range in x_bins], [tuple(y_range) for y_range in y_bins]
+    if any(len(bin_range) != 2 for bin_range in x_bins + y_bins):
+        raise ValueError("x_bins and y_bins must be lists of (bin_min, bin_max) tuples.")
+
+    # arrays indexed as (z, y, x), projections indexed as (x range, y range, z)
+    contents, errors2 = get_bin_contents(hist), get_bin_errors2(hist)
+    projections = [get_range_sums(get_range_sums(array, 2, x_bins), 1, y_bins).transpose(2, 1, 0)
+                   for array in (contents, errors2)]
+    projection_ptocc = hist.Project3D("zy")
+
+    # Write all the projections to the file
+    output_file = ROOT.TFile(f"{output_prefix}_projections.root", "UPDATE")
+    output_file.cd()
+    for ix, (x_bin_min, x_bin_max) in enumerate(x_bins):
+        for iy, (y_bin_min, y_bin_max) in enumerate(y_bins):
+            projection = th1_from_axis(f"{output_prefix}_x{x_bin_min}_{x_bin_max}_y{y_bin_min}_{y_bin_max}", "",
+                                       hist.GetZaxis(), projections[0][ix, iy], projections[1][ix, iy])
+            projection.SetTitle(hist.GetTitle())
             projection.Write()
-            projection_ptocc.Write()
-            output_file.Close()
+    projection_ptocc.Write()
+    output_file.Close()
 
 # Example usage
 if __name__ == "__main__":
@@ -0,0 +1,69 @@
+"""
+Checksums of the inputs of perform_qa_mc_val.py, used to recompute only
+the species and centrality/occupancy slices that changed since the last run
+"""
+
+import os
+import json
+import ROOT
+
+
+class QACache:
+    """
+    Keeps the checksums of the input slices of the previous QA run
+    (stored in QA_output{suffix}_checksums.json next to QA_output{suffix}.root)
+    and the objects of its output file, to be reused if the inputs are unchanged
+    """
+
+    def __init__(self, outpath, suffix, incremental, dirs=("efficiencies",)):
+        self.checksum_file = os.path.join(outpath, f"QA_output{suffix}_checksums.json")
+        self.previous, self.current = {}, {}
+        self.objects = {}
+
+        output_file = os.path.join(outpath, f"QA_output{suffix}.root")
+        if not incremental:
+            return
+        if not os.path.isfile(self.checksum_file) or not os.path.isfile(output_file):
+            print("Incremental QA: no previous output found, everything will be recomputed")
+            return
+
+        with open(self.checksum_file, "r") as f:
+            self.previous = json.load(f)
+
+        infile = ROOT.TFile.Open(output_file)
+        for dir_name in dirs:
+            directory = infile.Get(dir_name)
+            if not directory:
+                continue
+            for key in directory.GetListOfKeys():
+                obj = key.ReadObj()
+                if isinstance(obj, ROOT.TH1):
+                    obj.SetDirectory(0)
+                self.objects[obj.GetName()] = obj
+        infile.Close()
+        print(f"Incremental QA: loaded {len(self.previous)} checksums from {self.checksum_file}")
+
+    def is_unchanged(self, key, checksum):
+        """
+        Registers the checksum of a slice and returns True if it matches the previous run
+        """
+        self.current[key] = checksum
+        return self.previous.get(key) == checksum
+
+    def get(self, name):
+        """
+        Returns a copy of an object of the previous output, None if not available
+        """
+        if name not in self.objects:
+            return None
+        obj = self.objects[name].Clone(name)
+        if isinstance(obj, ROOT.TH1):
+            obj.SetDirectory(0)
+        return obj
+
+    def save(self):
+        """
+        Stores the checksums of the current run
+        """
+        with open(self.checksum_file, "w") as f:
+            json.dump(self.current, f, indent=2, sort_keys=True)
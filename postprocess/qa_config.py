@@ -0,0 +1,176 @@
+"""
+Configuration (species, binning and outputs) of perform_qa_mc_val.py,
+read from a YAML or JSON file and validated before opening any input
+"""
+
+import os
+import json
+import yaml
+
+DEFAULT_CONFIG = os.path.join(os.path.dirname(os.path.abspath(__file__)), "qa_mc_val.yml")
+COLL_SYSTEMS = ("pp", "PbPb")
+SPECIES_TYPES = ("meson", "baryon")
+MAX_SUMMARY_SPECIES = 4 # pads of the efficiency summary canvas
+MAX_ORIGINS = 4 # colors of the track-to-collision association plots
+
+DEFAULT_OUTPUTS = {
+    "species": "all",
+    "summary_species": [],
+    "plot_full": True,
+    "eff_vs_cent": True,
+    "eff_vs_occ": True,
+}
+
+
+def _check_bins(bins, name, errors):
+    """
+    Checks that a binning is a list of at least two increasing numbers
+    """
+    if not isinstance(bins, list) or len(bins) < 2 \
+            or not all(isinstance(edge, (int, float)) and not isinstance(edge, bool) for edge in bins):
+        errors.append(f"{name} must be a list of at least two numbers")
+        return
+    if any(low >= high for low, high in zip(bins[:-1], bins[1:])):
+        errors.append(f"{name} must be strictly increasing")
+
+
+def validate_qa_config(config):
+    """
+    Checks the configuration and fills the optional fields with their defaults
+
+    Returns:
+        - validated configuration, ValueError raised with the list of all problems otherwise
+    """
+    errors = []
+    if not isinstance(config, dict):
+        raise ValueError("QA configuration must be a dictionary")
+
+    species = config.get("species")
+    names = []
+    if not isinstance(species, list) or not species:
+        errors.append("species must be a non-empty list")
+        species = []
+    for ispecies, spec in enumerate(species):
+        if not isinstance(spec, dict) or not isinstance(spec.get("name"), str) \
+                or not isinstance(spec.get("label"), str):
+            errors.append(f"species[{ispecies}] must have a name and a label")
+            continue
+        if spec.get("type") not in SPECIES_TYPES:
+            errors.append(f"species {spec['name']}: type must be one of {SPECIES_TYPES}")
+        if spec["name"] in names:
+            errors.append(f"species {spec['name']} defined twice")
+        names.append(spec["name"])
+
+    binning = config.get("binning")
+    if not isinstance(binning, dict):
+        errors.append("binning must be a dictionary")
+        binning = {}
+    _check_bins(binning.get("pt"), "binning.pt", errors)
+    for coll_system in COLL_SYSTEMS:
+        system_binning = binning.get(coll_system)
+        if not isinstance(system_binning, dict):
+            errors.append(f"binning.{coll_system} must be a dictionary")
+            continue
+        for var in ("centrality", "occupancy"):
+            _check_bins(system_binning.get(var), f"binning.{coll_system}.{var}", errors)
+
+    origin_labels = config.setdefault("origin_labels", [])
+    if not isinstance(origin_labels, list) or not all(isinstance(label, str) for label in origin_labels):
+        errors.append("origin_labels must be a list of strings")
+    elif len(origin_labels) > MAX_ORIGINS:
+        errors.append(f"at most {MAX_ORIGINS} origin_labels supported")
+
+    outputs = config.setdefault("outputs", {})
+    if not isinstance(outputs, dict):
+        errors.append("outputs must be a dictionary")
+        outputs = config["outputs"] = {}
+    for key, value in DEFAULT_OUTPUTS.items():
+        outputs.setdefault(key, value)
+    if outputs["species"] != "all":
+        if not isinstance(outputs["species"], list) or not outputs["species"]:
+            errors.append("outputs.species must be 'all' or a non-empty list of species names")
+        else:
+            errors += [f"outputs.species: unknown species {name}"
+                       for name in outputs["species"] if name not in names]
+    if not isinstance(outputs["summary_species"], list):
+        errors.append("outputs.summary_species must be a list of species names")
+    else:
+        errors += [f"outputs.summary_species: unknown species {name}"
+                   for name in outputs["summary_species"] if name not in names]
+        if len(outputs["summary_species"]) > MAX_SUMMARY_SPECIES:
+            errors.append(f"at most {MAX_SUMMARY_SPECIES} outputs.summary_species supported")
+    for key in ("plot_full", "eff_vs_cent", "eff_vs_occ"):
+        if not isinstance(outputs[key], bool):
+            errors.append(f"outputs.{key} must be true or false")
+
+    if errors:
+        raise ValueError("Invalid QA configuration:\n  " + "\n  ".join(errors))
+
+    return config
+
+
+def load_qa_config(config_file=None):
+    """
+    Reads and validates the configuration from a YAML or JSON file (qa_mc_val.yml by default)
+    """
+    if config_file is None:
+        config_file = DEFAULT_CONFIG
+    with open(config_file, "r") as f:
+        if config_file.endswith(".json"):
+            config = json.load(f)
+        else:
+            config = yaml.safe_load(f)
+
+    return validate_qa_config(config)
+
+
+def get_species(config):
+    """
+    Returns the species to be processed as dictionaries with name, label, type
+    and bin in the generated-particle histograms of the species type
+    """
+    selected = config["outputs"]["species"]
+    species, counters = [], {spec_type: 0 for spec_type in SPECIES_TYPES}
+    for spec in config["species"]:
+        counters[spec["type"]] += 1
+        if selected == "all" or spec["name"] in selected:
+            species.append(dict(spec, ibin=counters[spec["type"]]))
+
+    return species
+
+
+def get_species_labels(config, spec_type):
+    """
+    Returns the labels of all the species of a type, in the order of the generated-particle histograms
+    """
+    return [spec["label"] for spec in config["species"] if spec["type"] == spec_type]
+
+
+def get_interval_plan(config, coll_system):
+    """
+    Centrality and occupancy intervals in which the efficiencies are computed, the first
+    entry of each list being the integrated one. Each interval is a tuple
+    (min, max, name suffix of the histograms, name suffix of the plots)
+    """
+    binning = config["binning"][coll_system]
+    outputs = config["outputs"]
+    cent_bins, occ_bins = binning["centrality"], binning["occupancy"]
+
+    def make_intervals(bins, hist_tag, plot_tag, integrated_hist_tag, differential):
+        intervals = [(bins[0], bins[-1], f"{integrated_hist_tag}{bins[0]}_{bins[-1]}",
+                      f"_{plot_tag}{bins[0]}_{bins[-1]}")]
+        if differential:
+            intervals += [(vmin, vmax, f"{hist_tag}{vmin}_{vmax}", f"_{plot_tag}{vmin}_{vmax}")
+                          for vmin, vmax in zip(bins[:-1], bins[1:])]
+        return intervals
+
+    # in pp, only the integrated efficiency
+    is_pbpb = coll_system == "PbPb"
+    cent_intervals = make_intervals(cent_bins, "vcent", "vcent", "vcent",
+                                    is_pbpb and outputs["eff_vs_cent"])
+    # the occupancy intervals are stored as vcent{min}_{max} for plot_effvocc.py
+    occ_intervals = []
+    if is_pbpb and outputs["eff_vs_occ"]:
+        occ_intervals = make_intervals(occ_bins, "vcent", "vocc", "vocc", True)
+
+    return cent_intervals, occ_intervals
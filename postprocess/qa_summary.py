@@ -0,0 +1,75 @@
+"""
+Columnar summary of the efficiencies computed by perform_qa_mc_val.py
+(one row per train x quantity x species x interval x pt bin), written as
+JSON or Parquet to compare different trains without re-opening the ROOT files
+"""
+
+import json
+import numpy as np
+from hist_utils import get_axis_edges, get_bin_contents, get_bin_errors2
+
+COLUMNS = ["train", "quantity", "species", "interval_var", "interval_min", "interval_max",
+           "pt_min", "pt_max", "value", "error"]
+SUMMARY_FORMATS = ["json", "parquet"]
+
+
+class QASummary:
+    """
+    Collects the rows of the summary and writes them to file
+    """
+
+    def __init__(self, train):
+        self.train = train
+        self.columns = {column: [] for column in COLUMNS}
+
+    def add_value(self, quantity, value, error, species="", interval_var="", interval=(None, None),
+                  pt_range=(None, None)):
+        """
+        Adds a single value (e.g. the collision reconstruction efficiency)
+        """
+        for column, entry in zip(COLUMNS, [self.train, quantity, species, interval_var, *interval,
+                                           *pt_range, float(value), float(error)]):
+            self.columns[column].append(entry)
+
+    def add_hist(self, quantity, hist, species, interval_var, interval):
+        """
+        Adds all the pt bins of a TH1 (e.g. an efficiency vs pt in a centrality interval)
+        """
+        edges = get_axis_edges(hist.GetXaxis())
+        values = get_bin_contents(hist)[1:-1]
+        errors = np.sqrt(get_bin_errors2(hist)[1:-1])
+        n_bins = len(values)
+        self.columns["train"] += [self.train] * n_bins
+        self.columns["quantity"] += [quantity] * n_bins
+        self.columns["species"] += [species] * n_bins
+        self.columns["interval_var"] += [interval_var] * n_bins
+        self.columns["interval_min"] += [interval[0]] * n_bins
+        self.columns["interval_max"] += [interval[1]] * n_bins
+        self.columns["pt_min"] += edges[:-1].tolist()
+        self.columns["pt_max"] += edges[1:].tolist()
+        self.columns["value"] += values.tolist()
+        self.columns["error"] += errors.tolist()
+
+    def write(self, outfile_name, summary_format="json"):
+        """
+        Writes the summary as a JSON dictionary of columns or as a Parquet table (requires pandas)
+        """
+        write_table(self.columns, outfile_name, summary_format)
+        print(f"QA summary written in {outfile_name}")
+
+
+def write_table(columns, outfile_name, summary_format="json"):
+    """
+    Writes a dictionary of columns as JSON or as a Parquet table (requires pandas)
+    """
+    if summary_format == "json":
+        with open(outfile_name, "w") as f:
+            json.dump(columns, f)
+    elif summary_format == "parquet":
+        try:
+            import pandas as pd # pylint: disable=import-outside-toplevel
+        except ImportError as exc:
+            raise ImportError("pandas (and pyarrow or fastparquet) needed for the Parquet tables") from exc
+        pd.DataFrame(columns).to_parquet(outfile_name, index=False)
+    else:
+        raise ValueError(f"Unknown summary format {summary_format}, choose among {SUMMARY_FORMATS}")
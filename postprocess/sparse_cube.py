@@ -0,0 +1,172 @@
+"""
+Dense NumPy copies of THnSparse/THn objects, filled with a single pass over the
+filled bins, from which any slice is obtained as a sum along the axes
+"""
+
+import numpy as np
+import ROOT
+from hist_utils import get_axis_edges, get_range_bins, th1_from_axis
+
+
+# loops on the bins of a THnSparse/THn in compiled code, reading from/writing into NumPy buffers
+BIN_LOOPS_CODE = """
+void sparse_cube_read_bins(const THnBase* thn, Int_t* coords, Double_t* contents, Double_t* errors2)
+{
+    const Int_t n_dims = thn->GetNdimensions();
+    for (Long64_t ibin = 0; ibin < thn->GetNbins(); ++ibin) {
+        contents[ibin] = thn->GetBinContent(ibin, coords + ibin * n_dims);
+        errors2[ibin] = thn->GetBinError2(ibin);
+    }
+}
+
+void sparse_cube_fill_bins(THnBase* thn, Long64_t n_bins, const Int_t* coords,
+                           const Double_t* contents, const Double_t* errors2)
+{
+    const Int_t n_dims = thn->GetNdimensions();
+    for (Long64_t ibin = 0; ibin < n_bins; ++ibin) {
+        const Long64_t bin = thn->GetBin(coords + ibin * n_dims);
+        thn->SetBinContent(bin, contents[ibin]);
+        thn->SetBinError2(bin, errors2[ibin]);
+    }
+}
+"""
+
+
+def declare_bin_loops():
+    """
+    Compiles the loops of BIN_LOOPS_CODE, once per process
+    """
+    if not hasattr(ROOT, "sparse_cube_read_bins"):
+        ROOT.gInterpreter.Declare(BIN_LOOPS_CODE)
+
+
+def read_filled_bins(thn):
+    """
+    Reads the coordinates (including under- and overflow bins), contents and squared
+    errors of all the filled bins of a THnSparse (all the bins of a THn, the empty ones
+    being dropped) with a single compiled loop filling NumPy buffers
+
+    Returns:
+        - coordinates with shape (number of bins, number of dimensions), contents, squared errors
+    """
+    declare_bin_loops()
+    n_bins = thn.GetNbins()
+    coords = np.zeros((n_bins, thn.GetNdimensions()), dtype=np.int32)
+    contents, errors2 = np.zeros(n_bins), np.zeros(n_bins)
+    ROOT.sparse_cube_read_bins(thn, coords, contents, errors2)
+    filled = contents != 0
+    return coords[filled], contents[filled], errors2[filled]
+
+
+def thnsparse_from_bins(name, axes, filled_bins):
+    """
+    THnSparseD with the axes [(edges, title)] filled with the bins (coordinates, contents,
+    squared errors) of read_filled_bins, e.g. the filled bins summed over several files
+    """
+    declare_bin_loops()
+    thn = ROOT.THnSparseD(name, "", len(axes), np.array([len(edges) - 1 for edges, _ in axes], dtype=np.int32))
+    for iaxis, (edges, title) in enumerate(axes):
+        thn.SetBinEdges(iaxis, np.asarray(edges, "d"))
+        thn.GetAxis(iaxis).SetTitle(str(title))
+    thn.Sumw2()
+    coords, contents, errors2 = filled_bins
+    ROOT.sparse_cube_fill_bins(thn, len(contents), np.ascontiguousarray(coords, dtype=np.int32),
+                               np.ascontiguousarray(contents, dtype=np.float64),
+                               np.ascontiguousarray(errors2, dtype=np.float64))
+    return thn
+
+
+def get_bin_map(axis, new_edges):
+    """
+    Index of the bin of new_edges (0 underflow, len(new_edges) overflow) for each bin of a TAxis,
+    the under- and overflow bins of the axis going where the values just outside the axis go,
+    so that the ranges of TAxis::SetRangeUser are reproduced when new_edges are a subset of the axis edges
+    """
+    edges = get_axis_edges(axis)
+    centers = 0.5 * (edges[:-1] + edges[1:])
+    return np.concatenate(([np.searchsorted(new_edges, edges[0], side="left")],
+                           np.searchsorted(new_edges, centers, side="right"),
+                           [np.searchsorted(new_edges, edges[-1], side="right")]))
+
+
+class SparseCube:
+    """
+    Dense array with a subset of the axes of a THnSparse/THn (optionally merged into coarser bins)
+    """
+
+    def __init__(self, thn, axes, new_edges=None, filled_bins=None):
+        """
+        Fills the cube with the axes of thn in the list axes, new_edges being a dictionary
+        {axis: bin edges} of the axes to be merged into coarser bins. The filled bins
+        can be passed from read_filled_bins, to fill several cubes with a single pass on thn
+        """
+        if new_edges is None:
+            new_edges = {}
+        if filled_bins is None:
+            filled_bins = read_filled_bins(thn)
+        coords, contents, errors2 = filled_bins
+
+        self.axes = list(axes)
+        self.taxes, indices = [], []
+        for iaxis in self.axes:
+            axis = thn.GetAxis(iaxis)
+            if iaxis in new_edges:
+                edges = np.asarray(new_edges[iaxis], "d")
+                self.taxes.append(ROOT.TAxis(len(edges) - 1, edges))
+                indices.append(get_bin_map(axis, edges)[coords[:, iaxis]])
+            else:
+                self.taxes.append(ROOT.TAxis(axis))
+                indices.append(coords[:, iaxis])
+            self.taxes[-1].SetTitle(axis.GetTitle())
+
+        shape = tuple(axis.GetNbins() + 2 for axis in self.taxes)
+        self.contents, self.errors2 = np.zeros(shape), np.zeros(shape)
+        np.add.at(self.contents, tuple(indices), contents)
+        np.add.at(self.errors2, tuple(indices), errors2)
+
+    def get_axis(self, axis):
+        """
+        TAxis of the cube corresponding to the axis of the original THnSparse/THn
+        """
+        return self.taxes[self.axes.index(axis)]
+
+    def project(self, axes, ranges=None):
+        """
+        Contents and squared errors along the axes (including under- and overflow bins), summed
+        over the other axes in ranges {axis: (min, max)} with the bins of TAxis::SetRangeUser,
+        or over all the bins (including under- and overflow) for the axes without range
+        """
+        if ranges is None:
+            ranges = {}
+        if isinstance(axes, int):
+            axes = [axes]
+        slices = []
+        for iaxis, taxis in zip(self.axes, self.taxes):
+            if iaxis in ranges and iaxis not in axes:
+                bin_min, bin_max = get_range_bins(taxis, *ranges[iaxis])
+                slices.append(slice(bin_min, bin_max + 1))
+            else:
+                slices.append(slice(None))
+        sum_axes = tuple(idim for idim, iaxis in enumerate(self.axes) if iaxis not in axes)
+        order = np.argsort([self.axes.index(iaxis) for iaxis in axes])
+        contents = self.contents[tuple(slices)].sum(axis=sum_axes)
+        errors2 = self.errors2[tuple(slices)].sum(axis=sum_axes)
+        return np.moveaxis(contents, range(len(axes)), order), np.moveaxis(errors2, range(len(axes)), order)
+
+    def get_th1(self, name, axis, ranges=None):
+        """
+        TH1D with the projection of the cube on one axis, as THnBase::Projection(axis)
+        with the ranges {axis: (min, max)} set on the other axes
+        """
+        contents, errors2 = self.project(axis, ranges)
+        return th1_from_axis(name, "", self.get_axis(axis), contents, errors2)
+
+
+def get_sparse_cubes(thn, axes_list, new_edges=None, filled_bins=None):
+    """
+    Fills several cubes (one for each list of axes in axes_list) with a single pass on thn,
+    or from the filled bins of a previous read_filled_bins call
+    """
+    if filled_bins is None:
+        filled_bins = read_filled_bins(thn)
+    return [SparseCube(thn, axes, new_edges, filled_bins) for axes in axes_list]
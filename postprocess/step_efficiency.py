@@ -0,0 +1,276 @@
+"""
+Efficiencies between all the pairs of steps of taskMcEfficiency.cxx, computed at once
+from the arrays of counts per step, with binomial uncertainties (as TH1::Divide with option "B")
+and Clopper-Pearson, Wilson or Bayesian confidence intervals (as TEfficiency).
+The same intervals are used to convert TEfficiency objects to TH1/TGraphAsymmErrors at once
+"""
+
+from statistics import NormalDist
+import numpy as np
+import ROOT
+from hist_utils import divide, get_axis_edges, get_bin_contents, set_bin_contents, th1_from_arrays
+
+CL_1SIGMA = 0.682689492137
+INTERVAL_METHODS = ["bayesian", "clopper_pearson", "wilson"]
+TABLE_COLUMNS = ["origin", "variable", "step_num", "step_den", "bin_min", "bin_max",
+                 "passed", "total", "eff", "err_binomial", "eff_point", "eff_low", "eff_up"]
+
+
+def _get_beta_quantile():
+    """
+    Inverse of the regularised incomplete beta function (from scipy)
+    """
+    try:
+        from scipy.special import betaincinv # pylint: disable=import-outside-toplevel
+    except ImportError as exc:
+        raise ImportError("scipy needed for the Clopper-Pearson and Bayesian intervals") from exc
+    return betaincinv
+
+
+def clopper_pearson(passed, total, cl=CL_1SIGMA):
+    """
+    Clopper-Pearson interval (as TEfficiency::ClopperPearson) for arrays of passed and total counts
+
+    Returns:
+        - lower and upper edges of the interval
+    """
+    beta_quantile = _get_beta_quantile()
+    passed, total = np.asarray(passed, dtype=np.float64), np.asarray(total, dtype=np.float64)
+    alpha = (1. - cl) / 2.
+    with np.errstate(invalid="ignore", divide="ignore"):
+        low = np.where(passed > 0, beta_quantile(passed, total - passed + 1, alpha), 0.)
+        up = np.where(passed < total, beta_quantile(passed + 1, total - passed, 1. - alpha), 1.)
+    return low, up
+
+
+def bayesian(passed, total, cl=CL_1SIGMA, prior_alpha=1., prior_beta=1.):
+    """
+    Central interval of the posterior with a beta prior (as TEfficiency::Bayesian,
+    uniform prior by default) for arrays of passed and total counts
+
+    Returns:
+        - lower and upper edges of the interval
+    """
+    beta_quantile = _get_beta_quantile()
+    passed, total = np.asarray(passed, dtype=np.float64), np.asarray(total, dtype=np.float64)
+    post_alpha, post_beta = passed + prior_alpha, total - passed + prior_beta
+    alpha = (1. - cl) / 2.
+    return beta_quantile(post_alpha, post_beta, alpha), beta_quantile(post_alpha, post_beta, 1. - alpha)
+
+
+def wilson(passed, total, cl=CL_1SIGMA):
+    """
+    Wilson score interval (as TEfficiency::Wilson) for arrays of passed and total counts
+
+    Returns:
+        - lower and upper edges of the interval
+    """
+    passed, total = np.asarray(passed, dtype=np.float64), np.asarray(total, dtype=np.float64)
+    kappa = NormalDist().inv_cdf(1. - (1. - cl) / 2.)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        ratio = passed / total
+        mode = (passed + 0.5 * kappa**2) / (total + kappa**2)
+        delta = kappa / (total + kappa**2) * np.sqrt(total * ratio * (1. - ratio) + kappa**2 / 4.)
+    return np.maximum(mode - delta, 0.), np.minimum(mode + delta, 1.)
+
+
+def get_interval(passed, total, method="bayesian", cl=CL_1SIGMA, prior=(1., 1.)):
+    """
+    Confidence interval of the efficiency passed/total with one of INTERVAL_METHODS
+    (prior: parameters of the beta prior of the Bayesian interval)
+    """
+    if method == "bayesian":
+        return bayesian(passed, total, cl, *prior)
+    if method == "clopper_pearson":
+        return clopper_pearson(passed, total, cl)
+    if method == "wilson":
+        return wilson(passed, total, cl)
+    raise ValueError(f"Unknown interval method {method}, choose among {INTERVAL_METHODS}")
+
+
+def beta_mode(alpha, beta):
+    """
+    Mode of beta distributions (as TEfficiency::BetaMode): 0 or 1 when one parameter is at most 1,
+    the mode being on an edge, 0.5 when both are at most 1 and equal, 0 for non-positive parameters
+    """
+    alpha, beta = np.asarray(alpha, dtype=np.float64), np.asarray(beta, dtype=np.float64)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mode = (alpha - 1.) / (alpha + beta - 2.)
+    edge = (alpha <= 1.) | (beta <= 1.)
+    mode = np.where(edge, np.where(alpha < beta, 0., np.where(alpha > beta, 1., 0.5)), mode)
+    return np.where((alpha <= 0.) | (beta <= 0.), 0., mode)
+
+
+def get_teff_method(teff):
+    """
+    Interval method of INTERVAL_METHODS corresponding to the statistic option of a TEfficiency,
+    None for the options not available as arrays (the uniform and Jeffrey priors of kBUniform
+    and kBJeffrey are set by TEfficiency as beta parameters, read in get_teff_arrays)
+    """
+    return {ROOT.TEfficiency.kFCP: "clopper_pearson", ROOT.TEfficiency.kFWilson: "wilson",
+            ROOT.TEfficiency.kBBayesian: "bayesian", ROOT.TEfficiency.kBUniform: "bayesian",
+            ROOT.TEfficiency.kBJeffrey: "bayesian"}.get(teff.GetStatisticOption())
+
+
+def get_teff_arrays(teff, method=None):
+    """
+    Efficiencies and confidence intervals of all the bins of a 1D TEfficiency computed at once from
+    the arrays of the passed and total histograms, with the interval method (one of INTERVAL_METHODS,
+    by default the statistic option of the TEfficiency) and confidence level of the TEfficiency.
+    Bins with empty total or passed > total are flagged as not valid. TEfficiency objects with
+    weights or other statistic options are converted bin by bin with the TEfficiency methods
+
+    Returns:
+        - bin edges, efficiencies, lower and upper edges of the intervals and valid bins
+          (without under- and overflow bins)
+    """
+    total, passed = teff.GetTotalHistogram(), teff.GetPassedHistogram()
+    edges = get_axis_edges(total.GetXaxis())
+    n_total, n_passed = get_bin_contents(total)[1:-1], get_bin_contents(passed)[1:-1]
+    valid = (n_total > 0) & (n_passed >= 0) & (n_passed <= n_total)
+
+    if method is None:
+        method = get_teff_method(teff)
+    if method is None or teff.UsesWeights() or teff.UsesShortestInterval():
+        bins = range(1, len(edges))
+        eff = np.array([teff.GetEfficiency(ibin) for ibin in bins])
+        low = eff - np.array([teff.GetEfficiencyErrorLow(ibin) for ibin in bins])
+        up = eff + np.array([teff.GetEfficiencyErrorUp(ibin) for ibin in bins])
+        return edges, eff, low, up, valid
+
+    prior = (teff.GetBetaAlpha(), teff.GetBetaBeta())
+    safe_total = np.where(valid, n_total, 1.)
+    safe_passed = np.where(valid, n_passed, 0.)
+    low, up = get_interval(safe_passed, safe_total, method, teff.GetConfidenceLevel(), prior)
+    if method == "bayesian" and teff.UsesPosteriorMode():
+        eff = beta_mode(safe_passed + prior[0], safe_total - safe_passed + prior[1])
+    elif method == "bayesian":
+        eff = (safe_passed + prior[0]) / (safe_total + prior[0] + prior[1])
+    else:
+        eff = safe_passed / safe_total
+
+    return edges, eff, low, up, valid
+
+
+def teff_to_th1(teff, name, method=None):
+    """
+    TH1 with the binning of the total histogram of a TEfficiency, with the efficiencies of
+    get_teff_arrays and errors equal to the half widths of the intervals (0 in the bins not valid)
+    """
+    _, eff, low, up, valid = get_teff_arrays(teff, method)
+    hist = teff.GetTotalHistogram().Clone(name)
+    hist.Reset("ICES")
+    hist.SetDirectory(0)
+    contents = np.where(valid, eff, 0.)
+    errors = np.where(valid, 0.5 * (up - low), 0.)
+    set_bin_contents(hist, np.pad(contents, 1), np.pad(errors**2, 1))
+    return hist
+
+
+def teff_to_graph(teff, name, method=None):
+    """
+    TGraphAsymmErrors with the efficiencies and confidence intervals of get_teff_arrays in the valid bins
+    """
+    edges, eff, low, up, valid = get_teff_arrays(teff, method)
+    centers = 0.5 * (edges[:-1] + edges[1:])[valid]
+    half_widths = 0.5 * np.diff(edges)[valid]
+    eff, low, up = eff[valid], low[valid], up[valid]
+    graph = ROOT.TGraphAsymmErrors(int(valid.sum()), np.asarray(centers, "d"), np.asarray(eff, "d"),
+                                   np.asarray(half_widths, "d"), np.asarray(half_widths, "d"),
+                                   np.asarray(eff - low, "d"), np.asarray(up - eff, "d"))
+    graph.SetName(name)
+    graph.SetTitle(teff.GetTitle())
+    return graph
+
+
+class StepEfficiencies:
+    """
+    Efficiencies of each step with respect to each other step, in bins of one variable
+    (e.g. pt), stored as arrays with shape (number of steps, number of steps, number of bins)
+    """
+
+    def __init__(self, steps, edges, counts, errors2, method="wilson", cl=CL_1SIGMA):
+        """
+        steps: list of steps, counts and errors2: arrays of counts and squared errors with shape
+        (number of steps, number of bins), without under- and overflow bins. The default Wilson
+        intervals need only NumPy, scipy is imported for the Bayesian and Clopper-Pearson ones
+        """
+        self.steps = list(steps)
+        self.edges = np.asarray(edges, dtype=np.float64)
+        counts, errors2 = np.asarray(counts, dtype=np.float64), np.asarray(errors2, dtype=np.float64)
+        self.passed = np.broadcast_to(counts[:, np.newaxis], (len(self.steps),) + counts.shape)
+        self.total = np.broadcast_to(counts[np.newaxis], (len(self.steps),) + counts.shape)
+        self.eff, self.err2 = divide(self.passed, self.total, errors2[:, np.newaxis], errors2[np.newaxis],
+                                     binomial=True)
+
+        # intervals only where the numerator is a subset of the denominator
+        self.valid = (self.total > 0) & (self.passed >= 0) & (self.passed <= self.total)
+        safe_passed, safe_total = np.where(self.valid, self.passed, 0.), np.where(self.valid, self.total, 1.)
+        low, up = get_interval(safe_passed, safe_total, method, cl)
+        self.low, self.up = np.where(self.valid, low, np.nan), np.where(self.valid, up, np.nan)
+        # point of the intervals: posterior mean for the Bayesian interval (as TEfficiency),
+        # inside the interval also for 0 or all passed, where passed/total is an edge of the interval
+        if method == "bayesian":
+            point = (safe_passed + 1.) / (safe_total + 2.)
+        else:
+            point = safe_passed / safe_total
+        self.point = np.where(self.valid, point, np.nan)
+
+    def get(self, step_num, step_den):
+        """
+        Efficiency of step_num with respect to step_den and its binomial squared errors
+        """
+        inum, iden = self.steps.index(step_num), self.steps.index(step_den)
+        return self.eff[inum, iden], self.err2[inum, iden]
+
+    def get_hist(self, name, step_num, step_den, title=""):
+        """
+        TH1D with the efficiency of step_num with respect to step_den, with binomial errors
+        (same as TH1::Divide with option "B")
+        """
+        return th1_from_arrays(name, title, self.edges, *self.get(step_num, step_den))
+
+    def get_graph(self, name, step_num, step_den, title=""):
+        """
+        TGraphAsymmErrors with the efficiency of step_num with respect to step_den (point of the
+        interval, see __init__) and its confidence intervals, for the bins where the interval is defined
+        """
+        inum, iden = self.steps.index(step_num), self.steps.index(step_den)
+        valid = self.valid[inum, iden]
+        point = self.point[inum, iden][valid]
+        centers = 0.5 * (self.edges[:-1] + self.edges[1:])[valid]
+        half_widths = 0.5 * np.diff(self.edges)[valid]
+        graph = ROOT.TGraphAsymmErrors(
+            int(valid.sum()), np.asarray(centers, "d"), np.asarray(point, "d"), np.asarray(half_widths, "d"),
+            np.asarray(half_widths, "d"), np.asarray(np.maximum(point - self.low[inum, iden][valid], 0.), "d"),
+            np.asarray(np.maximum(self.up[inum, iden][valid] - point, 0.), "d"))
+        graph.SetNameTitle(name, title)
+        return graph
+
+    def get_pairs(self):
+        """
+        Pairs (step_num, step_den) with step_num after step_den
+        """
+        return [(step_num, step_den) for step_num in self.steps for step_den in self.steps if step_num > step_den]
+
+    def add_to_table(self, columns, origin, variable):
+        """
+        Appends the efficiencies of all the pairs of get_pairs to a dictionary of columns (TABLE_COLUMNS)
+        """
+        n_bins = len(self.edges) - 1
+        for step_num, step_den in self.get_pairs():
+            inum, iden = self.steps.index(step_num), self.steps.index(step_den)
+            columns["origin"] += [origin] * n_bins
+            columns["variable"] += [variable] * n_bins
+            columns["step_num"] += [step_num] * n_bins
+            columns["step_den"] += [step_den] * n_bins
+            columns["bin_min"] += self.edges[:-1].tolist()
+            columns["bin_max"] += self.edges[1:].tolist()
+            columns["passed"] += self.passed[inum, iden].tolist()
+            columns["total"] += self.total[inum, iden].tolist()
+            columns["eff"] += self.eff[inum, iden].tolist()
+            columns["err_binomial"] += np.sqrt(self.err2[inum, iden]).tolist()
+            # NaN (undefined intervals) stored as None, valid JSON
+            columns["eff_point"] += [None if np.isnan(val) else val for val in self.point[inum, iden].tolist()]
+            columns["eff_low"] += [None if np.isnan(val) else val for val in self.low[inum, iden].tolist()]
+            columns["eff_up"] += [None if np.isnan(val) else val for val in self.up[inum, iden].tolist()]